@@ -13,6 +13,10 @@ def create_ollama_client() -> AsyncClient:
 
 
 def create_chroma_client() -> chromadb.ClientAPI:
+    # "ephemeral" keeps an in-memory Chroma inside the process (benchmarks, local runs);
+    # every EphemeralClient of the process shares the same data.
+    if os.getenv("CHROMA_CLIENT_MODE", "http") == "ephemeral":
+        return chromadb.EphemeralClient()
     host = os.getenv("CHROMA_HOST", "localhost")
     port = int(os.getenv("CHROMA_PORT", "8000"))
     return chromadb.HttpClient(host=host, port=port)
@@ -0,0 +1,77 @@
+from prometheus_client import Gauge, Histogram
+
+# Exposed at /metrics. Histograms are observed on the request path, so only cheap
+# label lookups happen there; queue depths and active counts are read at scrape time.
+
+_FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+PDF_PAGE_EXTRACT_SECONDS = Histogram(
+    "zotero_rag_pdf_page_extract_seconds",
+    "Time to extract the words of one PDF page.",
+    ["pipeline", "method"],
+    buckets=_FAST_BUCKETS,
+)
+CHUNKING_SECONDS = Histogram(
+    "zotero_rag_chunking_seconds",
+    "Time spent splitting extracted text into chunks.",
+    ["pipeline"],
+    buckets=_FAST_BUCKETS,
+)
+EMBED_BATCH_SECONDS = Histogram(
+    "zotero_rag_embed_batch_seconds",
+    "Latency of one Ollama embed call.",
+    ["caller"],
+    buckets=_LLM_BUCKETS,
+)
+CHROMA_SECONDS = Histogram(
+    "zotero_rag_chroma_seconds",
+    "Latency of Chroma collection operations.",
+    ["operation"],
+    buckets=_FAST_BUCKETS,
+)
+OLLAMA_SLOT_WAIT_SECONDS = Histogram(
+    "zotero_rag_ollama_slot_wait_seconds",
+    "Time an Ollama call waited for a scheduler slot.",
+    ["priority"],
+    buckets=_FAST_BUCKETS + (10.0, 30.0, 60.0),
+)
+QUERY_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "zotero_rag_query_time_to_first_token_seconds",
+    "Time from an /api/query request to its first answer token.",
+    buckets=_LLM_BUCKETS,
+)
+QUERY_TOKENS_PER_SECOND = Histogram(
+    "zotero_rag_query_tokens_per_second",
+    "Generation speed of /api/query answers.",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200),
+)
+ANNOTATION_STAGE_SECONDS = Histogram(
+    "zotero_rag_annotation_stage_seconds",
+    "Duration of the stages of an annotation job.",
+    ["stage"],
+    buckets=_LLM_BUCKETS,
+)
+
+ACTIVE_STREAMS = Gauge(
+    "zotero_rag_active_streams",
+    "Streaming responses currently open.",
+    ["endpoint"],
+)
+OLLAMA_SCHEDULER_ACTIVE = Gauge(
+    "zotero_rag_ollama_scheduler_active",
+    "Ollama calls currently holding a scheduler slot.",
+)
+OLLAMA_SCHEDULER_QUEUE_DEPTH = Gauge(
+    "zotero_rag_ollama_scheduler_queue_depth",
+    "Ollama calls waiting for a scheduler slot.",
+    ["priority"],
+)
+ANNOTATION_JOBS_ACTIVE = Gauge(
+    "zotero_rag_annotation_jobs_active",
+    "Annotation jobs currently running.",
+)
+ANNOTATION_JOBS_QUEUED = Gauge(
+    "zotero_rag_annotation_jobs_queued",
+    "Annotation jobs admitted but waiting to run.",
+)
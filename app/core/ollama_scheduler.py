@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional
+
+from core.metrics import OLLAMA_SCHEDULER_ACTIVE, OLLAMA_SCHEDULER_QUEUE_DEPTH, OLLAMA_SLOT_WAIT_SECONDS
+from core.settings import OLLAMA_SCHEDULER_CAPACITY, OLLAMA_SCHEDULER_INTERACTIVE_RESERVE
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class SchedulerJob:
+    """A stream of Ollama calls that is scheduled as one unit (a query, an annotation job, ...)."""
+
+    def __init__(
+        self,
+        scheduler: "OllamaScheduler",
+        name: str,
+        priority: Priority,
+        max_parallel: Optional[int] = None,
+    ) -> None:
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.max_parallel = max_parallel
+        self.active = 0
+        self._waiters: Deque[asyncio.Future[None]] = deque()
+        # a new job queues behind everything served so far instead of jumping ahead of it
+        self._last_served = scheduler._grants
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one Ollama call slot for the duration of the block."""
+        await self.scheduler._acquire(self)
+        try:
+            yield
+        finally:
+            self.scheduler._release(self)
+
+
+class OllamaScheduler:
+    """
+    Process-wide limit on concurrent Ollama calls.
+
+    Free slots go to interactive jobs before batch jobs; within a priority class the
+    job served least recently goes next (round-robin), so one large annotation job cannot
+    starve the others. `interactive_reserve` slots are never handed to batch work.
+    """
+
+    def __init__(self, capacity: int, interactive_reserve: int = 0) -> None:
+        self.capacity = capacity
+        self.interactive_reserve = min(interactive_reserve, capacity - 1)
+        self.active = 0
+        self._ready: Dict[Priority, List[SchedulerJob]] = {p: [] for p in Priority}
+        self._job_ids = itertools.count(1)
+        self._grants = 0
+        self._shared_jobs: Dict[tuple[str, Priority], SchedulerJob] = {}
+
+    def job(self, name: str, priority: Priority, max_parallel: Optional[int] = None) -> SchedulerJob:
+        return SchedulerJob(self, f"{name}-{next(self._job_ids)}", priority, max_parallel)
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority: Priority) -> AsyncIterator[None]:
+        """
+        One call on behalf of `name`. All calls with the same name and priority share one
+        job, so a burst of them takes a single turn in the round-robin.
+        """
+        job = self._shared_jobs.get((name, priority))
+        if job is None:
+            job = self._shared_jobs[(name, priority)] = SchedulerJob(self, name, priority)
+        async with job.slot():
+            yield
+
+    def queue_depth(self, priority: Optional[Priority] = None) -> int:
+        priorities = list(Priority) if priority is None else [priority]
+        return sum(
+            sum(1 for w in job._waiters if not w.done())
+            for p in priorities
+            for job in self._ready[p]
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "interactive_reserve": self.interactive_reserve,
+            "active": self.active,
+            "queued_interactive": self.queue_depth(Priority.INTERACTIVE),
+            "queued_batch": self.queue_depth(Priority.BATCH),
+        }
+
+    async def _acquire(self, job: SchedulerJob) -> None:
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        if job not in self._ready[job.priority]:
+            self._ready[job.priority].append(job)
+        job._waiters.append(waiter)
+        started = time.perf_counter()
+        self._dispatch()
+        try:
+            await waiter
+            OLLAMA_SLOT_WAIT_SECONDS.labels(job.priority.name.lower()).observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted and cancelled in the same tick: hand the slot on.
+                self._release(job)
+            elif waiter in job._waiters:
+                job._waiters.remove(waiter)
+            raise
+
+    def _release(self, job: SchedulerJob) -> None:
+        self.active -= 1
+        job.active -= 1
+        self._dispatch()
+
+    def _limit(self, priority: Priority) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.capacity
+        return self.capacity - self.interactive_reserve
+
+    def _dispatch(self) -> None:
+        while self._grant_next():
+            pass
+
+    def _grant_next(self) -> bool:
+        for priority in Priority:
+            if self.active >= self._limit(priority):
+                continue
+            for job in self._ready[priority]:
+                while job._waiters and job._waiters[0].done():
+                    job._waiters.popleft()
+            ready = [job for job in self._ready[priority] if job._waiters]
+            self._ready[priority] = ready
+            eligible = [j for j in ready if j.max_parallel is None or j.active < j.max_parallel]
+            if not eligible:
+                continue
+            job = min(eligible, key=lambda j: j._last_served)
+            job._waiters.popleft().set_result(None)
+            if not job._waiters:
+                ready.remove(job)
+            self._grants += 1
+            job._last_served = self._grants
+            job.active += 1
+            self.active += 1
+            return True
+        return False
+
+
+OLLAMA_SCHEDULER = OllamaScheduler(
+    capacity=OLLAMA_SCHEDULER_CAPACITY,
+    interactive_reserve=OLLAMA_SCHEDULER_INTERACTIVE_RESERVE,
+)
+OLLAMA_SCHEDULER_ACTIVE.set_function(lambda: OLLAMA_SCHEDULER.active)
+OLLAMA_SCHEDULER_QUEUE_DEPTH.labels("interactive").set_function(
+    lambda: OLLAMA_SCHEDULER.queue_depth(Priority.INTERACTIVE)
+)
+OLLAMA_SCHEDULER_QUEUE_DEPTH.labels("batch").set_function(lambda: OLLAMA_SCHEDULER.queue_depth(Priority.BATCH))
@@ -0,0 +1,241 @@
+import asyncio
+import cProfile
+import hmac
+import marshal
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from pathlib import Path
+from types import FrameType
+from typing import Dict, Literal, Mapping, Optional, Protocol, cast
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.settings import PROFILING_ENABLED, PROFILING_SAMPLE_INTERVAL_SECONDS, PROFILING_TOKEN
+
+ProfileMode = Literal["sample", "cprofile"]
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_TOKEN_HEADER = "x-profile-token"
+
+_APP_DIR = str(Path(__file__).resolve().parents[1]) + "/"
+_MAX_KEPT_PROFILES = 16
+
+
+class ProfileSession(Protocol):
+    media_type: str
+
+    def start(self) -> None: ...
+
+    async def collect(self) -> bytes: ...
+
+
+def authorized(headers: Mapping[str, str]) -> bool:
+    """
+    Profiling is on and the caller sent the configured `X-Profile-Token`. Without a
+    PROFILING_TOKEN nobody is authorized: core's port can be reachable without the gateway.
+    """
+    if not PROFILING_ENABLED or not PROFILING_TOKEN:
+        return False
+    token = headers.get(PROFILE_TOKEN_HEADER, "")
+    return hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_APP_DIR):
+        filename = filename[len(_APP_DIR):]
+    elif "site-packages/" in filename:
+        filename = filename.split("site-packages/", 1)[1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Statistical profiler: a background thread records the Python stack of every other
+    thread each `interval` seconds. `stop` returns collapsed stacks (`root;...;leaf count`
+    per line, thread name first), the input format of flamegraph.pl and speedscope.
+    """
+
+    media_type = "text/plain; charset=utf-8"
+
+    def __init__(self, interval: float = PROFILING_SAMPLE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self.samples = 0
+        self._counts: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> bytes:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed().encode("utf-8")
+
+    async def collect(self) -> bytes:
+        """`stop` without blocking the event loop while the sampler finishes its last sample."""
+        self._stop.set()
+        return await asyncio.to_thread(self.stop)
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._counts.most_common())
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if any(ident not in names for ident in frames):
+                names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            for ident, frame in frames.items():
+                if ident != own:
+                    self._counts[self._stack(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _stack(thread_name: str, frame: Optional[FrameType]) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        labels.append(thread_name)
+        return ";".join(reversed(labels))
+
+
+class CProfileSession:
+    """
+    Deterministic profile of the calling thread (the event loop), returned as a pstats
+    file. Every task the loop runs meanwhile is included, not only the one that asked.
+    """
+
+    media_type = "application/octet-stream"
+
+    def __init__(self) -> None:
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    async def collect(self) -> bytes:
+        # disable() has to run on the profiled thread; serializing the stats does not
+        self._profile.disable()
+        return await asyncio.to_thread(self._dump)
+
+    def _dump(self) -> bytes:
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+class _ProfileSlot:
+    """One profile at a time: cProfile sessions cannot nest and two samplers only add noise."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._busy = False
+        self._results: "OrderedDict[str, tuple[str, bytes]]" = OrderedDict()
+
+    def open(self, mode: ProfileMode, interval: Optional[float] = None) -> ProfileSession:
+        with self._lock:
+            if self._busy:
+                raise ProfilerBusyError("Another profile is already running")
+            self._busy = True
+        session: ProfileSession
+        if mode == "sample":
+            session = StackSampler(interval or PROFILING_SAMPLE_INTERVAL_SECONDS)
+        else:
+            session = CProfileSession()
+        session.start()
+        return session
+
+    async def close(self, session: ProfileSession) -> bytes:
+        try:
+            return await session.collect()
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def keep(self, media_type: str, data: bytes, profile_id: Optional[str] = None) -> str:
+        profile_id = profile_id or uuid.uuid4().hex
+        with self._lock:
+            self._results[profile_id] = (media_type, data)
+            while len(self._results) > _MAX_KEPT_PROFILES:
+                self._results.popitem(last=False)
+        return profile_id
+
+    def result(self, profile_id: str) -> Optional[tuple[str, bytes]]:
+        with self._lock:
+            return self._results.get(profile_id)
+
+
+PROFILER = _ProfileSlot()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a single request, streamed body included, when it carries `X-Profile: sample`
+    or `X-Profile: cprofile` together with the configured `X-Profile-Token`; otherwise the
+    header is ignored. The response gets an `X-Profile-Id` header; the profile is fetched
+    from `/internal/profile/{id}` once the response has finished.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        mode = self._requested_mode(scope)
+        if mode is None or not authorized(self._headers(scope)):
+            await self.app(scope, receive, send)
+            return
+        try:
+            session = PROFILER.open(mode)
+        except ProfilerBusyError:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        finished = False
+
+        async def finish() -> None:
+            nonlocal finished
+            if not finished:
+                finished = True
+                PROFILER.keep(session.media_type, await PROFILER.close(session), profile_id)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode(), profile_id.encode()))
+                message = {**message, "headers": headers}
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # stored before the client sees the end of the body, so it can fetch it right away
+                await finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await finish()
+
+    @staticmethod
+    def _headers(scope: Scope) -> Dict[str, str]:
+        return {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+
+    @classmethod
+    def _requested_mode(cls, scope: Scope) -> Optional[ProfileMode]:
+        if scope["type"] != "http":
+            return None
+        mode = cls._headers(scope).get(PROFILE_HEADER, "").strip().lower()
+        if mode in ("sample", "cprofile"):
+            return cast(ProfileMode, mode)
+        return None
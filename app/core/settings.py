@@ -12,7 +12,29 @@ def _get_int(name: str, default: int, minimum: int | None = None) -> int:
     return value
 
 
-def _get_optional_float(name: str, minimum: float | None = None) -> float | None:
+def _get_float(
+    name: str,
+    default: float,
+    minimum: float | None = None,
+    maximum: float | None = None,
+) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        value = default
+    else:
+        value = float(raw)
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}, got {value}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{name} must be <= {maximum}, got {value}")
+    return value
+
+
+def _get_optional_float(
+    name: str,
+    minimum: float | None = None,
+    maximum: float | None = None,
+) -> float | None:
     raw = os.getenv(name)
     if raw is None:
         return None
@@ -22,16 +44,54 @@ def _get_optional_float(name: str, minimum: float | None = None) -> float | None
     value = float(stripped)
     if minimum is not None and value < minimum:
         raise ValueError(f"{name} must be >= {minimum}, got {value}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{name} must be <= {maximum}, got {value}")
     return value
 
 
 ANSWER_MODEL = os.getenv("ANSWER_MODEL", "llama3.2:latest")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
 MAX_OLLAMA_PARALLEL_CALLS = _get_int("MAX_OLLAMA_PARALLEL_CALLS", 4, minimum=1)
+OLLAMA_SCHEDULER_CAPACITY = _get_int("OLLAMA_SCHEDULER_CAPACITY", MAX_OLLAMA_PARALLEL_CALLS, minimum=1)
+OLLAMA_SCHEDULER_INTERACTIVE_RESERVE = _get_int("OLLAMA_SCHEDULER_INTERACTIVE_RESERVE", 1, minimum=0)
 ANNOTATION_DEFAULT_CHUNK_SIZE = _get_int("ANNOTATION_DEFAULT_CHUNK_SIZE", 1600, minimum=32)
+ANNOTATION_CONTEXT_TOKENS = _get_int("ANNOTATION_CONTEXT_TOKENS", 40, minimum=0)
+ANNOTATION_EXTRACT_WORKERS = _get_int("ANNOTATION_EXTRACT_WORKERS", min(4, os.cpu_count() or 1), minimum=0)
+ANNOTATION_EXTRACT_BATCH_PAGES = _get_int("ANNOTATION_EXTRACT_BATCH_PAGES", 4, minimum=1)
+ANNOTATION_OCR_DPI = _get_int("ANNOTATION_OCR_DPI", 200, minimum=50)
+ANNOTATION_RECT_PRECISION = _get_int("ANNOTATION_RECT_PRECISION", 2, minimum=0)
+ANNOTATION_MAX_ACTIVE_JOBS = _get_int("ANNOTATION_MAX_ACTIVE_JOBS", 2, minimum=1)
+ANNOTATION_MAX_QUEUED_JOBS = _get_int("ANNOTATION_MAX_QUEUED_JOBS", 16, minimum=0)
+ANNOTATION_RETRY_AFTER_SECONDS = _get_int("ANNOTATION_RETRY_AFTER_SECONDS", 30, minimum=1)
+ANNOTATION_BATCH_MAX_DOCUMENTS = _get_int("ANNOTATION_BATCH_MAX_DOCUMENTS", 200, minimum=1)
+ANNOTATION_BATCH_DOCUMENTS_IN_FLIGHT = _get_int("ANNOTATION_BATCH_DOCUMENTS_IN_FLIGHT", 2, minimum=1)
+ANNOTATION_STREAM_MAX_BUFFERED_EVENTS = _get_int("ANNOTATION_STREAM_MAX_BUFFERED_EVENTS", 256, minimum=1)
+ANNOTATION_TRACE_SAMPLE_RATE = _get_float("ANNOTATION_TRACE_SAMPLE_RATE", 0.0, minimum=0.0, maximum=1.0)
+ANNOTATION_TRACE_MAX_EVENTS = _get_int("ANNOTATION_TRACE_MAX_EVENTS", 200, minimum=1)
+ANNOTATION_TRACE_SPILL = os.getenv("ANNOTATION_TRACE_SPILL", "false").strip().lower() in ("1", "true", "yes")
+ANNOTATION_PDF_STORE_MAX_BYTES = _get_int("ANNOTATION_PDF_STORE_MAX_BYTES", 2 * 1024**3, minimum=0)
+ANNOTATION_LLM_CACHE_MAX_ENTRIES = _get_int("ANNOTATION_LLM_CACHE_MAX_ENTRIES", 200000, minimum=1)
+ANNOTATION_EMBEDDING_GATE_THRESHOLD = _get_optional_float(
+    "ANNOTATION_EMBEDDING_GATE_THRESHOLD", minimum=-1.0, maximum=1.0
+)
+ANNOTATION_EMBEDDING_GATE_BATCH_SIZE = _get_int("ANNOTATION_EMBEDDING_GATE_BATCH_SIZE", 64, minimum=1)
+ANNOTATION_JOB_ORPHAN_GRACE_SECONDS = _get_float("ANNOTATION_JOB_ORPHAN_GRACE_SECONDS", 300.0, minimum=0.0)
+ANNOTATION_JOB_ORPHAN_POLICY = os.getenv("ANNOTATION_JOB_ORPHAN_POLICY", "cancel").strip().lower()
+if ANNOTATION_JOB_ORPHAN_POLICY not in ("keep", "cancel"):
+    raise ValueError(f"ANNOTATION_JOB_ORPHAN_POLICY must be 'keep' or 'cancel', got {ANNOTATION_JOB_ORPHAN_POLICY!r}")
+ANNOTATION_JOB_RETENTION_SECONDS = _get_float("ANNOTATION_JOB_RETENTION_SECONDS", 3600.0, minimum=0.0)
 QUERY_N_RESULTS = _get_int("QUERY_N_RESULTS", 12, minimum=1)
 QUERY_NEIGHBOR_TOP_N = _get_int("QUERY_NEIGHBOR_TOP_N", 5, minimum=0)
 QUERY_NEIGHBOR_DISTANCE_THRESHOLD = _get_optional_float(
     "QUERY_NEIGHBOR_DISTANCE_THRESHOLD",
     minimum=0.0,
 )
+QUERY_MMR_CANDIDATES = _get_int("QUERY_MMR_CANDIDATES", 48, minimum=1)
+QUERY_MMR_LAMBDA = _get_float("QUERY_MMR_LAMBDA", 0.7, minimum=0.0, maximum=1.0)
+QUERY_MMR_MAX_PER_DOCUMENT = _get_int("QUERY_MMR_MAX_PER_DOCUMENT", 4, minimum=1)
+QUERY_BATCH_SIZE = _get_int("QUERY_BATCH_SIZE", 32, minimum=1)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+# required with every profiling request (X-Profile-Token); profiling stays off without it
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "").strip()
+PROFILING_MAX_SECONDS = _get_float("PROFILING_MAX_SECONDS", 60.0, minimum=1.0)
+PROFILING_SAMPLE_INTERVAL_SECONDS = _get_float("PROFILING_SAMPLE_INTERVAL_SECONDS", 0.005, minimum=0.001)
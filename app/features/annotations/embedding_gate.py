@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Sequence
+from typing import Optional, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+from ollama import AsyncClient
+
+from core.metrics import EMBED_BATCH_SECONDS
+from core.ollama_scheduler import SchedulerJob
+
+S = TypeVar("S")
+
+
+def _normalized(embeddings: Sequence[Sequence[float]]) -> NDArray[np.float32]:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    normalized: NDArray[np.float32] = matrix / norms
+    return normalized
+
+
+class _RuleEmbeddings:
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.matrix: Optional[NDArray[np.float32]] = None
+
+
+class EmbeddingGate:
+    """
+    Pre-filter for the coarse LLM call.
+
+    Rules are embedded once per job; sentences are embedded per chunk in batches and
+    only those whose best cosine similarity to any rule reaches `threshold` are kept.
+    A batch job builds one gate and hands each document a `for_document` copy.
+    """
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        model: str,
+        rule_texts: Sequence[str],
+        threshold: float,
+        batch_size: int,
+        ollama_job: SchedulerJob,
+    ) -> None:
+        self.client = client
+        self.model = model
+        self.rule_texts = list(rule_texts)
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.ollama_job = ollama_job
+        self._rule_embeddings = _RuleEmbeddings()
+        self.chunks_total = 0
+        self.chunks_skipped = 0
+        self.sentences_total = 0
+        self.sentences_kept = 0
+
+    async def _embed(self, texts: Sequence[str]) -> NDArray[np.float32]:
+        async with self.ollama_job.slot():
+            with EMBED_BATCH_SECONDS.labels("annotation_gate").time():
+                response = await self.client.embed(model=self.model, input=list(texts))
+        return _normalized(response.embeddings)
+
+    def for_document(self) -> EmbeddingGate:
+        """A gate with its own counters that shares the rule embeddings of this one."""
+        gate = EmbeddingGate(self.client, self.model, self.rule_texts, self.threshold, self.batch_size, self.ollama_job)
+        gate._rule_embeddings = self._rule_embeddings
+        return gate
+
+    async def _rules(self) -> NDArray[np.float32]:
+        shared = self._rule_embeddings
+        async with shared.lock:
+            if shared.matrix is None:
+                shared.matrix = await self._embed(self.rule_texts)
+            return shared.matrix
+
+    async def scores(self, texts: Sequence[str]) -> NDArray[np.float32]:
+        """Best similarity of every text to any rule."""
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        rule_matrix = await self._rules()
+        batches = await asyncio.gather(
+            *(self._embed(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size))
+        )
+        best: NDArray[np.float32] = (np.concatenate(batches) @ rule_matrix.T).max(axis=1)
+        return best
+
+    async def select(self, sentences: Sequence[S], texts: Sequence[str]) -> list[S]:
+        """Keep the sentences (given with their texts) that pass the threshold."""
+        scores = await self.scores(texts)
+        kept = [s for s, keep in zip(sentences, scores >= self.threshold) if keep]
+
+        self.chunks_total += 1
+        self.sentences_total += len(sentences)
+        self.sentences_kept += len(kept)
+        if not kept:
+            self.chunks_skipped += 1
+        return kept
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "gate_chunks_total": self.chunks_total,
+            "gate_chunks_skipped": self.chunks_skipped,
+            "gate_sentences_total": self.sentences_total,
+            "gate_sentences_kept": self.sentences_kept,
+        }
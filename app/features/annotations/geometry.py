@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import numpy as np
+from numpy.typing import NDArray
+
+from core.settings import ANNOTATION_RECT_PRECISION
+
+
+def merge_line_rects(rects: NDArray[np.floating], precision: int = ANNOTATION_RECT_PRECISION) -> list[list[float]]:
+    """
+    Merge word rects (x0, y0, x1, y1) given in reading order into one rect per line.
+
+    A word starts a new line when its vertical center lies outside the previous word's
+    box or when it does not continue to the right of it. Coordinates are rounded to
+    `precision` decimals.
+    """
+    if len(rects) == 0:
+        return []
+    boxes = np.asarray(rects, dtype=np.float64)
+    x0, y0, x1, y1 = boxes.T
+    center = (y0 + y1) / 2
+    new_line = np.ones(len(boxes), dtype=np.bool_)
+    new_line[1:] = (center[1:] < y0[:-1]) | (center[1:] > y1[:-1]) | (x0[1:] < x0[:-1])
+    starts = np.flatnonzero(new_line)
+    merged = np.column_stack([
+        np.minimum.reduceat(x0, starts),
+        np.minimum.reduceat(y0, starts),
+        np.maximum.reduceat(x1, starts),
+        np.maximum.reduceat(y1, starts),
+    ])
+    rounded: list[list[float]] = np.round(merged, precision).tolist()
+    return rounded
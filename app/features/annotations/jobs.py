@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+from core.metrics import ANNOTATION_JOBS_ACTIVE, ANNOTATION_JOBS_QUEUED
+from core.settings import (
+    ANNOTATION_JOB_ORPHAN_GRACE_SECONDS,
+    ANNOTATION_JOB_ORPHAN_POLICY,
+    ANNOTATION_JOB_RETENTION_SECONDS,
+    ANNOTATION_MAX_ACTIVE_JOBS,
+    ANNOTATION_MAX_QUEUED_JOBS,
+    ANNOTATION_STREAM_MAX_BUFFERED_EVENTS,
+)
+from features.annotations.llm_service import ANNOTATION_ERRORS
+from features.annotations.schemas import (
+    AnnotationDoneEvent,
+    AnnotationJobEvent,
+    AnnotationJobStatus,
+    AnnotationQueuedEvent,
+    ErrorEvent,
+    ndjson_annotation,
+)
+from features.annotations.trace import TraceRecorder
+
+logger = logging.getLogger(__name__)
+
+ANNOTATION_JOBS_DIR = Path(os.getenv("ANNOTATION_JOBS_DIR", "/cache/annotation_jobs"))
+
+_INTERRUPTED_MESSAGE = "Annotation job was interrupted before it finished"
+
+
+class EventStream:
+    """
+    Bounded buffer of NDJSON lines for one subscriber.
+
+    Lines with a `coalesce_key` (progress, queue position, concurrency) replace a still
+    undelivered line with the same key, so they never pile up. Other lines are kept in
+    order; a subscriber that falls more than `max_buffered` of them behind is closed
+    and has to resume through the job's replay instead.
+    """
+
+    def __init__(self, max_buffered: int = ANNOTATION_STREAM_MAX_BUFFERED_EVENTS) -> None:
+        self.max_buffered = max_buffered
+        self.overflowed = False
+        self._lines: Deque[list[Optional[str]]] = deque()
+        self._pending_by_key: Dict[str, list[Optional[str]]] = {}
+        self._buffered = 0
+        self._closed = False
+        self._wakeup = asyncio.Event()
+
+    def put(self, line: str, coalesce_key: Optional[str] = None) -> None:
+        if self._closed:
+            return
+        if coalesce_key is not None:
+            entry = self._pending_by_key.get(coalesce_key)
+            if entry is not None:
+                entry[1] = line
+                return
+            entry = [coalesce_key, line]
+            self._pending_by_key[coalesce_key] = entry
+        else:
+            if self._buffered >= self.max_buffered:
+                logger.warning("Annotation stream subscriber is too slow, closing its stream")
+                self.overflowed = True
+                self._lines.clear()
+                self._pending_by_key.clear()
+                self.close()
+                return
+            entry = [None, line]
+            self._buffered += 1
+        self._lines.append(entry)
+        self._wakeup.set()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+
+    async def get(self) -> Optional[str]:
+        """Next line, or None once the stream is closed and drained."""
+        while not self._lines:
+            if self._closed:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        key, line = self._lines.popleft()
+        if key is None:
+            self._buffered -= 1
+        else:
+            del self._pending_by_key[key]
+        return line
+
+
+class AnnotationJob:
+    """
+    One annotation run, independent of the HTTP stream that started it.
+
+    Emitted NDJSON lines are fanned out to all subscribers. Match events are kept
+    (and appended to `results_path`) so a reconnecting client gets every finished
+    match again, followed by the latest progress event of each kind and the live stream.
+    """
+
+    def __init__(self, job_id: str, results_path: Optional[Path]) -> None:
+        self.job_id = job_id
+        self.results_path = results_path
+        self.status: AnnotationJobStatus = "running"
+        self.finished_at: Optional[float] = None
+        self._result_lines: List[str] = []
+        # latest progress line per kind; a batch reports one kind per document
+        self._last_progress: Dict[str, str] = {}
+        self._final_lines: List[str] = []
+        self._subscribers: set[EventStream] = set()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._orphan_timer: Optional[asyncio.TimerHandle] = None
+        self.trace: Optional[TraceRecorder] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status != "running"
+
+    def start(self, compute: Callable[[AnnotationJob], Awaitable[None]]) -> None:
+        self._task = asyncio.create_task(self._run(compute))
+
+    async def _run(self, compute: Callable[[AnnotationJob], Awaitable[None]]) -> None:
+        status: AnnotationJobStatus = "error"
+        error = "Annotation job failed unexpectedly"
+        try:
+            await compute(self)
+            status = "done"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            error = "Annotation job was cancelled"
+        except ANNOTATION_ERRORS as e:
+            logger.error(f"Error in annotation job {self.job_id}: {e}")
+            error = str(e)
+        finally:
+            # anything else is a bug: it still ends the job for its clients, then propagates
+            if status != "done":
+                self._final_lines.append(ndjson_annotation(ErrorEvent(message=error)))
+            self._final_lines.append(ndjson_annotation(AnnotationDoneEvent()))
+            self._persist(self._final_lines)
+            self.status = status
+            self.finished_at = time.time()
+            self._cancel_orphan_timer()
+            for stream in self._subscribers:
+                for line in self._final_lines:
+                    stream.put(line)
+                stream.close()
+        self._subscribers.clear()
+
+    def cancel(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def publish_progress(self, line: str, kind: str = "progress") -> None:
+        """Progress-like state; subscribers only get the latest line of each kind."""
+        self._last_progress[kind] = line
+        for stream in self._subscribers:
+            stream.put(line, coalesce_key=kind)
+
+    def publish_result(self, line: str) -> None:
+        """Matches and other results that every (re)connecting subscriber must get."""
+        self._result_lines.append(line)
+        self._persist([line])
+        for stream in self._subscribers:
+            stream.put(line)
+
+    def _persist(self, lines: List[str]) -> None:
+        if self.results_path is None:
+            return
+        try:
+            with self.results_path.open("a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except OSError as e:
+            logger.warning(f"Cannot persist results of annotation job {self.job_id}: {e}")
+            self.results_path = None
+
+    def subscribe(self) -> EventStream:
+        """Stream starting with the replay of everything finished so far."""
+        replay = [ndjson_annotation(AnnotationJobEvent(jobId=self.job_id, status=self.status)), *self._result_lines]
+        replay.extend(self._last_progress.values())
+        if self.finished:
+            replay.extend(self._final_lines)
+        # the replay is already in memory, only live lines count against the bound
+        stream = EventStream(max_buffered=ANNOTATION_STREAM_MAX_BUFFERED_EVENTS + len(replay))
+        for line in replay:
+            stream.put(line)
+        if self.finished:
+            stream.close()
+            return stream
+        self._cancel_orphan_timer()
+        self._subscribers.add(stream)
+        return stream
+
+    def unsubscribe(self, stream: EventStream) -> None:
+        self._subscribers.discard(stream)
+        if not self._subscribers and not self.finished and self._orphan_timer is None:
+            loop = asyncio.get_running_loop()
+            self._orphan_timer = loop.call_later(ANNOTATION_JOB_ORPHAN_GRACE_SECONDS, self._on_orphaned)
+
+    def _cancel_orphan_timer(self) -> None:
+        if self._orphan_timer is not None:
+            self._orphan_timer.cancel()
+            self._orphan_timer = None
+
+    def _on_orphaned(self) -> None:
+        self._orphan_timer = None
+        if self._subscribers or self.finished:
+            return
+        if ANNOTATION_JOB_ORPHAN_POLICY == "cancel":
+            logger.info(f"Cancelling annotation job {self.job_id}: no client reconnected")
+            self.cancel()
+        else:
+            logger.info(f"Annotation job {self.job_id} has no client, keeping it running")
+
+
+class AnnotationAdmission:
+    """
+    Limits how many annotation jobs run at once.
+
+    Further jobs wait in FIFO order and are told their queue position; once
+    `max_active + max_queued` jobs are accepted, `reserve` refuses new ones.
+    """
+
+    def __init__(self, max_active: int, max_queued: int) -> None:
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.active = 0
+        self._reserved = 0
+        self._waiting: Deque[tuple[AnnotationJob, asyncio.Future[None]]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def reserve(self) -> bool:
+        """Accept a job that will call `acquire`; False when the queue is full."""
+        if self.active + self._reserved >= self.max_active + self.max_queued:
+            return False
+        self._reserved += 1
+        return True
+
+    async def acquire(self, job: AnnotationJob) -> None:
+        """Wait until the (reserved) job may run."""
+        if self.active < self.max_active and not self._waiting:
+            self._reserved -= 1
+            self.active += 1
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiting.append((job, waiter))
+        self._publish_positions()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._waiting.remove((job, waiter))
+                self._reserved -= 1
+                self._publish_positions()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        while self._waiting and self.active < self.max_active:
+            _job, waiter = self._waiting.popleft()
+            waiter.set_result(None)
+            self._reserved -= 1
+            self.active += 1
+        self._publish_positions()
+
+    def _publish_positions(self) -> None:
+        for position, (job, _waiter) in enumerate(self._waiting, start=1):
+            event = AnnotationQueuedEvent(position=position, queued=len(self._waiting))
+            job.publish_progress(ndjson_annotation(event), kind="queue")
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": self.active, "queued": self.queued, "max_active": self.max_active, "max_queued": self.max_queued}
+
+
+class AnnotationJobRegistry:
+    def __init__(self, jobs_dir: Path) -> None:
+        self.jobs_dir = jobs_dir
+        self._jobs: Dict[str, AnnotationJob] = {}
+        self._dir_ready = False
+
+    def _results_path(self, job_id: str) -> Optional[Path]:
+        if not self._dir_ready:
+            try:
+                self.jobs_dir.mkdir(parents=True, exist_ok=True)
+                self._dir_ready = True
+            except OSError as e:
+                logger.warning(f"Annotation job results are not persisted, cannot create {self.jobs_dir}: {e}")
+                return None
+        return self.jobs_dir / f"{job_id}.ndjson"
+
+    def create(self) -> AnnotationJob:
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = AnnotationJob(job_id, self._results_path(job_id))
+        self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[AnnotationJob]:
+        return self._jobs.get(job_id)
+
+    def replay_from_disk(self, job_id: str) -> Optional[List[str]]:
+        """Persisted lines of a job this process no longer knows (e.g. after a restart)."""
+        if not all(c in "0123456789abcdef" for c in job_id) or len(job_id) != 32:
+            return None
+        path = self.jobs_dir / f"{job_id}.ndjson"
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+        except OSError:
+            return None
+        status: AnnotationJobStatus = "error"
+        if lines and json.loads(lines[-1]).get("type") == "done":
+            status = "done"
+            for line in lines:
+                if json.loads(line).get("type") == "error":
+                    status = "error"
+        else:
+            lines += [
+                ndjson_annotation(ErrorEvent(message=_INTERRUPTED_MESSAGE)),
+                ndjson_annotation(AnnotationDoneEvent()),
+            ]
+        return [ndjson_annotation(AnnotationJobEvent(jobId=job_id, status=status)), *lines]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - ANNOTATION_JOB_RETENTION_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+        if not self._dir_ready:
+            return
+        try:
+            for path in self.jobs_dir.glob("*.ndjson"):
+                if path.stem not in self._jobs and path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Failed to prune annotation job results: {e}")
+
+
+ANNOTATION_JOBS = AnnotationJobRegistry(ANNOTATION_JOBS_DIR)
+ANNOTATION_ADMISSION = AnnotationAdmission(ANNOTATION_MAX_ACTIVE_JOBS, ANNOTATION_MAX_QUEUED_JOBS)
+ANNOTATION_JOBS_ACTIVE.set_function(lambda: ANNOTATION_ADMISSION.active)
+ANNOTATION_JOBS_QUEUED.set_function(lambda: ANNOTATION_ADMISSION.queued)
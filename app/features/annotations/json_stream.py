@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+from typing import Any, List, Optional
+
+
+class JsonArrayItemStream:
+    """
+    Incremental parser for streamed JSON of the shape `{..., "<key>": [{...}, {...}], ...}`.
+
+    `feed` takes the next piece of text and returns the array items whose closing
+    brace arrived with it, so callers can act on each item before the rest of the
+    response has been generated. Text around the JSON object (e.g. code fences) is
+    ignored; items that are not valid JSON are skipped.
+    """
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._done = False
+
+    def feed(self, text: str) -> List[Any]:
+        self._buf += text
+        items: List[Any] = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._array_depth is None:
+                        self._last_string = self._decode(self._string_start, i + 1)
+                continue
+            if self._done:
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._current_key == self.key and self._array_depth is None:
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._array_depth is not None and self._depth == self._array_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if ch == "}" and self._depth == self._array_depth and self._item_start is not None:
+                        item = self._decode(self._item_start, i + 1)
+                        if item is not None:
+                            items.append(item)
+                        self._item_start = None
+                    elif self._depth < self._array_depth:
+                        self._done = True
+        self._pos = len(buf)
+        self._compact()
+        return items
+
+    def _decode(self, start: int, end: int) -> Any:
+        try:
+            return json.loads(self._buf[start:end])
+        except ValueError:
+            return None
+
+    def _compact(self) -> None:
+        """Drop consumed text that no pending item or string still refers to."""
+        keep = self._pos
+        if self._item_start is not None:
+            keep = min(keep, self._item_start)
+        if self._in_string:
+            keep = min(keep, self._string_start)
+        if keep == 0:
+            return
+        self._buf = self._buf[keep:]
+        self._pos -= keep
+        if self._item_start is not None:
+            self._item_start -= keep
+        self._string_start -= keep
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+from core.settings import ANNOTATION_LLM_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+CacheMode = Literal["use", "bypass", "refresh"]
+
+LLM_CACHE_PATH = Path(os.getenv("ANNOTATION_LLM_CACHE_PATH", "/cache/annotation_llm_cache.sqlite3"))
+
+_PRUNE_EVERY_PUTS = 256
+# Hits refresh `last_used` at most this often per entry; pruning needs no finer order.
+_TOUCH_INTERVAL_SECONDS = 3600.0
+
+
+def cache_key(request_payload: dict[str, Any]) -> str:
+    """Key on everything that determines a deterministic chat response."""
+    keyed = {
+        "model": request_payload.get("model"),
+        "messages": request_payload.get("messages"),
+        "format": request_payload.get("format"),
+        "options": request_payload.get("options"),
+    }
+    encoded = json.dumps(keyed, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed store of raw chat responses, shared by all annotation jobs.
+
+    A key that missed is claimed by its caller until it `settle`s it; identical lookups
+    meanwhile wait for that response instead of sending the same prompt to Ollama.
+    """
+
+    def __init__(self, path: Path, max_entries: int = ANNOTATION_LLM_CACHE_MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disabled = False
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self._in_flight: dict[str, asyncio.Future[Optional[str]]] = {}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " raw TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            conn.commit()
+            self._conn = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"LLM response cache disabled, cannot open {self.path}: {e}")
+            self._disabled = True
+        return self._conn
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute("SELECT raw, last_used FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - float(row[1]) >= _TOUCH_INTERVAL_SECONDS:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+            return str(row[0])
+
+    def _put(self, key: str, model: str, raw: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, raw, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, raw, now, now),
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= _PRUNE_EVERY_PUTS:
+                self._puts_since_prune = 0
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            conn.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM response cache read failed: {e}")
+            return None
+
+    async def put(self, key: str, model: str, raw: str) -> None:
+        try:
+            await asyncio.to_thread(self._put, key, model, raw)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM response cache write failed: {e}")
+
+    async def get_or_claim(self, key: str) -> Optional[str]:
+        """The cached (or concurrently fetched) response; None claims the key for the caller."""
+        while True:
+            pending = self._in_flight.get(key)
+            if pending is not None:
+                raw = await asyncio.shield(pending)
+                if raw is not None:
+                    return raw
+                # the claimant failed; the first waiter to get here claims the key next
+                continue
+            raw = await self.get(key)
+            if raw is not None:
+                return raw
+            if key not in self._in_flight:
+                self._in_flight[key] = asyncio.get_running_loop().create_future()
+                return None
+
+    def settle(self, key: str, raw: Optional[str]) -> None:
+        """Hand the response of a claimed key (None if there is none) to the waiting lookups."""
+        pending = self._in_flight.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(raw)
+
+
+LLM_RESPONSE_CACHE = LLMResponseCache(LLM_CACHE_PATH)
+
+
+class LLMCacheSession:
+    """Per-job view on the response cache that applies the cache mode and counts hits."""
+
+    def __init__(self, cache: LLMResponseCache, mode: CacheMode = "use") -> None:
+        self.cache = cache
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._claimed: set[str] = set()
+
+    async def lookup(self, request_payload: dict[str, Any]) -> Optional[str]:
+        """On a miss in "use" mode the caller must `settle` the request once it has a response."""
+        if self.mode != "use":
+            self.misses += 1
+            return None
+        key = cache_key(request_payload)
+        raw = await self.cache.get_or_claim(key)
+        if raw is None:
+            self.misses += 1
+            self._claimed.add(key)
+        else:
+            self.hits += 1
+        return raw
+
+    def settle(self, request_payload: dict[str, Any], raw: Optional[str]) -> None:
+        key = cache_key(request_payload)
+        if key in self._claimed:
+            self._claimed.discard(key)
+            self.cache.settle(key, raw)
+
+    async def store(self, request_payload: dict[str, Any], raw: str) -> None:
+        self.settle(request_payload, raw)
+        if self.mode == "bypass":
+            return
+        await self.cache.put(cache_key(request_payload), str(request_payload.get("model", "")), raw)
+
+    def stats(self) -> dict[str, int]:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
@@ -1,48 +1,102 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
 import json
 import logging
 import re
+import time
 from collections.abc import Awaitable, Callable, Sequence
 from dataclasses import dataclass
-from typing import Any, List, Optional, Protocol
-
-from ollama import AsyncClient
-from pydantic import BaseModel, Field
-
-from core.settings import ANNOTATION_DEFAULT_CHUNK_SIZE, MAX_OLLAMA_PARALLEL_CALLS
-from features.annotations.pdf_text_recognition import Rect, TextPlaceRecognitionPDF
+from typing import Any, List, Optional, Protocol, TypeVar
+
+import httpx
+import numpy as np
+from ollama import AsyncClient, RequestError, ResponseError
+from pydantic import BaseModel, Field, ValidationError
+
+from core.metrics import ANNOTATION_STAGE_SECONDS, CHUNKING_SECONDS
+from core.ollama_scheduler import OLLAMA_SCHEDULER, Priority, SchedulerJob
+from core.settings import (
+    ANNOTATION_CONTEXT_TOKENS,
+    ANNOTATION_DEFAULT_CHUNK_SIZE,
+    ANNOTATION_EMBEDDING_GATE_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    MAX_OLLAMA_PARALLEL_CALLS,
+)
+from features.annotations.embedding_gate import EmbeddingGate
+from features.annotations.geometry import merge_line_rects
+from features.annotations.json_stream import JsonArrayItemStream
+from features.annotations.llm_cache import LLMCacheSession
+from features.annotations.pdf_text_recognition import (
+    OCR_ERRORS,
+    PDF_PARSE_ERRORS,
+    PageData,
+    TextPlaceRecognitionPDF,
+)
+from features.annotations.token_table import TokenTable, TokenView
+from features.annotations.trace import TraceRecorder
 from features.prompts.store import render_prompt
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class RuleLike(Protocol):
     id: str
     termsRaw: str
 
-@dataclass
-class Token:
-    text: str
-    rect: Optional[Rect]
-    page: int
 
+@dataclass(frozen=True)
+class CompiledRules:
+    """A rule set prepared once and shared by every chunk (and document) it is applied to."""
+    rules: Sequence[RuleLike]
+    by_id: dict[str, RuleLike]
+    descriptions: str
+
+    @property
+    def texts(self) -> List[str]:
+        return [r.termsRaw for r in self.rules]
+
+
+def compile_rules(rules: Sequence[RuleLike]) -> CompiledRules:
+    return CompiledRules(
+        rules=list(rules),
+        by_id={r.id: r for r in rules},
+        descriptions="\n".join(f'- ID "{r.id}": {r.termsRaw}' for r in rules),
+    )
 
 @dataclass
 class SentenceSpan:
     sid: str
-    text: str
     token_start: int
     token_end: int
+    # Cut at the length limit instead of a sentence end, so the next span continues it.
+    forced_end: bool = False
 
 
 @dataclass
 class Chunk:
-    text: str
-    tokens: List[Token]
+    """
+    Whole sentences owned by exactly one chunk. Sentence token indices are global;
+    the optional context views are shown to the LLM but can never be selected.
+    """
+    tokens: TokenView
     sentences: List[SentenceSpan]
-    start_index: int
+    context_before: Optional[TokenView] = None
+    context_after: Optional[TokenView] = None
+
+    @property
+    def start_index(self) -> int:
+        return self.tokens.start
+
+    @property
+    def text(self) -> str:
+        return self.tokens.text
+
+    def sentence_text(self, sentence: SentenceSpan) -> str:
+        return self.tokens.table.span_text(sentence.token_start, sentence.token_end + 1)
 
 
 @dataclass
@@ -70,6 +124,35 @@ class LLMBoundaryResponse(BaseModel):
     spans: List[LLMBoundarySpan] = Field(default_factory=list)
 
 
+# What an annotation run fails with: Ollama refusing, timing out or being unreachable
+# (ConnectionError is an OSError), unusable model output (ValidationError is a
+# ValueError), and PDFs that neither pdfplumber nor OCR can read.
+ANNOTATION_ERRORS = (
+    ResponseError,
+    RequestError,
+    httpx.HTTPError,
+    OSError,
+    ValueError,
+    *PDF_PARSE_ERRORS,
+    *OCR_ERRORS,
+)
+
+def build_embedding_gate(
+    ollama_client: AsyncClient,
+    compiled_rules: CompiledRules,
+    threshold: float,
+    ollama_job: SchedulerJob,
+) -> EmbeddingGate:
+    return EmbeddingGate(
+        client=ollama_client,
+        model=EMBEDDING_MODEL,
+        rule_texts=compiled_rules.texts,
+        threshold=threshold,
+        batch_size=ANNOTATION_EMBEDDING_GATE_BATCH_SIZE,
+        ollama_job=ollama_job,
+    )
+
+
 ProgressCallback = Callable[[dict[str, Any]], Awaitable[None]]
 ChunkMatchesCallback = Callable[[List[dict[str, Any]]], Awaitable[None]]
 
@@ -80,120 +163,71 @@ async def process_annotations(
     answer_model: str,
     ollama_client: AsyncClient,
     chunk_size: Optional[int] = None,
-    debug_events: Optional[List[dict[str, Any]]] = None,
+    trace: Optional[TraceRecorder] = None,
     page_range: Optional[tuple[int, int]] = None,
     progress_callback: Optional[ProgressCallback] = None,
     chunk_matches_callback: Optional[ChunkMatchesCallback] = None,
+    llm_cache: Optional[LLMCacheSession] = None,
+    embedding_gate_threshold: Optional[float] = None,
+    context_tokens: Optional[int] = None,
+    compiled_rules: Optional[CompiledRules] = None,
+    ollama_job: Optional[SchedulerJob] = None,
+    job_embedding_gate: Optional[EmbeddingGate] = None,
 ) -> List[dict[str, Any]]:
 
-    recognizer = TextPlaceRecognitionPDF(pdf_path)
-    pages = recognizer.extract_text()
-
-    if page_range is not None:
-        start_page, end_page = page_range
-        pages = [p for p in pages if start_page <= p["page"] <= end_page]
-
-    if not pages:
-        return []
-
-    if progress_callback is not None:
-        await progress_callback({"stage": "text_extracted", "pages": len(pages)})
-
-    all_tokens: List[Token] = []
-    for page in pages:
-        for word in page["words"]:
-            all_tokens.append(Token(
-                text=word["text"],
-                rect=word["rect"],
-                page=page["page"]
-            ))
-
-    if not all_tokens:
-        return []
-
-    if progress_callback is not None:
-        await progress_callback({"stage": "tokens_indexed", "tokens": len(all_tokens)})
-
     resolved_chunk_size = chunk_size or ANNOTATION_DEFAULT_CHUNK_SIZE
-    chunks = _create_chunks(all_tokens, chunk_size=resolved_chunk_size, overlap=150)
-    if progress_callback is not None:
-        await progress_callback({"stage": "chunking_done", "total_chunks": len(chunks)})
+    resolved_context_tokens = ANNOTATION_CONTEXT_TOKENS if context_tokens is None else context_tokens
+    table = TokenTable()
+    builder = ChunkBuilder(table, chunk_size=resolved_chunk_size, context_tokens=resolved_context_tokens)
 
-    seen_spans: set[tuple[str, int, int]] = set()
     final_matches: List[dict[str, Any]] = []
-    ollama_chat_semaphore = asyncio.Semaphore(MAX_OLLAMA_PARALLEL_CALLS)
+    compiled = compiled_rules or compile_rules(rules)
+    # MAX_OLLAMA_PARALLEL_CALLS still caps a single job; the scheduler caps the process.
+    # A batch passes one job for all of its documents, so they share that budget.
+    if ollama_job is None:
+        ollama_job = OLLAMA_SCHEDULER.job("annotations", Priority.BATCH, max_parallel=MAX_OLLAMA_PARALLEL_CALLS)
+    # The gate of a job (see build_embedding_gate) embeds the rules once for all of its documents.
+    embedding_gate: Optional[EmbeddingGate] = None
+    if job_embedding_gate is not None:
+        embedding_gate = job_embedding_gate.for_document()
+    elif embedding_gate_threshold is not None:
+        embedding_gate = build_embedding_gate(ollama_client, compiled, embedding_gate_threshold, ollama_job)
+
+    # Chunks are dispatched while later pages are still being extracted, so the
+    # chunk total is only known (and reported) once extraction has finished.
+    total_chunks: Optional[int] = None
+
+    async def _report(payload: dict[str, Any]) -> None:
+        if progress_callback is None:
+            return
+        if "total_chunks" in payload:
+            payload = {**payload, "total_chunks": total_chunks}
+        await progress_callback(payload)
 
-    async def _run_chunk(
-        chunk: Chunk,
-        chunk_number: int,
-        total_chunks: int,
-    ) -> tuple[int, Chunk, List[ExactSpanMatch]]:
-        if progress_callback is not None:
-            await progress_callback(
-                {
-                    "stage": "chunk_started",
-                    "chunk_number": chunk_number,
-                    "total_chunks": total_chunks,
-                }
-            )
-        return chunk_number, chunk, await _process_chunk(
-            chunk,
-            rules,
-            answer_model,
-            ollama_client,
-            ollama_chat_semaphore,
-            debug_events,
-            progress_callback=progress_callback,
-            chunk_number=chunk_number,
-            total_chunks=total_chunks,
-        )
+    completed_chunks = 0
 
-    tasks: List[asyncio.Task[tuple[int, Chunk, List[ExactSpanMatch]]]] = []
-    dispatched_chunks = 0
-    for i, chunk in enumerate(chunks, start=1):
-        tasks.append(asyncio.create_task(_run_chunk(chunk, i, len(chunks))))
-        dispatched_chunks += 1
-        if progress_callback is not None:
-            await progress_callback(
-                {
-                    "stage": "chunk_dispatched",
-                    "dispatched_chunks": dispatched_chunks,
-                    "total_chunks": len(chunks),
-                }
+    async def _run_chunk(chunk: Chunk, chunk_number: int) -> None:
+        nonlocal completed_chunks
+        await _report({"stage": "chunk_started", "chunk_number": chunk_number, "total_chunks": None})
+        with ANNOTATION_STAGE_SECONDS.labels("chunk").time():
+            results = await _process_chunk(
+                chunk,
+                compiled,
+                answer_model,
+                ollama_client,
+                ollama_job,
+                trace,
+                progress_callback=_report if progress_callback is not None else None,
+                chunk_number=chunk_number,
+                llm_cache=llm_cache,
+                embedding_gate=embedding_gate,
             )
 
-    completed_chunks = 0
-    for task in asyncio.as_completed(tasks):
-        _, chunk, results = await task
         chunk_matches: List[dict[str, Any]] = []
         for hit in results:
             global_start = chunk.start_index + hit.start_token
             global_end = chunk.start_index + hit.end_token
-            key = (hit.rule_id, global_start, global_end)
-
-            if key in seen_spans:
-                continue
-            seen_spans.add(key)
-
-            by_page: dict[int, list[Rect]] = {}
-
-            for idx in range(hit.start_token, hit.end_token + 1):
-                tok = chunk.tokens[idx]
-                if tok.rect:
-                    by_page.setdefault(tok.page, []).append(tok.rect)
-
-            for page_idx, rects in by_page.items():
-                page_tokens = [
-                    chunk.tokens[idx].text
-                    for idx in range(hit.start_token, hit.end_token + 1)
-                    if chunk.tokens[idx].page == page_idx
-                ]
-                chunk_matches.append({
-                    "id": hit.rule_id,
-                    "page": page_idx,
-                    "rects": rects,
-                    "text": " ".join(page_tokens).strip()
-                })
+            chunk_matches.extend(_span_matches(table, hit.rule_id, global_start, global_end + 1))
 
         if chunk_matches:
             final_matches.extend(chunk_matches)
@@ -201,212 +235,412 @@ async def process_annotations(
                 await chunk_matches_callback(chunk_matches)
 
         completed_chunks += 1
-        if progress_callback is not None:
-            await progress_callback(
-                {
-                    "stage": "chunk_processed",
-                    "completed_chunks": completed_chunks,
-                    "total_chunks": len(chunks),
-                    "matches_so_far": len(final_matches),
-                }
-            )
+        await _report(
+            {
+                "stage": "chunk_processed",
+                "completed_chunks": completed_chunks,
+                "total_chunks": None,
+                "matches_so_far": len(final_matches),
+                **(llm_cache.stats() if llm_cache is not None else {}),
+            }
+        )
 
-    if progress_callback is not None:
-        await progress_callback({"stage": "done", "matches": len(final_matches)})
+    tasks: List[asyncio.Task[None]] = []
 
-    return final_matches
+    async def _dispatch(chunks: Sequence[Chunk]) -> None:
+        for chunk in chunks:
+            tasks.append(asyncio.create_task(_run_chunk(chunk, len(tasks) + 1)))
+            await _report({"stage": "chunk_dispatched", "dispatched_chunks": len(tasks), "total_chunks": None})
 
-def _create_chunks(tokens: List[Token], chunk_size: int, overlap: int) -> List[Chunk]:
-    chunks: List[Chunk] = []
+    recognizer = TextPlaceRecognitionPDF(pdf_path)
+    pages_extracted = 0
+    started = time.perf_counter()
+    chunking_seconds = 0.0
 
-    if len(tokens) <= chunk_size:
-        batch = tokens
-        text = " ".join(t.text for t in batch)
-        sentences = _create_sentences(batch)
-        return [Chunk(text=text, tokens=batch, sentences=sentences, start_index=0)]
+    def _advance(final: bool = False) -> List[Chunk]:
+        nonlocal chunking_seconds
+        chunking_started = time.perf_counter()
+        chunks = builder.advance(final=final)
+        chunking_seconds += time.perf_counter() - chunking_started
+        return chunks
 
-    step = chunk_size - overlap
-    if step < 1:
-        step = 1
+    try:
+        async for page in recognizer.iter_pages(page_range):
+            pages_extracted += 1
+            table.append_page(page["page"], page["words"])
+            await _dispatch(_advance())
+        await _dispatch(_advance(final=True))
+        total_chunks = len(tasks)
+        ANNOTATION_STAGE_SECONDS.labels("extraction").observe(time.perf_counter() - started)
+        CHUNKING_SECONDS.labels("annotations").observe(chunking_seconds)
+
+        if pages_extracted == 0 or len(table) == 0:
+            return []
+
+        await _report({"stage": "text_extracted", "pages": pages_extracted})
+        await _report({"stage": "tokens_indexed", "tokens": len(table)})
+        await _report({"stage": "chunking_done", "total_chunks": total_chunks})
+
+        await _gather_or_cancel(tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    ANNOTATION_STAGE_SECONDS.labels("document").observe(time.perf_counter() - started)
+
+    if embedding_gate is not None:
+        gate_stats = embedding_gate.stats()
+        logger.info(
+            f"Embedding gate (threshold {embedding_gate.threshold}): "
+            f"skipped {gate_stats['gate_chunks_skipped']}/{gate_stats['gate_chunks_total']} chunks, "
+            f"kept {gate_stats['gate_sentences_kept']}/{gate_stats['gate_sentences_total']} sentences"
+        )
 
-    for i in range(0, len(tokens), step):
-        batch = tokens[i:i + chunk_size]
-        if not batch:
-            break
+    if progress_callback is not None:
+        await progress_callback(
+            {
+                "stage": "done",
+                "matches": len(final_matches),
+                **(llm_cache.stats() if llm_cache is not None else {}),
+                **(embedding_gate.stats() if embedding_gate is not None else {}),
+            }
+        )
+
+    return final_matches
 
-        text = " ".join(t.text for t in batch)
-        sentences = _create_sentences(batch)
-        chunks.append(Chunk(text=text, tokens=batch, sentences=sentences, start_index=i))
+def build_chunks(
+        pages: Sequence[PageData],
+        chunk_size: int,
+        context_tokens: int = ANNOTATION_CONTEXT_TOKENS,
+) -> tuple[TokenTable, List[Chunk]]:
+    table = TokenTable.from_pages([(page["page"], page["words"]) for page in pages])
+    return table, _create_chunks(table, chunk_size=chunk_size, context_tokens=context_tokens)
+
+
+def _create_chunks(table: TokenTable, chunk_size: int, context_tokens: int = 0) -> List[Chunk]:
+    return ChunkBuilder(table, chunk_size=chunk_size, context_tokens=context_tokens).advance(final=True)
+
+
+class ChunkBuilder:
+    """
+    Pack whole sentences into chunks of at most `chunk_size` tokens, without overlap,
+    while pages are still being appended to the table.
+
+    A chunk is emitted once the sentence after it is known (or at the end of the
+    document). Context is only added where a neighbouring sentence was cut at the
+    length limit, i.e. where the chunk boundary splits running text: up to
+    `context_tokens` tokens of that neighbour are attached as read-only context.
+    """
+
+    def __init__(self, table: TokenTable, chunk_size: int, context_tokens: int = 0) -> None:
+        self.table = table
+        self.chunk_size = chunk_size
+        self.context_tokens = context_tokens
+        self.sentences: List[SentenceSpan] = []
+        self._segmented = 0
+        self._packed = 0
+
+    def advance(self, final: bool = False) -> List[Chunk]:
+        """Chunks that became complete since the last call; `final` flushes the rest."""
+        self.sentences.extend(_create_sentences(
+            self.table.view(self._segmented, len(self.table)),
+            max_tokens_per_sentence=min(80, self.chunk_size),
+            first_sid=len(self.sentences) + 1,
+            final=final,
+        ))
+        if self.sentences:
+            self._segmented = self.sentences[-1].token_end + 1
+
+        sentences = self.sentences
+        table = self.table
+        chunks: List[Chunk] = []
+        i = self._packed
+        while i < len(sentences):
+            first = sentences[i].token_start
+            j = i
+            while j + 1 < len(sentences) and sentences[j + 1].token_end - first < self.chunk_size:
+                j += 1
+            if j + 1 == len(sentences) and not final:
+                break
+
+            context_before: Optional[TokenView] = None
+            if self.context_tokens > 0 and i > 0 and sentences[i - 1].forced_end:
+                prev = sentences[i - 1]
+                context_before = table.view(
+                    max(prev.token_start, prev.token_end + 1 - self.context_tokens), prev.token_end + 1
+                )
+            context_after: Optional[TokenView] = None
+            if self.context_tokens > 0 and j + 1 < len(sentences) and sentences[j].forced_end:
+                nxt = sentences[j + 1]
+                context_after = table.view(
+                    nxt.token_start, min(nxt.token_end + 1, nxt.token_start + self.context_tokens)
+                )
+
+            chunks.append(Chunk(
+                tokens=table.view(first, sentences[j].token_end + 1),
+                sentences=sentences[i:j + 1],
+                context_before=context_before,
+                context_after=context_after,
+            ))
+            i = j + 1
 
-        if len(batch) < overlap and i > 0:
-            break
+        self._packed = i
+        return chunks
 
-    return chunks
 
+def _create_sentences(
+        tokens: TokenView,
+        max_tokens_per_sentence: int = 80,
+        first_sid: int = 1,
+        final: bool = True,
+) -> List[SentenceSpan]:
+    """
+    Split tokens into sentences (global indices) using the table's precomputed sentence ends.
 
-def _create_sentences(tokens: List[Token], max_tokens_per_sentence: int = 80) -> List[SentenceSpan]:
+    With `final=False` a trailing sentence that may still continue is left out.
+    """
     sentences: List[SentenceSpan] = []
-    if not tokens:
+    n = len(tokens)
+    if n == 0:
         return sentences
 
+    natural_ends = np.flatnonzero(tokens.table.ends_sentence[tokens.start:tokens.end]).tolist()
     start = 0
-    sid_counter = 1
-
-    def _ends_sentence(tok_text: str) -> bool:
-        return bool(re.search(r"[.!?][\"'”’)\]]*$", tok_text)) or bool(re.search(r"[.!?]$", tok_text))
-
-    i = 0
-    while i < len(tokens):
-        current_len = i - start + 1
-        is_boundary = _ends_sentence(tokens[i].text)
-
-        if not is_boundary and current_len >= max_tokens_per_sentence:
-            is_boundary = True
-
-        if is_boundary:
-            sent_tokens = tokens[start:i + 1]
-            sentences.append(SentenceSpan(
-                sid=f"S{sid_counter}",
-                text=" ".join(t.text for t in sent_tokens),
-                token_start=start,
-                token_end=i
-            ))
-            sid_counter += 1
-            start = i + 1
-
-        i += 1
 
-    if start < len(tokens):
-        sent_tokens = tokens[start:]
+    def _emit(end: int, forced: bool = False) -> None:
         sentences.append(SentenceSpan(
-            sid=f"S{sid_counter}",
-            text=" ".join(t.text for t in sent_tokens),
-            token_start=start,
-            token_end=len(tokens) - 1
+            sid=f"S{first_sid + len(sentences)}",
+            token_start=tokens.start + start,
+            token_end=tokens.start + end,
+            forced_end=forced,
         ))
 
+    for end in natural_ends:
+        while end - start + 1 > max_tokens_per_sentence:
+            _emit(start + max_tokens_per_sentence - 1, forced=True)
+            start += max_tokens_per_sentence
+        _emit(end)
+        start = end + 1
+
+    while n - start > max_tokens_per_sentence:
+        _emit(start + max_tokens_per_sentence - 1, forced=True)
+        start += max_tokens_per_sentence
+
+    if start < n and final:
+        _emit(n - 1)
+
     return sentences
 
 
+def _span_matches(table: TokenTable, rule_id: str, start: int, end: int) -> List[dict[str, Any]]:
+    """One match per page for tokens [start, end) with one rect per line, skipping pages without rects."""
+    matches: List[dict[str, Any]] = []
+    pages = table.pages[start:end]
+    page_breaks = np.flatnonzero(np.diff(pages)) + 1
+    bounds = [0, *page_breaks.tolist(), len(pages)]
+    for seg_start, seg_end in itertools.pairwise(bounds):
+        a, b = start + seg_start, start + seg_end
+        has_rect = table.has_rect[a:b]
+        if not has_rect.any():
+            continue
+        matches.append({
+            "id": rule_id,
+            "page": int(pages[seg_start]),
+            "rects": merge_line_rects(table.rects[a:b][has_rect]),
+            "text": table.span_text(a, b).strip(),
+        })
+    return matches
+
+
 async def _process_chunk(
         chunk: Chunk,
-        rules: Sequence[RuleLike],
+        rules: CompiledRules,
         model: str,
         client: AsyncClient,
-        ollama_chat_semaphore: asyncio.Semaphore,
-        debug_events: Optional[List[dict[str, Any]]] = None,
+        ollama_job: SchedulerJob,
+        trace: Optional[TraceRecorder] = None,
         progress_callback: Optional[ProgressCallback] = None,
         chunk_number: Optional[int] = None,
         total_chunks: Optional[int] = None,
+        llm_cache: Optional[LLMCacheSession] = None,
+        embedding_gate: Optional[EmbeddingGate] = None,
 ) -> List[ExactSpanMatch]:
     if not chunk.sentences:
         return []
 
-    coarse_hits = await _llm_find_relevant_sentences(
-        chunk,
-        rules,
-        model,
-        client,
-        ollama_chat_semaphore,
-        debug_events
-    )
+    candidates = chunk.sentences
+    if embedding_gate is not None:
+        with ANNOTATION_STAGE_SECONDS.labels("gate").time():
+            candidates = await embedding_gate.select(candidates, [chunk.sentence_text(s) for s in candidates])
 
-    rule_map = {r.id: r for r in rules}
-    sentence_by_id = {s.sid: s for s in chunk.sentences}
+    rule_map = rules.by_id
+    # Only offered sentences are valid answers; positions stay chunk-wide so that
+    # sentences dropped by the gate split contiguous groups.
+    sentence_by_id = {s.sid: s for s in candidates}
     sentence_pos = {s.sid: idx for idx, s in enumerate(chunk.sentences)}
 
-    exact_matches: List[ExactSpanMatch] = []
+    total_markers = 0
 
-    total_markers = len(coarse_hits)
-    if progress_callback is not None and total_markers == 0:
-        await progress_callback(
-            {
-                "stage": "marker_progress",
-                "chunk_number": chunk_number,
-                "total_chunks": total_chunks,
-            }
-        )
+    async def _refine_group(rule: RuleLike, local_start: int, local_end: int) -> List[ExactSpanMatch]:
+        with ANNOTATION_STAGE_SECONDS.labels("boundary").time():
+            boundaries = await _llm_refine_span_boundaries(
+                rule=rule,
+                candidate_tokens=chunk.tokens[local_start:local_end + 1],
+                model=model,
+                client=client,
+                ollama_job=ollama_job,
+                chunk_start_index=chunk.start_index,
+                trace=trace,
+                llm_cache=llm_cache,
+            )
+
+        if boundaries is None:
+            return [ExactSpanMatch(rule_id=rule.id, start_token=local_start, end_token=local_end)]
+
+        group_matches: List[ExactSpanMatch] = []
+        for boundary in boundaries:
+            start_token = local_start + boundary.start_token
+            end_token = local_start + boundary.end_token
+            if start_token < 0 or end_token >= len(chunk.tokens) or start_token > end_token:
+                continue
+            group_matches.append(ExactSpanMatch(
+                rule_id=rule.id,
+                start_token=start_token,
+                end_token=end_token
+            ))
+        return group_matches
 
-    for marker_index, hit in enumerate(coarse_hits, start=1):
+    completed_markers = 0
+
+    async def _refine_marker(hit: CoarseMatchResult) -> List[ExactSpanMatch]:
+        nonlocal completed_markers
+        marker_matches: List[ExactSpanMatch] = []
+        rule = rule_map.get(hit.rule_id)
+        valid_ids = sorted(
+            {sid for sid in hit.sentence_ids if sid in sentence_by_id},
+            key=lambda sid: sentence_pos[sid]
+        )
+        if rule is not None and valid_ids:
+            groups = _group_contiguous_sentence_ids(valid_ids, sentence_pos)
+            per_group = await _gather_or_cancel([
+                _refine_group(
+                    rule,
+                    sentence_by_id[group_ids[0]].token_start - chunk.start_index,
+                    sentence_by_id[group_ids[-1]].token_end - chunk.start_index,
+                )
+                for group_ids in groups
+            ])
+            marker_matches = [m for group_matches in per_group for m in group_matches]
+
+        completed_markers += 1
         if progress_callback is not None:
             await progress_callback(
                 {
                     "stage": "marker_progress",
                     "chunk_number": chunk_number,
                     "total_chunks": total_chunks,
-                    "marker_index": marker_index,
+                    "marker_index": completed_markers,
                     "marker_total": total_markers,
                     "marker_id": hit.rule_id,
                 }
             )
-        if hit.rule_id not in rule_map:
-            continue
-
-        valid_ids = sorted(
-            {sid for sid in hit.sentence_ids if sid in sentence_by_id},
-            key=lambda sid: sentence_pos[sid]
-        )
-        if not valid_ids:
-            continue
-
-        groups = _group_contiguous_sentence_ids(valid_ids, sentence_pos)
+        return marker_matches
+
+    # Each coarse hit is refined as soon as the streamed coarse answer contains it, so
+    # both stages overlap within the chunk. A rule that comes up again is refined only
+    # for the sentences it has not covered yet, and hits the stream parser missed are
+    # picked up from the final answer.
+    refinements: List[asyncio.Future[List[ExactSpanMatch]]] = []
+    covered: dict[str, set[str]] = {}
+
+    def _dispatch(hit: CoarseMatchResult) -> None:
+        nonlocal total_markers
+        seen = covered.setdefault(hit.rule_id, set())
+        new_ids = [sid for sid in dict.fromkeys(hit.sentence_ids) if sid not in seen]
+        if not new_ids:
+            return
+        seen.update(new_ids)
+        total_markers += 1
+        marker = CoarseMatchResult(rule_id=hit.rule_id, sentence_ids=new_ids)
+        refinements.append(asyncio.ensure_future(_refine_marker(marker)))
 
-        for group_ids in groups:
-            group_sentences = [sentence_by_id[sid] for sid in group_ids]
-            local_start = group_sentences[0].token_start
-            local_end = group_sentences[-1].token_end
-
-            candidate_tokens = chunk.tokens[local_start:local_end + 1]
+    try:
+        if candidates:
+            with ANNOTATION_STAGE_SECONDS.labels("coarse").time():
+                coarse_hits = await _llm_find_relevant_sentences(
+                    chunk,
+                    rules,
+                    model,
+                    client,
+                    ollama_job,
+                    trace,
+                    llm_cache=llm_cache,
+                    sentences=candidates,
+                    on_match=_dispatch,
+                )
+            for hit in coarse_hits:
+                _dispatch(hit)
+    except BaseException:
+        for task in refinements:
+            task.cancel()
+        await asyncio.gather(*refinements, return_exceptions=True)
+        raise
 
-            boundaries = await _llm_refine_span_boundaries(
-                rule=rule_map[hit.rule_id],
-                candidate_tokens=candidate_tokens,
-                model=model,
-                client=client,
-                ollama_chat_semaphore=ollama_chat_semaphore,
-                chunk_start_index=chunk.start_index,
-                debug_events=debug_events
-            )
+    if progress_callback is not None and total_markers == 0:
+        await progress_callback(
+            {
+                "stage": "marker_progress",
+                "chunk_number": chunk_number,
+                "total_chunks": total_chunks,
+            }
+        )
 
-            if boundaries is None:
-                exact_matches.append(ExactSpanMatch(
-                    rule_id=hit.rule_id,
-                    start_token=local_start,
-                    end_token=local_end
-                ))
-                continue
-            if not boundaries:
-                continue
+    # Refinements run concurrently within the job's scheduler share; gather keeps
+    # dispatch and group order, so the merged result is deterministic.
+    per_marker = await _gather_or_cancel(refinements)
+    return [m for marker_matches in per_marker for m in marker_matches]
 
-            for boundary in boundaries:
-                start_token = local_start + boundary.start_token
-                end_token = local_start + boundary.end_token
-                if start_token < 0 or end_token >= len(chunk.tokens) or start_token > end_token:
-                    continue
-                exact_matches.append(ExactSpanMatch(
-                    rule_id=hit.rule_id,
-                    start_token=start_token,
-                    end_token=end_token
-                ))
 
-    return exact_matches
+async def _gather_or_cancel(awaitables: Sequence[Awaitable[T]]) -> List[T]:
+    """Like asyncio.gather, but cancels the remaining awaitables when one fails."""
+    tasks = [asyncio.ensure_future(a) for a in awaitables]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 
 async def _llm_find_relevant_sentences(
         chunk: Chunk,
-        rules: Sequence[RuleLike],
+        rules: CompiledRules,
         model: str,
         client: AsyncClient,
-        ollama_chat_semaphore: asyncio.Semaphore,
-        debug_events: Optional[List[dict[str, Any]]] = None,
+        ollama_job: SchedulerJob,
+        trace: Optional[TraceRecorder] = None,
+        llm_cache: Optional[LLMCacheSession] = None,
+        sentences: Optional[Sequence[SentenceSpan]] = None,
+        on_match: Optional[Callable[[CoarseMatchResult], None]] = None,
 ) -> List[CoarseMatchResult]:
-    rule_descriptions = "\n".join([f'- ID "{r.id}": {r.termsRaw}' for r in rules])
-    sentence_block = "\n".join([f"[{s.sid}] {s.text}" for s in chunk.sentences])
+    """
+    Ask which offered sentences match which rule. With `on_match`, the response is
+    streamed and each match is handed over as soon as its JSON object is complete;
+    the full, validated list is still returned at the end.
+    """
+    offered = chunk.sentences if sentences is None else sentences
+    lines = [f"[{s.sid}] {chunk.sentence_text(s)}" for s in offered]
+    if chunk.context_before is not None:
+        lines.insert(0, f"(context, not selectable) ...{chunk.context_before.text}")
+    if chunk.context_after is not None:
+        lines.append(f"(context, not selectable) {chunk.context_after.text}...")
+    sentence_block = "\n".join(lines)
 
     prompt = render_prompt(
         "annotation_coarse_user",
         {
-            "rule_descriptions": rule_descriptions,
+            "rule_descriptions": rules.descriptions,
             "sentence_block": sentence_block,
         },
     )
@@ -417,22 +651,42 @@ async def _llm_find_relevant_sentences(
         "format": LLMCoarseResponse.model_json_schema(),
         "options": {"temperature": 0.0},
     }
+    traced = trace is not None and trace.sample()
     raw: Optional[str] = None
     parsed_payload: Optional[dict[str, Any]] = None
     error_text: Optional[str] = None
+    on_text: Optional[Callable[[str], None]] = None
+    if on_match is not None:
+        match_callback = on_match
+        item_stream = JsonArrayItemStream("matches")
+
+        def _feed(piece: str) -> None:
+            for item in item_stream.feed(piece):
+                try:
+                    hit = CoarseMatchResult.model_validate(item)
+                except ValidationError:
+                    continue
+                match_callback(hit)
+
+        on_text = _feed
+
     try:
-        async with ollama_chat_semaphore:
-            response = await client.chat(**request_payload)
-        raw = response["message"]["content"]
+        raw, from_cache = await _chat_content(client, request_payload, ollama_job, llm_cache, on_text)
         data = _parse_json_from_llm(raw)
         parsed = LLMCoarseResponse.model_validate(data)
         parsed_payload = parsed.model_dump()
+        if llm_cache is not None and not from_cache:
+            await llm_cache.store(request_payload, raw)
         return parsed.matches
     except Exception as e:
         error_text = str(e)
         raise
     finally:
-        if debug_events is not None:
+        # Identical requests waiting on this one only get a response that validated (`store`
+        # hands it over); otherwise they ask Ollama themselves.
+        if llm_cache is not None:
+            llm_cache.settle(request_payload, None)
+        if trace is not None and traced:
             event: dict[str, Any] = {
                 "stage": "coarse_sentence_selection",
                 "chunkStartIndex": chunk.start_index,
@@ -445,23 +699,24 @@ async def _llm_find_relevant_sentences(
                 event["response"]["parsed"] = parsed_payload
             if error_text is not None:
                 event["error"] = error_text
-            debug_events.append(event)
+            trace.record(event)
 
 
 async def _llm_refine_span_boundaries(
         rule: RuleLike,
-        candidate_tokens: List[Token],
+        candidate_tokens: TokenView,
         model: str,
         client: AsyncClient,
-        ollama_chat_semaphore: asyncio.Semaphore,
+        ollama_job: SchedulerJob,
         chunk_start_index: int,
-        debug_events: Optional[List[dict[str, Any]]] = None,
+        trace: Optional[TraceRecorder] = None,
+        llm_cache: Optional[LLMCacheSession] = None,
 ) -> Optional[List[LLMBoundarySpan]]:
-    if not candidate_tokens:
+    if not len(candidate_tokens):
         return None
 
-    token_lines = "\n".join(f"[{i}] {t.text}" for i, t in enumerate(candidate_tokens))
-    plain_text = " ".join(t.text for t in candidate_tokens)
+    token_lines = "\n".join(f"[{i}] {text}" for i, text in enumerate(candidate_tokens))
+    plain_text = candidate_tokens.text
 
     prompt = render_prompt(
         "annotation_boundary_user",
@@ -479,16 +734,17 @@ async def _llm_refine_span_boundaries(
         "format": LLMBoundaryResponse.model_json_schema(),
         "options": {"temperature": 0.0},
     }
+    traced = trace is not None and trace.sample()
     raw: Optional[str] = None
     parsed_payload: Optional[dict[str, Any]] = None
     error_text: Optional[str] = None
     try:
-        async with ollama_chat_semaphore:
-            response = await client.chat(**request_payload)
-        raw = response["message"]["content"]
+        raw, from_cache = await _chat_content(client, request_payload, ollama_job, llm_cache)
         data = _parse_json_from_llm(raw)
         parsed = LLMBoundaryResponse.model_validate(data)
         parsed_payload = parsed.model_dump()
+        if llm_cache is not None and not from_cache:
+            await llm_cache.store(request_payload, raw)
 
         valid_spans: List[LLMBoundarySpan] = []
         seen_spans: set[tuple[int, int]] = set()
@@ -512,7 +768,10 @@ async def _llm_refine_span_boundaries(
         logger.warning("Boundary refinement failed for rule %s: %s", rule.id, e)
         raise
     finally:
-        if debug_events is not None:
+        # as for the coarse call: waiters get only a validated response
+        if llm_cache is not None:
+            llm_cache.settle(request_payload, None)
+        if trace is not None and traced:
             event: dict[str, Any] = {
                 "stage": "boundary_refinement",
                 "chunkStartIndex": chunk_start_index,
@@ -526,7 +785,37 @@ async def _llm_refine_span_boundaries(
                 event["response"]["parsed"] = parsed_payload
             if error_text is not None:
                 event["error"] = error_text
-            debug_events.append(event)
+            trace.record(event)
+
+
+async def _chat_content(
+        client: AsyncClient,
+        request_payload: dict[str, Any],
+        ollama_job: SchedulerJob,
+        llm_cache: Optional[LLMCacheSession],
+        on_text: Optional[Callable[[str], None]] = None,
+) -> tuple[str, bool]:
+    """
+    Return the raw response content and whether it came from the cache.
+    With `on_text`, the response is streamed and every piece is passed on as it arrives.
+    """
+    if llm_cache is not None:
+        cached = await llm_cache.lookup(request_payload)
+        if cached is not None:
+            if on_text is not None:
+                on_text(cached)
+            return cached, True
+    async with ollama_job.slot():
+        if on_text is None:
+            response = await client.chat(**request_payload)
+            return str(response["message"]["content"]), False
+        pieces: List[str] = []
+        async for part in await client.chat(**request_payload, stream=True):
+            piece = str(part["message"]["content"])
+            if piece:
+                pieces.append(piece)
+                on_text(piece)
+    return "".join(pieces), False
 
 
 def _group_contiguous_sentence_ids(
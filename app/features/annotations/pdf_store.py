@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import zipfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO, Dict, Optional
+
+from fastapi import UploadFile
+
+from core.settings import ANNOTATION_PDF_STORE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+PDF_STORE_DIR = Path(os.getenv("ANNOTATION_PDF_STORE_DIR", "/cache/annotation_pdfs"))
+WEBDAV_DATA_DIR = Path(os.getenv("WEBDAV_DATA_DIR", "/data"))
+
+_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+_ZOTERO_KEY_RE = re.compile(r"[A-Z0-9]{8}")
+_READ_SIZE = 1024 * 1024
+
+
+def is_sha256(value: str) -> bool:
+    return _SHA256_RE.fullmatch(value) is not None
+
+
+class PdfStore:
+    """
+    Content-addressed store of the PDFs sent for annotation, one `<sha256>.pdf` file each.
+
+    The file mtime doubles as the last-use time; once the store grows beyond `max_bytes`
+    the least recently used files are removed. Files leased by a running job are kept.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = ANNOTATION_PDF_STORE_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._leases: Dict[str, int] = {}
+        # zotero key -> ((zip mtime_ns, zip size), digest of its PDF)
+        self._zip_digests: Dict[str, tuple[tuple[int, int], str]] = {}
+
+    def _path(self, digest: str) -> Path:
+        return self.root / f"{digest}.pdf"
+
+    def contains(self, digest: str) -> bool:
+        return is_sha256(digest) and self._path(digest).is_file()
+
+    def acquire(self, digest: str) -> Optional[Path]:
+        """Path of a stored PDF, protected from eviction until `release`."""
+        path = self._path(digest)
+        if not is_sha256(digest) or not path.is_file():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        self._leases[digest] = self._leases.get(digest, 0) + 1
+        return path
+
+    def release(self, digest: str) -> None:
+        count = self._leases.get(digest, 0) - 1
+        if count > 0:
+            self._leases[digest] = count
+        else:
+            self._leases.pop(digest, None)
+
+    async def put_upload(self, file: UploadFile) -> str:
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.root, suffix=".part", delete=False) as tmp:
+            try:
+                while content := await file.read(_READ_SIZE):
+                    digest.update(content)
+                    tmp.write(content)
+            except BaseException:
+                os.remove(tmp.name)
+                raise
+        return self._commit(Path(tmp.name), digest.hexdigest())
+
+    def put_from_zotero_key(self, zotero_key: str, expected_digest: str) -> Optional[str]:
+        """
+        Digest of the PDF in a synced attachment on the WebDAV volume (`<key>.zip`). The
+        PDF is stored only when it is `expected_digest`, so an outdated copy never evicts
+        valid entries. Digests are remembered per zip mtime and size; asking again about an
+        unchanged archive does not reread it.
+        """
+        if _ZOTERO_KEY_RE.fullmatch(zotero_key) is None:
+            return None
+        zip_path = WEBDAV_DATA_DIR / f"{zotero_key}.zip"
+        try:
+            st = zip_path.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+            cached = self._zip_digests.get(zotero_key)
+            if cached is not None and cached[0] == stamp:
+                if cached[1] != expected_digest or self.contains(expected_digest):
+                    return cached[1]
+            with zipfile.ZipFile(zip_path) as zipf:
+                member = next((i for i in zipf.infolist() if i.filename.lower().endswith(".pdf")), None)
+                if member is None:
+                    return None
+                self.root.mkdir(parents=True, exist_ok=True)
+                with zipf.open(member) as src:
+                    digest = self._put_stream(src, expected_digest)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.info(f"No usable WebDAV copy for {zotero_key}: {e}")
+            return None
+        self._zip_digests[zotero_key] = (stamp, digest)
+        return digest
+
+    def _put_stream(self, src: IO[bytes], expected_digest: Optional[str] = None) -> str:
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.root, suffix=".part", delete=False) as tmp:
+            try:
+                while content := src.read(_READ_SIZE):
+                    digest.update(content)
+                    tmp.write(content)
+            except BaseException:
+                os.remove(tmp.name)
+                raise
+        if expected_digest is not None and digest.hexdigest() != expected_digest:
+            os.remove(tmp.name)
+            return digest.hexdigest()
+        return self._commit(Path(tmp.name), digest.hexdigest())
+
+    def _commit(self, tmp_path: Path, digest: str) -> str:
+        os.replace(tmp_path, self._path(digest))
+        self._evict(keep=digest)
+        return digest
+
+    def _entries(self) -> Iterator[tuple[Path, os.stat_result]]:
+        for path in self.root.glob("*.pdf"):
+            try:
+                yield path, path.stat()
+            except OSError:
+                continue
+
+    def _evict(self, keep: str) -> None:
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _path, st in entries)
+        for path, st in entries:
+            if total <= self.max_bytes:
+                break
+            if path.stem == keep or path.stem in self._leases:
+                continue
+            try:
+                path.unlink()
+                total -= st.st_size
+            except OSError as e:
+                logger.warning(f"Failed to evict {path}: {e}")
+
+
+PDF_STORE = PdfStore(PDF_STORE_DIR)
@@ -1,16 +1,60 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
 from typing import Any, Optional, TypedDict
 
 import pdfplumber
-from pdf2image import convert_from_path
-import pytesseract # type: ignore[import-untyped]
+import pytesseract  # type: ignore[import-untyped]
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pdf2image.exceptions import (
+    PDFInfoNotInstalledError,
+    PDFPageCountError,
+    PDFPopplerTimeoutError,
+    PDFSyntaxError,
+)
+from pdfminer.pdftypes import resolve1
+from pdfminer.psexceptions import PSException
+from pdfplumber.utils.exceptions import MalformedPDFException, PdfminerException
+
+from core.metrics import PDF_PAGE_EXTRACT_SECONDS
+from core.settings import (
+    ANNOTATION_EXTRACT_BATCH_PAGES,
+    ANNOTATION_EXTRACT_WORKERS,
+    ANNOTATION_OCR_DPI,
+)
 
 logger = logging.getLogger(__name__)
 
+OCR_CACHE_DIR = Path(os.getenv("ANNOTATION_OCR_CACHE_DIR", "/cache/annotation_ocr"))
+
 Rect = tuple[float, float, float, float]
 
+# pdfplumber wraps most pdfminer errors, but layout analysis of a broken page can still
+# raise pdfminer's own or plain lookup and value errors.
+PDF_PARSE_ERRORS = (PdfminerException, MalformedPDFException, PSException, OSError, KeyError, TypeError, ValueError)
+# poppler (pdf2image) and tesseract; TesseractNotFoundError is an OSError
+OCR_ERRORS = (
+    PDFInfoNotInstalledError,
+    PDFPageCountError,
+    PDFPopplerTimeoutError,
+    PDFSyntaxError,
+    pytesseract.TesseractError,
+    OSError,
+    ValueError,
+)
+
 
 class WordData(TypedDict):
     text: str
@@ -23,6 +67,200 @@ class PageData(TypedDict):
     words: list[WordData]
 
 
+def _page_data(page_index: int, page: Any) -> PageData:
+    page_height = float(page.height)
+
+    words_raw: list[dict[str, Any]] = page.extract_words() or []
+
+    words: list[WordData] = []
+    for w in words_raw:
+        text = str(w.get("text", ""))
+        x0 = float(w["x0"])
+        x1 = float(w["x1"])
+        top = float(w["top"])
+        bottom = float(w["bottom"])
+
+        rect: Rect = (
+            x0,
+            page_height - bottom,
+            x1,
+            page_height - top,
+        )
+        words.append({"text": text, "rect": rect})
+
+    return {
+        "page": page_index,
+        "page_height": page_height,
+        "words": words,
+    }
+
+
+def _page_count(path: str) -> int:
+    with pdfplumber.open(path) as doc:
+        try:
+            return int(resolve1(doc.doc.catalog["Pages"])["Count"])
+        except (KeyError, TypeError, ValueError):
+            return len(doc.pages)
+
+
+# Documents opened by this process, most recently used last. Reopening a PDF walks its
+# whole page tree, which would dominate when a large document is parsed in small batches.
+_OPEN_DOCUMENTS: OrderedDict[str, Any] = OrderedDict()
+_MAX_OPEN_DOCUMENTS = 2
+_OPEN_DOCUMENTS_LOCK = threading.Lock()
+
+
+def _open_document(path: str) -> Any:
+    doc = _OPEN_DOCUMENTS.pop(path, None)
+    if doc is None:
+        doc = pdfplumber.open(path)
+        while len(_OPEN_DOCUMENTS) >= _MAX_OPEN_DOCUMENTS:
+            _path, stale = _OPEN_DOCUMENTS.popitem(last=False)
+            stale.close()
+    _OPEN_DOCUMENTS[path] = doc
+    return doc
+
+
+def _extract_pages(path: str, page_indices: list[int]) -> list[PageData]:
+    """Parse only the given (0-based) pages; runs in a worker process."""
+    with _OPEN_DOCUMENTS_LOCK:
+        pages = _open_document(path).pages
+        out: list[PageData] = []
+        for i in page_indices:
+            out.append(_page_data_or_ocr(path, i, pages[i]))
+            pages[i].close()
+        return out
+
+
+def _ocr_words(image: Any, scale: float, page_height: float) -> list[WordData]:
+    """Tesseract words of a rendered page, with boxes converted to PDF points."""
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    words: list[WordData] = []
+    for text, left, top, width, height, conf in zip(
+        data["text"], data["left"], data["top"], data["width"], data["height"], data["conf"]
+    ):
+        text = str(text).strip()
+        if not text or float(conf) < 0:
+            continue
+        rect: Rect = (
+            left * scale,
+            page_height - (top + height) * scale,
+            (left + width) * scale,
+            page_height - top * scale,
+        )
+        words.append({"text": text, "rect": rect})
+    return words
+
+
+def _load_ocr_cache(key: str) -> Optional[list[WordData]]:
+    try:
+        raw = json.loads((OCR_CACHE_DIR / f"{key}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return [{"text": w["text"], "rect": tuple(w["rect"])} for w in raw]
+
+
+def _store_ocr_cache(key: str, words: list[WordData]) -> None:
+    try:
+        OCR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = OCR_CACHE_DIR / f"{key}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(words), encoding="utf-8")
+        # workers may OCR the same page concurrently; the rename keeps the entry whole
+        os.replace(tmp, OCR_CACHE_DIR / f"{key}.json")
+    except OSError as e:
+        logger.warning(f"Cannot cache OCR result: {e}")
+
+
+def _ocr_page(path: str, page_index: int) -> PageData:
+    """Render and recognize a single (0-based) page; results are cached by rendered page content."""
+    # one tesseract thread per worker process, the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    images = convert_from_path(path, dpi=ANNOTATION_OCR_DPI, first_page=page_index + 1, last_page=page_index + 1)
+    if not images:
+        return {"page": page_index, "page_height": 0.0, "words": []}
+    image = images[0]
+    scale = 72.0 / ANNOTATION_OCR_DPI
+    page_height = image.height * scale
+
+    digest = hashlib.sha256(f"{ANNOTATION_OCR_DPI}:{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    key = digest.hexdigest()
+    words = _load_ocr_cache(key)
+    if words is None:
+        words = _ocr_words(image, scale, page_height)
+        _store_ocr_cache(key, words)
+    image.close()
+    return {"page": page_index, "page_height": page_height, "words": words}
+
+
+def _ocr_pages(path: str, page_indices: list[int]) -> list[PageData]:
+    pages: list[PageData] = []
+    for i in page_indices:
+        try:
+            pages.append(_ocr_page(path, i))
+        except OCR_ERRORS as e:
+            logger.error(f"OCR extraction failed on page {i}: {e}")
+    return pages
+
+
+def _page_data_or_ocr(path: str, page_index: int, page: Any) -> PageData:
+    """Pages without a text layer (scans) are recognized with OCR."""
+    data = _page_data(page_index, page)
+    if data["words"] or not page.images:
+        return data
+    ocr = _ocr_pages(path, [page_index])
+    return ocr[0] if ocr else data
+
+
+def _timed_extract(
+    extract: Callable[[str, list[int]], list[PageData]],
+    path: str,
+    page_indices: list[int],
+) -> tuple[list[PageData], float]:
+    """Run `extract` and return its pages with the seconds it took (measured in the worker)."""
+    started = time.perf_counter()
+    pages = extract(path, page_indices)
+    return pages, time.perf_counter() - started
+
+
+def _observe_extract(extract: Callable[[str, list[int]], list[PageData]], pages: list[PageData], seconds: float) -> None:
+    if pages:
+        method = "ocr" if extract is _ocr_pages else "text"
+        child = PDF_PAGE_EXTRACT_SECONDS.labels("annotations", method)
+        for _page in pages:
+            child.observe(seconds / len(pages))
+
+
+# pages of a batch, the function parsing them, and its result with the seconds it took
+_PendingBatch = tuple[
+    list[int], Callable[[str, list[int]], list[PageData]], asyncio.Future[tuple[list[PageData], float]]
+]
+
+_EXTRACT_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _extract_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared worker processes for page parsing; None runs it in threads instead."""
+    global _EXTRACT_POOL
+    if ANNOTATION_EXTRACT_WORKERS == 0:
+        return None
+    if _EXTRACT_POOL is None:
+        # spawn: forking the threaded server process is not safe
+        _EXTRACT_POOL = ProcessPoolExecutor(
+            max_workers=ANNOTATION_EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _EXTRACT_POOL
+
+
+def _discard_pool(pool: Optional[ProcessPoolExecutor]) -> None:
+    """Drop a broken pool so the next job starts fresh workers."""
+    global _EXTRACT_POOL
+    if pool is not None and pool is _EXTRACT_POOL:
+        _EXTRACT_POOL = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
 class TextPlaceRecognitionPDF:
     def __init__(self, path: str) -> None:
         self.pdf_path: str = path
@@ -32,7 +270,7 @@ class TextPlaceRecognitionPDF:
         try:
             with open(self.pdf_path, "rb") as f:
                 return f.read(5) == b"%PDF-"
-        except Exception as e:
+        except OSError as e:
             logger.warning(f"Failed to read PDF header: {e}")
             return False
 
@@ -45,52 +283,79 @@ class TextPlaceRecognitionPDF:
 
         try:
             with pdfplumber.open(self.pdf_path) as doc:
-                for page_index, page in enumerate(doc.pages):
-                    page_height = float(page.height)
-
-                    words_raw: list[dict[str, Any]] = page.extract_words() or []
-
-                    words: list[WordData] = []
-                    for w in words_raw:
-                        text = str(w.get("text", ""))
-                        x0 = float(w["x0"])
-                        x1 = float(w["x1"])
-                        top = float(w["top"])
-                        bottom = float(w["bottom"])
-
-                        rect: Rect = (
-                            x0,
-                            page_height - bottom,
-                            x1,
-                            page_height - top,
-                        )
-                        words.append({"text": text, "rect": rect})
-
-                    self.pages.append(
-                        {
-                            "page": page_index,
-                            "page_height": page_height,
-                            "words": words,
-                        }
-                    )
-
-        except Exception as e:
+                self.pages = [
+                    _page_data_or_ocr(self.pdf_path, page_index, page) for page_index, page in enumerate(doc.pages)
+                ]
+        except PDF_PARSE_ERRORS as e:
             logger.warning(f"pdfplumber failed: {e}, falling back to OCR")
-            self._extract_text_ocr()
+            self.pages = _ocr_pages(self.pdf_path, list(range(pdfinfo_from_path(self.pdf_path)["Pages"])))
 
         return self.pages
 
-    def _extract_text_ocr(self) -> None:
-        """Note: OCR currently returns rect: None.
-        Zotero cannot highlight without rects, but this prevents a crash."""
+    async def iter_pages(self, page_range: Optional[tuple[int, int]] = None) -> AsyncIterator[PageData]:
+        """
+        Yield the pages of `page_range` (0-based, inclusive) in order as they are parsed.
+
+        Only the requested pages are opened. Batches of ANNOTATION_EXTRACT_BATCH_PAGES
+        pages are parsed in parallel worker processes, a bounded number ahead of the
+        consumer. Pages without a text layer, and batches pdfplumber cannot parse,
+        are OCRed one page at a time in the same workers.
+        """
+        if not self._is_pdf():
+            logger.error(f"File {self.pdf_path} is not a valid PDF.")
+            return
+
+        extract: Callable[[str, list[int]], list[PageData]] = _extract_pages
+        batch_pages = ANNOTATION_EXTRACT_BATCH_PAGES
+        try:
+            page_count = await asyncio.to_thread(_page_count, self.pdf_path)
+        except PDF_PARSE_ERRORS as e:
+            logger.warning(f"pdfplumber failed: {e}, falling back to OCR")
+            try:
+                info = await asyncio.to_thread(pdfinfo_from_path, self.pdf_path)
+                page_count = int(info["Pages"])
+            except (*OCR_ERRORS, KeyError) as e:
+                logger.error(f"Cannot read page count for OCR: {e}")
+                return
+            extract, batch_pages = _ocr_pages, 1
+
+        first_page, last_page = page_range if page_range is not None else (0, page_count - 1)
+        indices = list(range(first_page, min(last_page, page_count - 1) + 1))
+        batches = [indices[i:i + batch_pages] for i in range(0, len(indices), batch_pages)]
+
+        loop = asyncio.get_running_loop()
+        pool = _extract_pool()
+        # in-process parsing shares one open document, so it runs one batch at a time
+        max_ahead = 2 * ANNOTATION_EXTRACT_WORKERS if pool is not None else 1
+        pending: deque[_PendingBatch] = deque()
+        next_batch = 0
         try:
-            images = convert_from_path(self.pdf_path)
-            for page_index, img in enumerate(images):
-                text = pytesseract.image_to_string(img)
-                words: list[WordData] = [{"text": w, "rect": None} for w in text.split()]
-
-                self.pages.append({
-                    "page": page_index, "page_height": float(img.height), "words": words
-                })
-        except Exception as e:
-            logger.error(f"OCR extraction failed: {e}")
+            while pending or next_batch < len(batches):
+                while next_batch < len(batches) and len(pending) < max_ahead:
+                    batch = batches[next_batch]
+                    future = loop.run_in_executor(pool, _timed_extract, extract, self.pdf_path, batch)
+                    pending.append((batch, extract, future))
+                    next_batch += 1
+
+                batch, batch_extract, future = pending.popleft()
+                try:
+                    pages, seconds = await future
+                except BrokenProcessPool as e:
+                    logger.warning(f"Page extraction workers died ({e}), parsing pages {batch[0]}-{batch[-1]} in-process")
+                    _discard_pool(pool)
+                    pool = _extract_pool()
+                    pages, seconds = await asyncio.to_thread(_timed_extract, batch_extract, self.pdf_path, batch)
+                except PDF_PARSE_ERRORS as e:
+                    if batch_extract is _ocr_pages:
+                        raise
+                    logger.warning(f"pdfplumber failed on pages {batch[0]}-{batch[-1]}: {e}, falling back to OCR")
+                    # OCR in the workers too, and keep reading the batches queued behind it meanwhile
+                    future = loop.run_in_executor(pool, _timed_extract, _ocr_pages, self.pdf_path, batch)
+                    pending.appendleft((batch, _ocr_pages, future))
+                    continue
+                _observe_extract(batch_extract, pages, seconds)
+                for page in pages:
+                    yield page
+        finally:
+            for _batch, _extract, future in pending:
+                future.cancel()
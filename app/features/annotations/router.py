@@ -1,29 +1,59 @@
 import asyncio
-import contextlib
 import logging
-import os
-import tempfile
 from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
 from typing import Any, Dict, List, Optional, cast
 
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
 from ollama import AsyncClient
 
 from core.clients import create_ollama_client
-from core.settings import ANSWER_MODEL
+from core.metrics import ACTIVE_STREAMS
+from core.ollama_scheduler import OLLAMA_SCHEDULER, Priority
+from core.settings import (
+    ANNOTATION_BATCH_DOCUMENTS_IN_FLIGHT,
+    ANNOTATION_BATCH_MAX_DOCUMENTS,
+    ANNOTATION_EMBEDDING_GATE_THRESHOLD,
+    ANNOTATION_RETRY_AFTER_SECONDS,
+    ANNOTATION_TRACE_MAX_EVENTS,
+    ANNOTATION_TRACE_SAMPLE_RATE,
+    ANNOTATION_TRACE_SPILL,
+    ANSWER_MODEL,
+    MAX_OLLAMA_PARALLEL_CALLS,
+)
+from features.annotations.jobs import (
+    ANNOTATION_ADMISSION,
+    ANNOTATION_JOBS,
+    AnnotationJob,
+    EventStream,
+)
+from features.annotations.llm_cache import LLM_RESPONSE_CACHE, LLMCacheSession
+from features.annotations.llm_service import (
+    ANNOTATION_ERRORS,
+    build_embedding_gate,
+    compile_rules,
+)
+from features.annotations.llm_service import (
+    process_annotations as process_annotations_llm,
+)
+from features.annotations.pdf_store import PDF_STORE
 from features.annotations.schemas import (
     AnnotationConcurrencyEvent,
+    AnnotationDocumentDoneEvent,
     AnnotationDoneEvent,
     AnnotationMatchesEvent,
     AnnotationUpdateProgressEvent,
     ErrorEvent,
+    PdfLookupIn,
+    PdfLookupOut,
     RagPdfMatch,
     RagPopupConfig,
     ndjson_annotation,
 )
 from features.annotations.service import normalize_rects, parse_page_range
-from features.annotations.llm_service import process_annotations as process_annotations_llm
+from features.annotations.trace import TraceRecorder
 
 router = APIRouter(tags=["annotations"])
 
@@ -34,121 +64,170 @@ AnnotationMatchesCb = Callable[[List[Dict[str, Any]]], Awaitable[None]]
 class _AnnotationConcurrencyTracker:
     def __init__(self) -> None:
         self._active_requests = 0
-        self._subscribers: set[asyncio.Queue[int]] = set()
-        self._lock = asyncio.Lock()
+        self._subscribers: set[EventStream] = set()
 
-    async def subscribe(self) -> asyncio.Queue[int]:
-        queue: asyncio.Queue[int] = asyncio.Queue()
-        async with self._lock:
-            self._subscribers.add(queue)
-            current = self._active_requests
-        await queue.put(current)
-        return queue
+    def subscribe(self, stream: EventStream) -> None:
+        self._subscribers.add(stream)
+        self._send(stream)
 
-    async def unsubscribe(self, queue: asyncio.Queue[int]) -> None:
-        async with self._lock:
-            self._subscribers.discard(queue)
+    def unsubscribe(self, stream: EventStream) -> None:
+        self._subscribers.discard(stream)
 
-    async def increment(self) -> None:
-        await self._change_active_requests(1)
+    def increment(self) -> None:
+        self._change_active_requests(1)
 
-    async def decrement(self) -> None:
-        await self._change_active_requests(-1)
+    def decrement(self) -> None:
+        self._change_active_requests(-1)
 
-    async def _change_active_requests(self, delta: int) -> None:
-        async with self._lock:
-            self._active_requests = max(0, self._active_requests + delta)
-            current = self._active_requests
-            subscribers = list(self._subscribers)
+    def _change_active_requests(self, delta: int) -> None:
+        self._active_requests = max(0, self._active_requests + delta)
+        for subscriber in self._subscribers:
+            self._send(subscriber)
 
-        for subscriber in subscribers:
-            await subscriber.put(current)
+    def _send(self, stream: EventStream) -> None:
+        event = AnnotationConcurrencyEvent(activeRequests=self._active_requests)
+        stream.put(ndjson_annotation(event), coalesce_key="concurrency")
 
 
 ANNOTATION_CONCURRENCY_TRACKER = _AnnotationConcurrencyTracker()
 
 
+@router.post("/api/annotations/pdfs/lookup")
+async def lookup_pdf(body: PdfLookupIn) -> PdfLookupOut:
+    """Tell the client whether it can reference the PDF by hash instead of uploading it."""
+    if PDF_STORE.contains(body.sha256):
+        return PdfLookupOut(sha256=body.sha256, known=True)
+    if body.zoteroKey is not None:
+        digest = await asyncio.to_thread(PDF_STORE.put_from_zotero_key, body.zoteroKey, body.sha256)
+        # the WebDAV copy may be older than the client's file
+        return PdfLookupOut(sha256=body.sha256, known=digest == body.sha256)
+    return PdfLookupOut(sha256=body.sha256, known=False)
+
+
+@dataclass
+class _Document:
+    digest: str
+    path: Path
+    # tags the events of a batch; None for a single-document job
+    tag: Optional[str] = None
+
+
 @router.post("/api/annotations", response_model=None)
 async def annotations(
-    file: UploadFile = File(...),
     config: str = Form(...),
+    file: UploadFile | None = File(None),
+    sha256: str | None = Form(None),
     ollama_client: AsyncClient = Depends(create_ollama_client),
 ) -> StreamingResponse:
     cfg = RagPopupConfig.model_validate_json(config)
     page_range = parse_page_range(cfg.pageRange)
+    if not cfg.rules:
+        return _empty_response()
 
-    def _to_rag_match(m: Dict[str, Any]) -> RagPdfMatch:
-        return RagPdfMatch(
-            id=cast(str, m["id"]),
-            pageIndex=cast(int, m["page"]),
-            rects=normalize_rects(cast(list[tuple[float, float, float, float] | None], m["rects"])),
-            text=cast(str | None, m.get("text")),
-        )
+    # Without a file the PDF must already be in the store (see /api/annotations/pdfs/lookup).
+    if file is not None:
+        try:
+            digest = await PDF_STORE.put_upload(file)
+        except OSError as e:
+            logging.error(f"Failed to persist uploaded PDF: {e}")
+            return _error_response(f"Failed to read uploaded PDF: {e}")
+    elif sha256 is not None:
+        digest = sha256
+    else:
+        raise HTTPException(status_code=422, detail="Send the PDF as `file` or reference it by `sha256`")
+
+    pdf_path = PDF_STORE.acquire(digest)
+    if pdf_path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown PDF {digest}, upload it as `file`")
+    return _start_job(cfg, page_range, [_Document(digest, pdf_path)], ollama_client)
 
-    async def _compute(
-        pdf_path: str,
-        progress_cb: AnnotationProgressCb,
-        matches_cb: AnnotationMatchesCb,
-    ) -> None:
-        llm_debug: List[Dict[str, Any]] = []
-        await progress_cb({"stage": "file_uploaded"})
-        await process_annotations_llm(
-            pdf_path=pdf_path,
-            rules=cfg.rules,
-            answer_model=ANSWER_MODEL,
-            ollama_client=ollama_client,
-            chunk_size=cfg.chunkLength,
-            debug_events=llm_debug,
-            page_range=page_range,
-            progress_callback=progress_cb,
-            chunk_matches_callback=matches_cb,
-        )
 
+@router.post("/api/annotations/batch", response_model=None)
+async def annotations_batch(
+    config: str = Form(...),
+    files: list[UploadFile] | None = File(None),
+    sha256: list[str] | None = Form(None),
+    ollama_client: AsyncClient = Depends(create_ollama_client),
+) -> StreamingResponse:
+    """Apply one rule set to many PDFs (uploaded and/or referenced by hash) as a single job."""
+    cfg = RagPopupConfig.model_validate_json(config)
+    page_range = parse_page_range(cfg.pageRange)
     if not cfg.rules:
+        return _empty_response()
 
-        async def empty_gen() -> AsyncIterator[str]:
-            yield ndjson_annotation(AnnotationUpdateProgressEvent(stage="done", completed=0, total=0))
-            yield ndjson_annotation(AnnotationDoneEvent())
-
-        return StreamingResponse(
-            empty_gen(),
-            media_type="application/x-ndjson",
-            headers={
-                "Cache-Control": "no-cache",
-                "X-Accel-Buffering": "no",
-            },
-        )
+    # Every PDF is leased as soon as it is known, so storing the next upload cannot evict it.
+    documents: dict[str, _Document] = {}
+
+    def lease(digest: str) -> None:
+        if digest in documents:
+            return
+        if len(documents) >= ANNOTATION_BATCH_MAX_DOCUMENTS:
+            raise HTTPException(
+                status_code=422, detail=f"A batch may hold at most {ANNOTATION_BATCH_MAX_DOCUMENTS} documents"
+            )
+        path = PDF_STORE.acquire(digest)
+        if path is None:
+            raise HTTPException(status_code=404, detail=f"Unknown PDF {digest}, upload it in `files`")
+        documents[digest] = _Document(digest, path, tag=digest)
 
-    tmp_path: str | None = None
+    handed_over = False
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            while content := await file.read(1024 * 1024):
-                tmp.write(content)
-            tmp_path = tmp.name
-    except Exception as e:
-        logging.error(f"Failed to persist uploaded PDF: {e}")
-        error_message = f"Failed to read uploaded PDF: {e}"
-
-        async def error_gen() -> AsyncIterator[str]:
-            yield ndjson_annotation(ErrorEvent(message=error_message))
-            yield ndjson_annotation(AnnotationDoneEvent())
-
-        return StreamingResponse(
-            error_gen(),
-            media_type="application/x-ndjson",
-            headers={
-                "Cache-Control": "no-cache",
-                "X-Accel-Buffering": "no",
-            },
-        )
+        for upload in files or []:
+            try:
+                digest = await PDF_STORE.put_upload(upload)
+            except OSError as e:
+                logging.error(f"Failed to persist uploaded PDF {upload.filename}: {e}")
+                return _error_response(f"Failed to read uploaded PDF {upload.filename}: {e}")
+            lease(digest)
+        for digest in sha256 or []:
+            lease(digest)
+        if not documents:
+            raise HTTPException(status_code=422, detail="Send PDFs as `files` or reference them by `sha256`")
+        # from here on the job (or its refusal) releases the leases
+        handed_over = True
+        return _start_job(cfg, page_range, list(documents.values()), ollama_client)
+    finally:
+        if not handed_over:
+            for doc in documents.values():
+                PDF_STORE.release(doc.digest)
 
-    async def gen() -> AsyncIterator[str]:
-        queue: asyncio.Queue[str | None] = asyncio.Queue()
-        concurrency_queue = await ANNOTATION_CONCURRENCY_TRACKER.subscribe()
 
-        async def progress_cb(payload: Dict[str, Any]) -> None:
-            yield_event = AnnotationUpdateProgressEvent(
+def _start_job(
+    cfg: RagPopupConfig,
+    page_range: Optional[tuple[int, int]],
+    documents: list[_Document],
+    ollama_client: AsyncClient,
+) -> StreamingResponse:
+    """Run the documents (whose store leases are held) as one annotation job and stream it."""
+    # An explicit null in the config disables the gate for this request.
+    gate_threshold = (
+        cfg.embeddingGateThreshold
+        if "embeddingGateThreshold" in cfg.model_fields_set
+        else ANNOTATION_EMBEDDING_GATE_THRESHOLD
+    )
+    compiled_rules = compile_rules(cfg.rules)
+    # All documents of a job draw from one scheduler job, i.e. one shared pool of Ollama slots,
+    # and one embedding gate, so the rules are embedded once per job.
+    ollama_job = OLLAMA_SCHEDULER.job("annotations", Priority.BATCH, max_parallel=MAX_OLLAMA_PARALLEL_CALLS)
+    embedding_gate = (
+        build_embedding_gate(ollama_client, compiled_rules, gate_threshold, ollama_job)
+        if gate_threshold is not None
+        else None
+    )
+
+    def _to_rag_match(m: Dict[str, Any]) -> RagPdfMatch:
+        return RagPdfMatch(
+            id=cast(str, m["id"]),
+            pageIndex=cast(int, m["page"]),
+            rects=normalize_rects(cast(list[list[float] | None], m["rects"])),
+            text=cast(str | None, m.get("text")),
+        )
+
+    def progress_event(payload: Dict[str, Any], document: Optional[str]) -> str:
+        return ndjson_annotation(
+            AnnotationUpdateProgressEvent(
                 stage=cast(str, payload.get("stage", "annotation_progress")),
+                document=document,
                 debug=cast(Optional[str], payload.get("debug")),
                 sent=cast(Optional[int], payload.get("dispatched_chunks")),
                 chunk=cast(Optional[int], payload.get("chunk_number")),
@@ -157,60 +236,173 @@ async def annotations(
                 markerId=cast(Optional[str], payload.get("marker_id")),
                 completed=cast(Optional[int], payload.get("completed_chunks")),
                 total=cast(Optional[int], payload.get("total_chunks")),
+                cacheHits=cast(Optional[int], payload.get("cache_hits")),
+                cacheMisses=cast(Optional[int], payload.get("cache_misses")),
+                gateChunksSkipped=cast(Optional[int], payload.get("gate_chunks_skipped")),
+                gateSentencesKept=cast(Optional[int], payload.get("gate_sentences_kept")),
+                gateSentencesTotal=cast(Optional[int], payload.get("gate_sentences_total")),
             )
-            await queue.put(ndjson_annotation(yield_event))
+        )
+
+    async def run_document(job: AnnotationJob, doc: _Document) -> List[Dict[str, Any]]:
+        progress_kind = "progress" if doc.tag is None else f"progress:{doc.tag}"
+
+        async def progress_cb(payload: Dict[str, Any]) -> None:
+            job.publish_progress(progress_event(payload, doc.tag), kind=progress_kind)
 
         async def matches_cb(partial: List[Dict[str, Any]]) -> None:
-            event = AnnotationMatchesEvent(matches=[_to_rag_match(m).model_dump() for m in partial])
-            await queue.put(ndjson_annotation(event))
+            event = AnnotationMatchesEvent(document=doc.tag, matches=[_to_rag_match(m).model_dump() for m in partial])
+            job.publish_result(ndjson_annotation(event))
 
-        async def concurrency_worker() -> None:
-            while True:
-                active_requests = await concurrency_queue.get()
-                event = AnnotationConcurrencyEvent(activeRequests=active_requests)
-                await queue.put(ndjson_annotation(event))
+        await progress_cb({"stage": "file_uploaded"})
+        return await process_annotations_llm(
+            pdf_path=str(doc.path),
+            rules=cfg.rules,
+            answer_model=ANSWER_MODEL,
+            ollama_client=ollama_client,
+            chunk_size=cfg.chunkLength,
+            context_tokens=cfg.contextLength,
+            trace=job.trace,
+            page_range=page_range,
+            progress_callback=progress_cb,
+            chunk_matches_callback=matches_cb,
+            llm_cache=LLMCacheSession(LLM_RESPONSE_CACHE, mode=cfg.cacheMode),
+            compiled_rules=compiled_rules,
+            ollama_job=ollama_job,
+            job_embedding_gate=embedding_gate,
+        )
 
-        async def worker() -> None:
-            is_counted = False
+    async def run_batch_document(job: AnnotationJob, doc: _Document, in_flight: asyncio.Semaphore) -> None:
+        # One broken PDF must not fail the rest of the batch.
+        async with in_flight:
+            error: Optional[str] = None
+            matches: List[Dict[str, Any]] = []
             try:
-                await ANNOTATION_CONCURRENCY_TRACKER.increment()
-                is_counted = True
-                if tmp_path is None:
-                    raise RuntimeError("Temporary PDF path is missing")
-                await _compute(pdf_path=tmp_path, progress_cb=progress_cb, matches_cb=matches_cb)
-            except Exception as e:
-                logging.error(f"Error in annotations stream: {e}")
-                await queue.put(ndjson_annotation(ErrorEvent(message=str(e))))
-            finally:
-                if is_counted:
-                    await ANNOTATION_CONCURRENCY_TRACKER.decrement()
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-                await queue.put(ndjson_annotation(AnnotationDoneEvent()))
-                await queue.put(None)
-
-        concurrency_task = asyncio.create_task(concurrency_worker())
-        task = asyncio.create_task(worker())
+                matches = await run_document(job, doc)
+            except ANNOTATION_ERRORS as e:
+                logging.error(f"Annotating {doc.digest} failed: {e}")
+                error = str(e)
+            event = AnnotationDocumentDoneEvent(document=cast(str, doc.tag), matches=len(matches), error=error)
+            job.publish_result(ndjson_annotation(event))
+
+    async def run_job(job: AnnotationJob) -> None:
         try:
-            while True:
-                item = await queue.get()
-                if item is None:
-                    break
-                yield item
+            await ANNOTATION_ADMISSION.acquire(job)
+            try:
+                ANNOTATION_CONCURRENCY_TRACKER.increment()
+                if len(documents) == 1 and documents[0].tag is None:
+                    await run_document(job, documents[0])
+                else:
+                    in_flight = asyncio.Semaphore(ANNOTATION_BATCH_DOCUMENTS_IN_FLIGHT)
+                    await asyncio.gather(*(run_batch_document(job, doc, in_flight) for doc in documents))
+            finally:
+                ANNOTATION_CONCURRENCY_TRACKER.decrement()
+                ANNOTATION_ADMISSION.release()
         finally:
-            if not task.done():
-                task.cancel()
-            if not concurrency_task.done():
-                concurrency_task.cancel()
-            await ANNOTATION_CONCURRENCY_TRACKER.unsubscribe(concurrency_queue)
-            with contextlib.suppress(asyncio.CancelledError):
-                await concurrency_task
+            for doc in documents:
+                PDF_STORE.release(doc.digest)
+
+    if not ANNOTATION_ADMISSION.reserve():
+        for doc in documents:
+            PDF_STORE.release(doc.digest)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many annotation jobs, try again later",
+            headers={"Retry-After": str(ANNOTATION_RETRY_AFTER_SECONDS)},
+        )
 
+    # The job outlives this request: a dropped stream can be resumed with
+    # GET /api/annotations/{job_id}/stream.
+    job = ANNOTATION_JOBS.create()
+    trace_rate = cfg.traceSampleRate if cfg.traceSampleRate is not None else ANNOTATION_TRACE_SAMPLE_RATE
+    if trace_rate > 0:
+        spill_path = None
+        if ANNOTATION_TRACE_SPILL and job.results_path is not None:
+            spill_path = job.results_path.with_suffix(".trace.ndjson")
+        job.trace = TraceRecorder(trace_rate, ANNOTATION_TRACE_MAX_EVENTS, spill_path=spill_path)
+    job.start(run_job)
+    return _job_stream(job)
+
+
+def _empty_response() -> StreamingResponse:
+    async def empty_gen() -> AsyncIterator[str]:
+        yield ndjson_annotation(AnnotationUpdateProgressEvent(stage="done", completed=0, total=0))
+        yield ndjson_annotation(AnnotationDoneEvent())
+
+    return _ndjson_response(empty_gen())
+
+
+def _error_response(message: str) -> StreamingResponse:
+    async def error_gen() -> AsyncIterator[str]:
+        yield ndjson_annotation(ErrorEvent(message=message))
+        yield ndjson_annotation(AnnotationDoneEvent())
+
+    return _ndjson_response(error_gen())
+
+
+def _ndjson_response(lines: AsyncIterator[str]) -> StreamingResponse:
     return StreamingResponse(
-        gen(),
+        lines,
         media_type="application/x-ndjson",
         headers={
             "Cache-Control": "no-cache",
             "X-Accel-Buffering": "no",
         },
     )
+
+
+def _job_stream(job: AnnotationJob) -> StreamingResponse:
+    async def gen() -> AsyncIterator[str]:
+        stream = job.subscribe()
+        ANNOTATION_CONCURRENCY_TRACKER.subscribe(stream)
+        try:
+            with ACTIVE_STREAMS.labels("annotations").track_inprogress():
+                while (item := await stream.get()) is not None:
+                    yield item
+        finally:
+            ANNOTATION_CONCURRENCY_TRACKER.unsubscribe(stream)
+            job.unsubscribe(stream)
+
+    return _ndjson_response(gen())
+
+
+@router.get("/api/annotations/{job_id}/stream", response_model=None)
+async def annotation_job_stream(job_id: str) -> StreamingResponse:
+    """Replay the finished matches of a job and keep streaming it while it runs."""
+    job = ANNOTATION_JOBS.get(job_id)
+    if job is not None:
+        return _job_stream(job)
+    lines = ANNOTATION_JOBS.replay_from_disk(job_id)
+    if lines is None:
+        raise HTTPException(status_code=404, detail=f"Unknown annotation job: {job_id}")
+
+    async def replay_gen() -> AsyncIterator[str]:
+        for line in lines:
+            yield line
+
+    return _ndjson_response(replay_gen())
+
+
+@router.get("/api/annotations/{job_id}/trace")
+async def annotation_job_trace(job_id: str, include_spilled: bool = False) -> Dict[str, Any]:
+    """Sampled LLM requests and responses of a job that was started with tracing enabled."""
+    job = ANNOTATION_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown annotation job: {job_id}")
+    if job.trace is None:
+        raise HTTPException(status_code=404, detail=f"Tracing was not enabled for annotation job {job_id}")
+    return {
+        "jobId": job_id,
+        "status": job.status,
+        **job.trace.stats(),
+        "events": job.trace.events(include_spilled=include_spilled),
+    }
+
+
+@router.delete("/api/annotations/{job_id}")
+async def cancel_annotation_job(job_id: str) -> Dict[str, str]:
+    job = ANNOTATION_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown annotation job: {job_id}")
+    job.cancel()
+    return {"jobId": job_id, "status": job.status}
@@ -24,12 +24,27 @@ class RagHighlightRule(BaseModel):
 class RagPopupConfig(BaseModel):
     rules: list[RagHighlightRule]
     chunkLength: int | None = Field(default=None, ge=32, le=20000)
+    contextLength: int | None = Field(default=None, ge=0, le=2000)
     pageRange: str | None = None
+    cacheMode: Literal["use", "bypass", "refresh"] = "use"
+    embeddingGateThreshold: float | None = Field(default=None, ge=-1.0, le=1.0)
+    traceSampleRate: float | None = Field(default=None, ge=0.0, le=1.0)
+
+
+class PdfLookupIn(BaseModel):
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+    zoteroKey: str | None = None
+
+
+class PdfLookupOut(BaseModel):
+    sha256: str
+    known: bool
 
 
 class AnnotationUpdateProgressEvent(BaseModel):
     type: Literal["updateProgress"] = "updateProgress"
     stage: str
+    document: Optional[str] = None
     debug: Optional[str] = None
     sent: Optional[int] = None
     chunk: Optional[int] = None
@@ -38,6 +53,11 @@ class AnnotationUpdateProgressEvent(BaseModel):
     markerId: Optional[str] = None
     completed: Optional[int] = None
     total: Optional[int] = None
+    cacheHits: Optional[int] = None
+    cacheMisses: Optional[int] = None
+    gateChunksSkipped: Optional[int] = None
+    gateSentencesKept: Optional[int] = None
+    gateSentencesTotal: Optional[int] = None
 
 
 class AnnotationDoneEvent(BaseModel):
@@ -46,14 +66,37 @@ class AnnotationDoneEvent(BaseModel):
 
 class AnnotationMatchesEvent(BaseModel):
     type: Literal["annotationMatches"] = "annotationMatches"
+    document: Optional[str] = None
     matches: List[Dict[str, Any]]
 
 
+class AnnotationDocumentDoneEvent(BaseModel):
+    type: Literal["annotationDocumentDone"] = "annotationDocumentDone"
+    document: str
+    matches: int = Field(ge=0)
+    error: Optional[str] = None
+
+
 class AnnotationConcurrencyEvent(BaseModel):
     type: Literal["annotationConcurrency"] = "annotationConcurrency"
     activeRequests: int = Field(ge=0)
 
 
+class AnnotationQueuedEvent(BaseModel):
+    type: Literal["annotationQueued"] = "annotationQueued"
+    position: int = Field(ge=1)
+    queued: int = Field(ge=1)
+
+
+AnnotationJobStatus = Literal["running", "done", "error", "cancelled"]
+
+
+class AnnotationJobEvent(BaseModel):
+    type: Literal["annotationJob"] = "annotationJob"
+    jobId: str
+    status: AnnotationJobStatus
+
+
 class ErrorEvent(BaseModel):
     type: Literal["error"] = "error"
     message: str
@@ -63,7 +106,10 @@ AnnotationNDJSONEvent = Annotated[
     Union[
         AnnotationUpdateProgressEvent,
         AnnotationMatchesEvent,
+        AnnotationDocumentDoneEvent,
         AnnotationConcurrencyEvent,
+        AnnotationJobEvent,
+        AnnotationQueuedEvent,
         AnnotationDoneEvent,
         ErrorEvent,
     ],
@@ -1,4 +1,5 @@
 import re
+from collections.abc import Sequence
 from typing import List
 
 from fastapi import HTTPException
@@ -34,7 +35,7 @@ def parse_page_range(raw: str | None) -> tuple[int, int] | None:
     return start_page - 1, end_page - 1
 
 
-def normalize_rects(rects: list[tuple[float, float, float, float] | None]) -> List[List[float]]:
+def normalize_rects(rects: Sequence[Sequence[float] | None]) -> List[List[float]]:
     out: List[List[float]] = []
     for r in rects:
         if r is None:
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import bisect
+import re
+from collections.abc import Iterator, Sequence
+from typing import overload
+
+import numpy as np
+from numpy.typing import NDArray
+
+from features.annotations.pdf_text_recognition import WordData
+
+_SENTENCE_END_RE = re.compile(r"[.!?][\"'”’)\]]*$")
+
+
+class TokenTable:
+    """
+    Columnar storage for the words of a document.
+
+    Words are appended page by page. The text of every page is kept as one joined
+    string and each token only stores its character offsets into it; rects and page
+    indices live in contiguous NumPy arrays. Chunks and sentences refer to token
+    index ranges instead of copying tokens.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        capacity = max(capacity, 1)
+        self._size = 0
+        self._part_texts: list[str] = []
+        self._part_token_starts: list[int] = []
+        self._char_starts: NDArray[np.int32] = np.empty(capacity, dtype=np.int32)
+        self._char_ends: NDArray[np.int32] = np.empty(capacity, dtype=np.int32)
+        self._part_index: NDArray[np.int32] = np.empty(capacity, dtype=np.int32)
+        self._rects: NDArray[np.float32] = np.empty((capacity, 4), dtype=np.float32)
+        self._has_rect: NDArray[np.bool_] = np.empty(capacity, dtype=np.bool_)
+        self._pages: NDArray[np.int32] = np.empty(capacity, dtype=np.int32)
+        self._ends_sentence: NDArray[np.bool_] = np.empty(capacity, dtype=np.bool_)
+
+    @classmethod
+    def from_pages(cls, pages: Sequence[tuple[int, Sequence[WordData]]]) -> TokenTable:
+        table = cls(capacity=sum(len(words) for _page, words in pages))
+        for page, words in pages:
+            table.append_page(page, words)
+        return table
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def rects(self) -> NDArray[np.float32]:
+        return self._rects[: self._size]
+
+    @property
+    def has_rect(self) -> NDArray[np.bool_]:
+        return self._has_rect[: self._size]
+
+    @property
+    def pages(self) -> NDArray[np.int32]:
+        return self._pages[: self._size]
+
+    @property
+    def ends_sentence(self) -> NDArray[np.bool_]:
+        return self._ends_sentence[: self._size]
+
+    def append_page(self, page: int, words: Sequence[WordData]) -> None:
+        if not words:
+            return
+        texts = [w["text"] for w in words]
+        n = len(texts)
+        self._reserve(self._size + n)
+        start, end = self._size, self._size + n
+
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int32, count=n)
+        ends = np.cumsum(lengths + 1, dtype=np.int32) - 1
+        self._char_ends[start:end] = ends
+        self._char_starts[start:end] = ends - lengths
+        self._part_index[start:end] = len(self._part_texts)
+        self._part_token_starts.append(start)
+        self._part_texts.append(" ".join(texts))
+
+        raw_rects = [w["rect"] for w in words]
+        has_rect = np.fromiter((r is not None for r in raw_rects), dtype=np.bool_, count=n)
+        self._has_rect[start:end] = has_rect
+        rects = self._rects[start:end]
+        rects[~has_rect] = np.nan
+        if has_rect.any():
+            rects[has_rect] = [r for r in raw_rects if r is not None]
+        self._pages[start:end] = page
+        self._ends_sentence[start:end] = [_SENTENCE_END_RE.search(t) is not None for t in texts]
+        self._size = end
+
+    def token_text(self, index: int) -> str:
+        part = self._part_texts[int(self._part_index[index])]
+        return part[int(self._char_starts[index]) : int(self._char_ends[index])]
+
+    def span_text(self, start: int, end: int) -> str:
+        """Text of tokens [start, end), joined by single spaces."""
+        if end <= start:
+            return ""
+        pieces: list[str] = []
+        part_idx = bisect.bisect_right(self._part_token_starts, start) - 1
+        pos = start
+        while pos < end:
+            part_end = (
+                self._part_token_starts[part_idx + 1]
+                if part_idx + 1 < len(self._part_token_starts)
+                else self._size
+            )
+            last = min(end, part_end) - 1
+            part = self._part_texts[part_idx]
+            pieces.append(part[int(self._char_starts[pos]) : int(self._char_ends[last])])
+            pos = last + 1
+            part_idx += 1
+        return " ".join(pieces)
+
+    def view(self, start: int, end: int) -> TokenView:
+        return TokenView(self, start, end)
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._pages.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in (
+            "_char_starts",
+            "_char_ends",
+            "_part_index",
+            "_rects",
+            "_has_rect",
+            "_pages",
+            "_ends_sentence",
+        ):
+            old = getattr(self, name)
+            grown = np.empty((new_capacity, *old.shape[1:]), dtype=old.dtype)
+            grown[: self._size] = old[: self._size]
+            setattr(self, name, grown)
+
+
+class TokenView:
+    """Zero-copy window [start, end) over a TokenTable; indices are view-local."""
+
+    __slots__ = ("table", "start", "end")
+
+    def __init__(self, table: TokenTable, start: int, end: int) -> None:
+        self.table = table
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @overload
+    def __getitem__(self, key: int) -> str: ...
+
+    @overload
+    def __getitem__(self, key: slice) -> TokenView: ...
+
+    def __getitem__(self, key: int | slice) -> str | TokenView:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("TokenView slices must be contiguous")
+            return TokenView(self.table, self.start + start, self.start + max(start, stop))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        return self.table.token_text(self.start + key)
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self.start, self.end):
+            yield self.table.token_text(i)
+
+    @property
+    def text(self) -> str:
+        return self.table.span_text(self.start, self.end)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TraceRecorder:
+    """
+    Sampled capture of the LLM calls of one annotation job.
+
+    Only `sample_rate` of the calls are recorded, and at most `max_events` of them are
+    kept in memory. Older events are appended to `spill_path` when one is given and
+    dropped otherwise.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float,
+        max_events: int,
+        spill_path: Optional[Path] = None,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.spill_path = spill_path
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._rng = rng or random.Random()
+        self.calls = 0
+        self.recorded = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def sample(self) -> bool:
+        """Decide whether the upcoming call is traced."""
+        self.calls += 1
+        return self._rng.random() < self.sample_rate
+
+    def record(self, event: Dict[str, Any]) -> None:
+        self.recorded += 1
+        if len(self._events) == self._events.maxlen:
+            self._evict(self._events[0])
+        self._events.append(event)
+
+    def _evict(self, event: Dict[str, Any]) -> None:
+        if self.spill_path is not None:
+            try:
+                with self.spill_path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps(event) + "\n")
+                self.spilled += 1
+                return
+            except OSError as e:
+                logger.warning(f"Cannot spill trace events to {self.spill_path}: {e}")
+                self.spill_path = None
+        self.dropped += 1
+
+    def events(self, include_spilled: bool = False) -> List[Dict[str, Any]]:
+        events = list(self._events)
+        if include_spilled and self.spilled and self.spill_path is not None:
+            try:
+                with self.spill_path.open(encoding="utf-8") as f:
+                    events = [json.loads(line) for line in f] + events
+            except OSError as e:
+                logger.warning(f"Cannot read spilled trace events: {e}")
+        return events
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sampleRate": self.sample_rate,
+            "calls": self.calls,
+            "recorded": self.recorded,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+        }
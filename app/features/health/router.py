@@ -1,8 +1,12 @@
+import asyncio
 from typing import Any, Dict, List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from core.clients import create_ollama_client, get_or_create_chroma_collection
+from core.ollama_scheduler import OLLAMA_SCHEDULER
+from features.ingest.catalog import INDEX_CATALOG
 
 router = APIRouter(tags=["health"])
 
@@ -12,6 +16,17 @@ async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@router.get("/metrics")
+def metrics() -> Response:
+    """Prometheus text exposition of the metrics in core.metrics."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/api/ollama-scheduler")
+async def ollama_scheduler() -> Dict[str, Any]:
+    return OLLAMA_SCHEDULER.stats()
+
+
 @router.get("/api/ollama-list-models")
 async def ollama_list() -> List[str]:
     try:
@@ -30,6 +45,7 @@ async def chroma_stats() -> Dict[str, Any]:
             "name": collection.name,
             "count": collection.count(),
             "metadata": collection.metadata,
+            "indexed_documents": await asyncio.to_thread(INDEX_CATALOG.count),
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Chroma unreachable: {e!s}") from e
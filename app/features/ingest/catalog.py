@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+INDEX_CATALOG_PATH = Path(os.getenv("INDEX_CATALOG_PATH", "/cache/index_catalog.sqlite3"))
+
+_COLUMNS = (
+    "zotero_id, filename, content_sha256, chunk_ids, chunk_count, page_count, model, indexed_at, duration_ms"
+)
+# chunk_ids is by far the widest column; reads that do not need it leave it on disk
+_COLUMNS_WITHOUT_CHUNK_IDS = _COLUMNS.replace("chunk_ids", "NULL")
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    zotero_id: str
+    filename: str
+    content_sha256: str
+    chunk_ids: List[str]
+    chunk_count: int
+    page_count: Optional[int]
+    model: str
+    indexed_at: float
+    duration_ms: float
+
+
+def _entry(row: tuple[Any, ...], include_chunk_ids: bool) -> CatalogEntry:
+    zotero_id, filename, content_sha256, chunk_ids, chunk_count, page_count, model, indexed_at, duration_ms = row
+    return CatalogEntry(
+        zotero_id=zotero_id,
+        filename=filename,
+        content_sha256=content_sha256,
+        chunk_ids=json.loads(chunk_ids) if include_chunk_ids else [],
+        chunk_count=chunk_count,
+        page_count=page_count,
+        model=model,
+        indexed_at=indexed_at,
+        duration_ms=duration_ms,
+    )
+
+
+class IndexCatalog:
+    """
+    SQLite record of what ingest wrote to Chroma, one row per indexed file of an attachment.
+
+    Lookups by zotero_id hit the primary key, so status queries never scan Chroma.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " zotero_id TEXT NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " content_sha256 TEXT NOT NULL,"
+                " chunk_ids TEXT NOT NULL,"
+                " chunk_count INTEGER NOT NULL,"
+                " page_count INTEGER,"
+                " model TEXT NOT NULL,"
+                " indexed_at REAL NOT NULL,"
+                " duration_ms REAL NOT NULL,"
+                " PRIMARY KEY (zotero_id, filename))"
+            )
+            conn.commit()
+            self._conn = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Index catalog disabled, cannot open {self.path}: {e}")
+            self._disabled = True
+        return self._conn
+
+    def get(self, zotero_id: str, include_chunk_ids: bool = False) -> List[CatalogEntry]:
+        return self.get_many([zotero_id], include_chunk_ids).get(zotero_id, [])
+
+    def get_many(
+        self,
+        zotero_ids: Optional[Sequence[str]] = None,
+        include_chunk_ids: bool = False,
+    ) -> Dict[str, List[CatalogEntry]]:
+        """Entries grouped by zotero_id; all of them when `zotero_ids` is None."""
+        columns = _COLUMNS if include_chunk_ids else _COLUMNS_WITHOUT_CHUNK_IDS
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return {}
+            if zotero_ids is None:
+                rows = conn.execute(f"SELECT {columns} FROM documents ORDER BY zotero_id, filename").fetchall()
+            else:
+                rows = []
+                ids = list(dict.fromkeys(zotero_ids))
+                # stay below SQLite's bound-parameter limit
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows.extend(conn.execute(
+                        f"SELECT {columns} FROM documents WHERE zotero_id IN ({placeholders})"
+                        " ORDER BY zotero_id, filename",
+                        part,
+                    ).fetchall())
+        out: Dict[str, List[CatalogEntry]] = {}
+        for row in rows:
+            entry = _entry(row, include_chunk_ids)
+            out.setdefault(entry.zotero_id, []).append(entry)
+        return out
+
+    def replace(self, zotero_id: str, entries: Sequence[CatalogEntry]) -> None:
+        """Make `entries` the complete record of `zotero_id`."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            with conn:
+                conn.execute("DELETE FROM documents WHERE zotero_id = ?", (zotero_id,))
+                conn.executemany(
+                    f"INSERT INTO documents ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            e.zotero_id,
+                            e.filename,
+                            e.content_sha256,
+                            json.dumps(e.chunk_ids),
+                            e.chunk_count,
+                            e.page_count,
+                            e.model,
+                            e.indexed_at,
+                            e.duration_ms,
+                        )
+                        for e in entries
+                    ],
+                )
+
+    def count(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            return int(conn.execute("SELECT COUNT(DISTINCT zotero_id) FROM documents").fetchone()[0])
+
+    async def record(self, zotero_id: str, entries: Sequence[CatalogEntry]) -> None:
+        try:
+            await asyncio.to_thread(self.replace, zotero_id, entries)
+        except sqlite3.Error as e:
+            logger.warning(f"Index catalog write failed: {e}")
+
+
+INDEX_CATALOG = IndexCatalog(INDEX_CATALOG_PATH)
@@ -1,14 +1,21 @@
+import asyncio
+import hashlib
 import logging
 import os
 import tempfile
+import time
 from collections.abc import Sequence
-from typing import cast
+from typing import List, cast
 
 from fastapi import APIRouter, File, Form, UploadFile
 
 from core.clients import create_ollama_client, get_or_create_chroma_collection
+from core.metrics import CHROMA_SECONDS, CHUNKING_SECONDS, EMBED_BATCH_SECONDS
+from core.ollama_scheduler import OLLAMA_SCHEDULER, Priority
 from core.settings import EMBEDDING_MODEL
 from core.types import ChromaMetadata, Embedding
+from features.ingest.catalog import INDEX_CATALOG, CatalogEntry
+from features.ingest.schemas import IndexedFileOut, IndexStatusBatchIn, IndexStatusBatchOut, IndexStatusOut
 from services.document.file_extractor import extract_auto
 from services.document.text_chunking import TextChunker
 
@@ -19,6 +26,40 @@ def _document_id(zotero_id: str, filename: str, idx: int) -> str:
     return f"{zotero_id}_{filename}_{idx}"
 
 
+def _status(zotero_id: str, entries: List[CatalogEntry]) -> IndexStatusOut:
+    return IndexStatusOut(
+        zoteroId=zotero_id,
+        indexed=bool(entries),
+        chunkCount=sum(e.chunk_count for e in entries),
+        files=[
+            IndexedFileOut(
+                filename=e.filename,
+                contentSha256=e.content_sha256,
+                chunkCount=e.chunk_count,
+                pageCount=e.page_count,
+                model=e.model,
+                indexedAt=e.indexed_at,
+                durationMs=e.duration_ms,
+            )
+            for e in entries
+        ],
+    )
+
+
+@router.get("/api/index/documents/{zotero_id}", response_model=IndexStatusOut)
+async def index_status(zotero_id: str) -> IndexStatusOut:
+    entries = await asyncio.to_thread(INDEX_CATALOG.get, zotero_id)
+    return _status(zotero_id, entries)
+
+
+@router.post("/api/index/status", response_model=IndexStatusBatchOut)
+async def index_status_batch(body: IndexStatusBatchIn) -> IndexStatusBatchOut:
+    """Index state of many attachments (or of the whole catalog) from one catalog query."""
+    by_id = await asyncio.to_thread(INDEX_CATALOG.get_many, body.zoteroIds)
+    zotero_ids = list(dict.fromkeys(body.zoteroIds)) if body.zoteroIds is not None else list(by_id)
+    return IndexStatusBatchOut(documents=[_status(zid, by_id.get(zid, [])) for zid in zotero_ids])
+
+
 @router.post("/internal/file-changed")
 async def file_changed_hook(
     filename: str = Form(...),
@@ -26,6 +67,7 @@ async def file_changed_hook(
     file: UploadFile = File(...),
 ) -> None:
     logging.info(f"Received file change event: {filename} {event_type}")
+    started = time.perf_counter()
     collection = get_or_create_chroma_collection()
     client = create_ollama_client()
 
@@ -33,6 +75,7 @@ async def file_changed_hook(
         content = await file.read()
         tmp.write(content)
         tmp_path = tmp.name
+    content_sha256 = hashlib.sha256(content).hexdigest()
 
     try:
         extracted_data = extract_auto(tmp_path)
@@ -41,24 +84,35 @@ async def file_changed_hook(
             os.remove(tmp_path)
 
     zotero_id, extension = os.path.splitext(os.path.basename(filename))
-    if extension != ".prop":
+    if extension == ".prop":
+        return
+
+    # Delete by metadata rather than by the IDs in the catalog: chunks added by a run
+    # that failed before recording them are listed nowhere else.
+    with CHROMA_SECONDS.labels("delete").time():
         collection.delete(where={"zotero_id": zotero_id})
 
+    indexed: list[tuple[str, list[str], int | None]] = []
+
     for fname, text in extracted_data.items():
         if not text:
             logging.info(f"No text extracted from {fname}")
             continue
 
+        chunking_started = time.perf_counter()
         chunker = TextChunker()
         cleaned_text = chunker.clean_text(text)
         chunks_with_pages = chunker.chunk_text_with_pages(cleaned_text)
+        CHUNKING_SECONDS.labels("ingest").observe(time.perf_counter() - chunking_started)
         chunks = [chunk for chunk, _page_start, _page_end in chunks_with_pages]
 
         if not chunks:
             logging.info(f"No chunks extracted from {fname}")
             continue
 
-        response = await client.embed(model=EMBEDDING_MODEL, input=chunks)
+        async with OLLAMA_SCHEDULER.slot("ingest", Priority.BATCH):
+            with EMBED_BATCH_SECONDS.labels("ingest").time():
+                response = await client.embed(model=EMBEDDING_MODEL, input=chunks)
         embeddings: list[Embedding] = [cast(Sequence[float], e) for e in response.embeddings]
 
         ids = [_document_id(zotero_id, fname, i) for i in range(len(chunks))]
@@ -75,10 +129,34 @@ async def file_changed_hook(
                 metadata["page_end"] = page_end
             metadatas.append(cast(ChromaMetadata, metadata))
 
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas,
-        )
+        with CHROMA_SECONDS.labels("add").time():
+            # upsert: an ID left over from an interrupted run must not keep its stale chunk
+            collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=chunks,
+                metadatas=metadatas,
+            )
+        pages = [p for _chunk, page_start, page_end in chunks_with_pages for p in (page_start, page_end) if p is not None]
+        indexed.append((fname, ids, max(pages) if pages else None))
         logging.info(f"Successfully indexed {len(chunks)} chunks for {fname}")
+
+    indexed_at = time.time()
+    duration_ms = (time.perf_counter() - started) * 1000.0
+    await INDEX_CATALOG.record(
+        zotero_id,
+        [
+            CatalogEntry(
+                zotero_id=zotero_id,
+                filename=fname,
+                content_sha256=content_sha256,
+                chunk_ids=ids,
+                chunk_count=len(ids),
+                page_count=page_count,
+                model=EMBEDDING_MODEL,
+                indexed_at=indexed_at,
+                duration_ms=duration_ms,
+            )
+            for fname, ids, page_count in indexed
+        ],
+    )
@@ -0,0 +1,29 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class IndexedFileOut(BaseModel):
+    filename: str
+    contentSha256: str
+    chunkCount: int
+    pageCount: int | None = None
+    model: str
+    indexedAt: float
+    durationMs: float
+
+
+class IndexStatusOut(BaseModel):
+    zoteroId: str
+    indexed: bool
+    chunkCount: int
+    files: List[IndexedFileOut]
+
+
+class IndexStatusBatchIn(BaseModel):
+    # None returns the status of every attachment in the catalog
+    zoteroIds: List[str] | None = Field(default=None, max_length=100000)
+
+
+class IndexStatusBatchOut(BaseModel):
+    documents: List[IndexStatusOut]
@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from core.profiling import PROFILER, ProfileMode, ProfilerBusyError, authorized
+from core.settings import PROFILING_ENABLED, PROFILING_MAX_SECONDS
+
+router = APIRouter(tags=["profiling"])
+
+_SUFFIX = {"sample": "collapsed", "cprofile": "pstats"}
+
+
+def _require_authorized(request: Request) -> None:
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Profile-Token")
+
+
+@router.get("/internal/profile")
+async def profile_process(
+    request: Request,
+    seconds: float = Query(default=10.0, gt=0, le=PROFILING_MAX_SECONDS),
+    mode: ProfileMode = "sample",
+    interval_ms: float | None = Query(default=None, ge=1.0, le=1000.0),
+) -> Response:
+    """
+    Profile the whole process for `seconds`. `sample` returns collapsed stacks of all
+    threads (flamegraph.pl, speedscope); `cprofile` returns a pstats file of the event loop.
+    """
+    _require_authorized(request)
+    try:
+        session = PROFILER.open(mode, interval_ms / 1000.0 if interval_ms is not None else None)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        data = await PROFILER.close(session)
+    return Response(
+        data,
+        media_type=session.media_type,
+        headers={"Content-Disposition": f'attachment; filename="core.{_SUFFIX[mode]}"'},
+    )
+
+
+@router.get("/internal/profile/{profile_id}")
+async def request_profile(request: Request, profile_id: str) -> Response:
+    """Profile of a request sent with an `X-Profile` header, by its `X-Profile-Id`."""
+    _require_authorized(request)
+    result = PROFILER.result(profile_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Profile not found or not finished yet")
+    media_type, data = result
+    return Response(data, media_type=media_type)
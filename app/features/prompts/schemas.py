@@ -14,6 +14,7 @@ class SystemPromptOut(BaseModel):
     description: str
     placeholders: List[PromptPlaceholderOut]
     content: str
+    version: str
 
 
 class SystemPromptListOut(BaseModel):
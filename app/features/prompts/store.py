@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import re
 import shutil
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Mapping
+from typing import Mapping, Optional
 
 
 @dataclass(frozen=True)
@@ -89,7 +93,53 @@ def _prompt_path(prompt_key: str) -> Path:
     return PROMPTS_DIR / _get_spec(prompt_key).filename
 
 
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """
+    A prompt template split at its placeholders once, so rendering is a single join.
+    `version` is a hash of the template text that caches can key on.
+    """
+    key: str
+    content: str
+    version: str
+    literals: tuple[str, ...]
+    names: tuple[str, ...]
+    mtime_ns: int
+
+    def render(self, values: Mapping[str, str]) -> str:
+        out = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            out.append(values[name])
+            out.append(literal)
+        return "".join(out)
+
+
+# How long a loaded template is trusted before its mtime is checked again.
+_RELOAD_CHECK_SECONDS = 1.0
+
+_compiled: dict[str, tuple[CompiledPrompt, float]] = {}
+_lock = threading.Lock()
+_store_ready = False
+
+
+def _compile(prompt_key: str, content: str, mtime_ns: int) -> CompiledPrompt:
+    names = [p.name for p in _get_spec(prompt_key).placeholders]
+    parts = [content]
+    if names:
+        pattern = r"\{\{(" + "|".join(re.escape(n) for n in names) + r")\}\}"
+        parts = re.split(pattern, content)
+    return CompiledPrompt(
+        key=prompt_key,
+        content=content,
+        version=hashlib.sha256(content.encode("utf-8")).hexdigest()[:16],
+        literals=tuple(parts[0::2]),
+        names=tuple(parts[1::2]),
+        mtime_ns=mtime_ns,
+    )
+
+
 def ensure_prompt_store() -> None:
+    global _store_ready
     PROMPTS_DIR.mkdir(parents=True, exist_ok=True)
     for key in PROMPT_SPECS:
         target = _prompt_path(key)
@@ -99,40 +149,63 @@ def ensure_prompt_store() -> None:
         if not src.exists():
             raise FileNotFoundError(f"Missing default prompt file: {src}")
         shutil.copyfile(src, target)
+    _store_ready = True
 
 
-def get_prompt_content(prompt_key: str) -> str:
-    ensure_prompt_store()
+def get_prompt(prompt_key: str) -> CompiledPrompt:
+    """The compiled template, reloaded only when its file changed on disk."""
+    now = time.monotonic()
+    with _lock:
+        entry = _compiled.get(prompt_key)
+        if entry is not None and now - entry[1] < _RELOAD_CHECK_SECONDS:
+            return entry[0]
+        cached = entry[0] if entry is not None else None
+        prompt = _load(prompt_key, cached)
+        _compiled[prompt_key] = (prompt, now)
+        return prompt
+
+
+def _load(prompt_key: str, cached: Optional[CompiledPrompt]) -> CompiledPrompt:
+    if not _store_ready:
+        ensure_prompt_store()
     path = _prompt_path(prompt_key)
     if not path.exists():
         src = _default_path(prompt_key)
         shutil.copyfile(src, path)
-    return path.read_text(encoding="utf-8")
+    mtime_ns = path.stat().st_mtime_ns
+    if cached is not None and cached.mtime_ns == mtime_ns:
+        return cached
+    return _compile(prompt_key, path.read_text(encoding="utf-8"), mtime_ns)
+
+
+def get_prompt_content(prompt_key: str) -> str:
+    return get_prompt(prompt_key).content
 
 
 def update_prompt_content(prompt_key: str, content: str) -> None:
     ensure_prompt_store()
-    _prompt_path(prompt_key).write_text(content, encoding="utf-8")
+    path = _prompt_path(prompt_key)
+    with _lock:
+        path.write_text(content, encoding="utf-8")
+        prompt = _compile(prompt_key, content, path.stat().st_mtime_ns)
+        _compiled[prompt_key] = (prompt, time.monotonic())
 
 
 def render_prompt(prompt_key: str, values: Mapping[str, str]) -> str:
-    text = get_prompt_content(prompt_key)
-    spec = _get_spec(prompt_key)
-    out = text
-    for placeholder in spec.placeholders:
-        token = f"{{{{{placeholder.name}}}}}"
+    prompt = get_prompt(prompt_key)
+    for placeholder in _get_spec(prompt_key).placeholders:
         if placeholder.name not in values:
             raise MissingPlaceholderError(
                 f"Missing placeholder '{placeholder.name}' for prompt '{prompt_key}'"
             )
-        out = out.replace(token, values[placeholder.name])
-    return out
+    return prompt.render(values)
 
 
 def list_prompts() -> list[dict[str, object]]:
     ensure_prompt_store()
     out: list[dict[str, object]] = []
     for key, spec in PROMPT_SPECS.items():
+        prompt = get_prompt(key)
         out.append(
             {
                 "key": key,
@@ -142,7 +215,8 @@ def list_prompts() -> list[dict[str, object]]:
                     {"name": p.name, "description": p.description}
                     for p in spec.placeholders
                 ],
-                "content": get_prompt_content(key),
+                "content": prompt.content,
+                "version": prompt.version,
             }
         )
     return out
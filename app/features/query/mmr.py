@@ -0,0 +1,69 @@
+from collections.abc import Hashable, Sequence
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+
+def _normalize_rows(matrix: NDArray[np.float32]) -> NDArray[np.float32]:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    normalized: NDArray[np.float32] = matrix / norms
+    return normalized
+
+
+def mmr_select(
+    query_embedding: ArrayLike,
+    candidate_embeddings: ArrayLike,
+    k: int,
+    lambda_mult: float = 0.7,
+    group_keys: Sequence[Hashable] | None = None,
+    max_per_group: int | None = None,
+) -> list[int]:
+    """
+    Maximal marginal relevance over cosine similarity.
+
+    Returns candidate indices in selection order. `group_keys` (one per candidate)
+    together with `max_per_group` caps how many candidates one document may contribute.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if k <= 0 or candidates.ndim != 2 or candidates.shape[0] == 0:
+        return []
+
+    candidates = _normalize_rows(candidates)
+    query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    n = candidates.shape[0]
+
+    relevance = candidates @ query
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    group_codes: NDArray[np.intp] | None = None
+    group_counts: NDArray[np.intp] | None = None
+    if group_keys is not None and max_per_group is not None:
+        if len(group_keys) != n:
+            raise ValueError("group_keys must have one entry per candidate")
+        code_by_key: dict[Hashable, int] = {}
+        group_codes = np.fromiter(
+            (code_by_key.setdefault(key, len(code_by_key)) for key in group_keys),
+            dtype=np.intp,
+            count=n,
+        )
+        group_counts = np.zeros(len(code_by_key), dtype=np.intp)
+
+    selected: list[int] = []
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+
+        if group_codes is not None and group_counts is not None and max_per_group is not None:
+            code = group_codes[pick]
+            group_counts[code] += 1
+            if group_counts[code] >= max_per_group:
+                available &= group_codes != code
+
+        np.maximum(redundancy, candidates @ candidates[pick], out=redundancy)
+
+    return selected
@@ -1,19 +1,28 @@
+import asyncio
 import logging
+import time
 from collections.abc import AsyncIterator
-from typing import cast
+from typing import Any, Dict, Optional, cast
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 from ollama import AsyncClient
 
 from core.clients import create_ollama_client
-from core.settings import ANSWER_MODEL
+from core.metrics import ACTIVE_STREAMS, QUERY_TIME_TO_FIRST_TOKEN_SECONDS, QUERY_TOKENS_PER_SECOND
+from core.ollama_scheduler import OLLAMA_SCHEDULER, Priority
+from core.settings import ANSWER_MODEL, QUERY_BATCH_SIZE
 from features.query.schemas import (
     ChatTitleIn,
     ChatTitleOut,
     QueryDoneEvent,
     QueryIn,
     QueryUpdateProgressEvent,
+    SearchBatchIn,
+    SearchIn,
+    SearchOut,
+    SearchResultEvent,
+    SearchTimings,
     SetSourcesEvent,
     TokenEvent,
     ndjson_query,
@@ -21,6 +30,7 @@ from features.query.schemas import (
 from features.query.service import (
     format_sources_by_file,
     get_query_hits,
+    get_query_hits_batch,
     normalize_sources,
     sanitize_title,
 )
@@ -32,38 +42,137 @@ router = APIRouter(tags=["query"])
 @router.post("/api/query")
 async def query(body: QueryIn) -> StreamingResponse:
     async def gen() -> AsyncIterator[str]:
-        prior_messages = [m for m in (body.messages or []) if m.content.strip()]
-        source_list = normalize_sources(body.sources or [])
-
-        yield ndjson_query(QueryUpdateProgressEvent(stage="search_hits"))
-        hits = await get_query_hits(body.prompt)
-        context, sources = format_sources_by_file(hits, existing_sources=source_list)
-        yield ndjson_query(SetSourcesEvent(sources=sources))
-        client = create_ollama_client()
-        source_context = "SOURCES:\n" + (
-            context.strip() if context.strip() else "(none)"
+        with ACTIVE_STREAMS.labels("query").track_inprogress():
+            async for line in _answer(body):
+                yield line
+
+    return StreamingResponse(
+        gen(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+async def _answer(body: QueryIn) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    prior_messages = [m for m in (body.messages or []) if m.content.strip()]
+    source_list = normalize_sources(body.sources or [])
+
+    yield ndjson_query(QueryUpdateProgressEvent(stage="search_hits"))
+    hits = await get_query_hits(body.prompt)
+    context, sources = format_sources_by_file(hits, existing_sources=source_list)
+    yield ndjson_query(SetSourcesEvent(sources=sources))
+    client = create_ollama_client()
+    source_context = "SOURCES:\n" + (
+        context.strip() if context.strip() else "(none)"
+    )
+    system_prompt = get_prompt_content("query_system")
+    yield ndjson_query(QueryUpdateProgressEvent(stage="generate_start", debug=context if body.debug else None))
+    chat_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": source_context},
+        *[
+            {"role": m.role, "content": m.content.strip()}
+            for m in prior_messages
+        ],
+        {"role": "user", "content": body.prompt},
+    ]
+
+    # Generation runs in its own task and hands tokens over through a queue, so the
+    # interactive slot is freed when Ollama is done, not when a slow client has read it all.
+    tokens: asyncio.Queue[Optional[str]] = asyncio.Queue()
+
+    async def generate() -> None:
+        first_token_at: Optional[float] = None
+        pieces = 0
+        try:
+            async with OLLAMA_SCHEDULER.slot("query", Priority.INTERACTIVE):
+                async for part in await client.chat(
+                    model=ANSWER_MODEL,
+                    messages=chat_messages,
+                    stream=True,
+                ):
+                    token = part.get("message", {}).get("content", "")
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            QUERY_TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - started)
+                        pieces += 1
+                        tokens.put_nowait(token)
+                    if part.get("done"):
+                        _observe_generation_speed(part, pieces, first_token_at)
+        finally:
+            tokens.put_nowait(None)
+
+    producer = asyncio.create_task(generate())
+    try:
+        while (token := await tokens.get()) is not None:
+            yield ndjson_query(TokenEvent(token=token))
+        # re-raises a failed generation
+        await producer
+    finally:
+        producer.cancel()
+    yield ndjson_query(QueryDoneEvent())
+
+
+def _observe_generation_speed(final_part: Any, pieces: int, first_token_at: Optional[float]) -> None:
+    """Prefer Ollama's own eval counters; fall back to streamed pieces per second."""
+    eval_count = final_part.get("eval_count")
+    eval_duration = final_part.get("eval_duration")
+    if eval_count and eval_duration:
+        QUERY_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9))
+    elif pieces and first_token_at is not None:
+        elapsed = time.perf_counter() - first_token_at
+        if elapsed > 0:
+            QUERY_TOKENS_PER_SECOND.observe(pieces / elapsed)
+
+
+@router.post("/api/search", response_model=SearchOut)
+async def search(body: SearchIn) -> SearchOut:
+    overrides: Dict[str, Any] = {
+        name: getattr(body, name)
+        for name in (
+            "n_results",
+            "neighbor_top_n",
+            "neighbor_distance_threshold",
+            "mmr_candidates",
+            "mmr_lambda",
+            "mmr_max_per_document",
         )
-        system_prompt = get_prompt_content("query_system")
-        yield ndjson_query(QueryUpdateProgressEvent(stage="generate_start", debug=context))
-        chat_messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "system", "content": source_context},
-            *[
-                {"role": m.role, "content": m.content.strip()}
-                for m in prior_messages
-            ],
-            {"role": "user", "content": body.prompt},
-        ]
-
-        async for part in await client.chat(
-            model=ANSWER_MODEL,
-            messages=chat_messages,
-            stream=True,
-        ):
-            token = part.get("message", {}).get("content", "")
-            if token:
-                yield ndjson_query(TokenEvent(token=token))
-        yield ndjson_query(QueryDoneEvent())
+        # an explicit null keeps the server default; only the threshold uses null to mean "none"
+        if name in body.model_fields_set
+        and (getattr(body, name) is not None or name == "neighbor_distance_threshold")
+    }
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    hits = (await get_query_hits_batch([body.prompt], timings=timings, **overrides))[0]
+    format_started = time.perf_counter()
+    context, sources = format_sources_by_file(hits, existing_sources=normalize_sources(body.sources or []))
+    finished = time.perf_counter()
+    timings["format_ms"] = (finished - format_started) * 1000.0
+    timings["total_ms"] = (finished - started) * 1000.0
+    return SearchOut(
+        hits=hits,
+        sources=sources,
+        context_chars=len(context),
+        timings=SearchTimings(**timings),
+    )
+
+
+@router.post("/api/search/batch")
+async def search_batch(body: SearchBatchIn) -> StreamingResponse:
+    async def gen() -> AsyncIterator[str]:
+        with ACTIVE_STREAMS.labels("search_batch").track_inprogress():
+            for offset in range(0, len(body.prompts), QUERY_BATCH_SIZE):
+                prompts = body.prompts[offset : offset + QUERY_BATCH_SIZE]
+                hits_per_prompt = await get_query_hits_batch(prompts)
+                for i, (prompt, hits) in enumerate(zip(prompts, hits_per_prompt), start=offset):
+                    _context, sources = format_sources_by_file(hits)
+                    yield ndjson_query(SearchResultEvent(index=i, prompt=prompt, hits=hits, sources=sources))
+            yield ndjson_query(QueryDoneEvent())
 
     return StreamingResponse(
         gen(),
@@ -89,12 +198,13 @@ async def chat_title(
 
     try:
         system_prompt = get_prompt_content("title_system")
-        result = await ollama_client.generate(
-            model=ANSWER_MODEL,
-            prompt=prompt,
-            system=system_prompt,
-            stream=False,
-        )
+        async with OLLAMA_SCHEDULER.slot("chat-title", Priority.INTERACTIVE):
+            result = await ollama_client.generate(
+                model=ANSWER_MODEL,
+                prompt=prompt,
+                system=system_prompt,
+                stream=False,
+            )
         raw_title = cast(str, result.get("response", ""))
         return ChatTitleOut(title=sanitize_title(raw_title))
     except Exception as e:
@@ -8,6 +8,23 @@ class QueryIn(BaseModel):
     prompt: str
     messages: Optional[List["ChatTitleMessage"]] = None
     sources: Optional[List["Source"]] = None
+    # echo the retrieved context in the generate_start progress event
+    debug: bool = False
+
+
+class SearchIn(BaseModel):
+    prompt: str
+    sources: Optional[List["Source"]] = None
+    n_results: Optional[int] = Field(default=None, ge=1)
+    neighbor_top_n: Optional[int] = Field(default=None, ge=0)
+    neighbor_distance_threshold: Optional[float] = Field(default=None, ge=0.0)
+    mmr_candidates: Optional[int] = Field(default=None, ge=1)
+    mmr_lambda: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    mmr_max_per_document: Optional[int] = Field(default=None, ge=1)
+
+
+class SearchBatchIn(BaseModel):
+    prompts: List[str] = Field(min_length=1)
 
 
 class ChatTitleMessage(BaseModel):
@@ -30,6 +47,8 @@ class Hit(BaseModel):
     chunk_index: int
     page_start: Optional[int] = None
     page_end: Optional[int] = None
+    distance: Optional[float] = None
+    neighbor_of: Optional[List[int]] = None
 
 
 class Source(BaseModel):
@@ -39,6 +58,22 @@ class Source(BaseModel):
     pages: Optional[List[int]] = None
 
 
+class SearchTimings(BaseModel):
+    embed_ms: float = 0.0
+    vector_query_ms: float = 0.0
+    diversify_ms: float = 0.0
+    neighbor_fetch_ms: float = 0.0
+    format_ms: float = 0.0
+    total_ms: float = 0.0
+
+
+class SearchOut(BaseModel):
+    hits: List[Hit]
+    sources: List[Source]
+    context_chars: int
+    timings: SearchTimings
+
+
 class QueryUpdateProgressEvent(BaseModel):
     type: Literal["updateProgress"] = "updateProgress"
     stage: str
@@ -59,8 +94,16 @@ class QueryDoneEvent(BaseModel):
     type: Literal["done"] = "done"
 
 
+class SearchResultEvent(BaseModel):
+    type: Literal["searchResult"] = "searchResult"
+    index: int
+    prompt: str
+    hits: List[Hit]
+    sources: List[Source]
+
+
 QueryNDJSONEvent = Annotated[
-    Union[QueryUpdateProgressEvent, SetSourcesEvent, TokenEvent, QueryDoneEvent],
+    Union[QueryUpdateProgressEvent, SetSourcesEvent, TokenEvent, QueryDoneEvent, SearchResultEvent],
     Field(discriminator="type"),
 ]
 
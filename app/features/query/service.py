@@ -1,16 +1,24 @@
+import time
 from collections.abc import Mapping, Sequence
 from typing import Any, Dict, List, Optional, Tuple, cast
 
+import numpy as np
 from chromadb.api.types import GetResult, QueryResult
 
 from core.clients import create_ollama_client, get_or_create_chroma_collection
+from core.metrics import CHROMA_SECONDS, EMBED_BATCH_SECONDS
+from core.ollama_scheduler import OLLAMA_SCHEDULER, Priority
 from core.settings import (
     EMBEDDING_MODEL,
+    QUERY_MMR_CANDIDATES,
+    QUERY_MMR_LAMBDA,
+    QUERY_MMR_MAX_PER_DOCUMENT,
     QUERY_NEIGHBOR_DISTANCE_THRESHOLD,
     QUERY_NEIGHBOR_TOP_N,
     QUERY_N_RESULTS,
 )
 from core.types import Embedding
+from features.query.mmr import mmr_select
 from features.query.schemas import Hit, Source
 
 
@@ -86,48 +94,163 @@ def _neighbor_seed_hits(
     ]
 
 
+def _diversify(
+    query_embedding: Embedding,
+    hits: List[Hit],
+    distances: list[float] | None,
+    embeddings: Any,
+    n_results: int,
+    lambda_mult: float,
+    max_per_document: int,
+) -> tuple[List[Hit], list[float] | None]:
+    if embeddings is None or len(embeddings) != len(hits):
+        return hits[:n_results], distances[:n_results] if distances is not None else None
+    order = mmr_select(
+        query_embedding,
+        np.asarray(embeddings, dtype=np.float32),
+        k=n_results,
+        lambda_mult=lambda_mult,
+        group_keys=[(h.zotero_id, h.filename) for h in hits],
+        max_per_group=max_per_document,
+    )
+    selected_distances = [distances[i] for i in order] if distances is not None else None
+    return [hits[i] for i in order], selected_distances
+
+
 async def get_query_hits(
     prompt: str,
     n_results: int = QUERY_N_RESULTS,
     neighbor_top_n: int = QUERY_NEIGHBOR_TOP_N,
     neighbor_distance_threshold: float | None = QUERY_NEIGHBOR_DISTANCE_THRESHOLD,
+    mmr_candidates: int = QUERY_MMR_CANDIDATES,
+    mmr_lambda: float = QUERY_MMR_LAMBDA,
+    mmr_max_per_document: int = QUERY_MMR_MAX_PER_DOCUMENT,
 ) -> List[Hit]:
-    collection = get_or_create_chroma_collection()
-    client = create_ollama_client()
-    response = await client.embed(model=EMBEDDING_MODEL, input=prompt)
-    query_embedding: Embedding = cast(Sequence[float], response.embeddings[0])
-    res: QueryResult = collection.query(
-        query_embeddings=query_embedding,
+    batch = await get_query_hits_batch(
+        [prompt],
         n_results=n_results,
-        include=["documents", "metadatas", "distances"],
+        neighbor_top_n=neighbor_top_n,
+        neighbor_distance_threshold=neighbor_distance_threshold,
+        mmr_candidates=mmr_candidates,
+        mmr_lambda=mmr_lambda,
+        mmr_max_per_document=mmr_max_per_document,
     )
+    return batch[0]
+
+
+async def get_query_hits_batch(
+    prompts: Sequence[str],
+    n_results: int = QUERY_N_RESULTS,
+    neighbor_top_n: int = QUERY_NEIGHBOR_TOP_N,
+    neighbor_distance_threshold: float | None = QUERY_NEIGHBOR_DISTANCE_THRESHOLD,
+    mmr_candidates: int = QUERY_MMR_CANDIDATES,
+    mmr_lambda: float = QUERY_MMR_LAMBDA,
+    mmr_max_per_document: int = QUERY_MMR_MAX_PER_DOCUMENT,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[List[Hit]]:
+    """
+    One embed call, one multi-vector query and one neighbor get for all prompts.
+
+    If `timings` is given, the duration of each stage is stored in it (milliseconds).
+    """
+    if not prompts:
+        return []
+    collection = get_or_create_chroma_collection()
+    client = create_ollama_client()
+    stage_start = time.perf_counter()
+    async with OLLAMA_SCHEDULER.slot("query-embed", Priority.INTERACTIVE):
+        with EMBED_BATCH_SECONDS.labels("query").time():
+            response = await client.embed(model=EMBEDDING_MODEL, input=list(prompts))
+    query_embeddings: List[Embedding] = [cast(Sequence[float], e) for e in response.embeddings]
+    stage_start = _record_timing(timings, "embed_ms", stage_start)
+    with CHROMA_SECONDS.labels("query").time():
+        res: QueryResult = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=max(n_results, mmr_candidates),
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+    stage_start = _record_timing(timings, "vector_query_ms", stage_start)
     docs = res["documents"]
     metas = res["metadatas"]
     distances = res["distances"]
+    embeddings = res["embeddings"]
     if docs is None or metas is None:
-        return []
-    if len(docs) == 0 or len(metas) == 0:
-        return []
-    docs0 = docs[0]
-    metas0 = metas[0]
-    distances0 = distances[0] if distances is not None and len(distances) > 0 else None
-    hits = [create_hit(doc, metadata) for doc, metadata in zip(docs0, metas0)]
-    neighbor_ids = _get_neighbor_ids(
-        _neighbor_seed_hits(
-            hits,
-            distances=distances0,
-            neighbor_top_n=neighbor_top_n,
-            neighbor_distance_threshold=neighbor_distance_threshold,
+        return [[] for _ in prompts]
+
+    hits_per_prompt: List[List[Hit]] = []
+    seeds_per_prompt: List[List[Hit]] = []
+    for i, query_embedding in enumerate(query_embeddings):
+        if i >= len(docs) or i >= len(metas):
+            hits_per_prompt.append([])
+            seeds_per_prompt.append([])
+            continue
+        distances_i = distances[i] if distances is not None and i < len(distances) else None
+        embeddings_i = embeddings[i] if embeddings is not None and i < len(embeddings) else None
+        candidates = [create_hit(doc, metadata) for doc, metadata in zip(docs[i], metas[i])]
+        if distances_i is not None:
+            for hit, distance in zip(candidates, distances_i):
+                hit.distance = distance
+        hits, distances_i = _diversify(
+            query_embedding,
+            candidates,
+            distances_i,
+            embeddings_i,
+            n_results=n_results,
+            lambda_mult=mmr_lambda,
+            max_per_document=mmr_max_per_document,
         )
-    )
-    if neighbor_ids:
-        n_res: GetResult = collection.get(ids=list(neighbor_ids), include=["documents", "metadatas"])
+        hits_per_prompt.append(hits)
+        seeds_per_prompt.append(
+            _neighbor_seed_hits(
+                hits,
+                distances=distances_i,
+                neighbor_top_n=neighbor_top_n,
+                neighbor_distance_threshold=neighbor_distance_threshold,
+            )
+        )
+
+    stage_start = _record_timing(timings, "diversify_ms", stage_start)
+
+    neighbor_ids_per_prompt = [_get_neighbor_ids(seeds) for seeds in seeds_per_prompt]
+    all_neighbor_ids = set().union(*neighbor_ids_per_prompt)
+    if all_neighbor_ids:
+        with CHROMA_SECONDS.labels("get").time():
+            n_res: GetResult = collection.get(ids=list(all_neighbor_ids), include=["documents", "metadatas"])
+        n_ids = n_res["ids"]
         n_docs = n_res["documents"]
         n_metas = n_res["metadatas"]
         if n_docs is not None and n_metas is not None:
-            hits += [create_hit(doc, metadata) for doc, metadata in zip(n_docs, n_metas)]
+            neighbors = [
+                (nid, doc, metadata)
+                for nid, doc, metadata in zip(n_ids, n_docs, n_metas)
+            ]
+            for hits, seeds, neighbor_ids in zip(hits_per_prompt, seeds_per_prompt, neighbor_ids_per_prompt):
+                for nid, doc, metadata in neighbors:
+                    if nid not in neighbor_ids:
+                        continue
+                    hit = create_hit(doc, metadata)
+                    hit.neighbor_of = _neighbor_provenance(hit, seeds)
+                    hits.append(hit)
+    _record_timing(timings, "neighbor_fetch_ms", stage_start)
+
+    return hits_per_prompt
+
 
-    return hits
+def _record_timing(timings: Optional[Dict[str, float]], key: str, stage_start: float) -> float:
+    now = time.perf_counter()
+    if timings is not None:
+        timings[key] = timings.get(key, 0.0) + (now - stage_start) * 1000.0
+    return now
+
+
+def _neighbor_provenance(neighbor: Hit, seeds: List[Hit]) -> List[int]:
+    return [
+        seed.chunk_index
+        for seed in seeds
+        if seed.zotero_id == neighbor.zotero_id
+        and seed.filename == neighbor.filename
+        and abs(seed.chunk_index - neighbor.chunk_index) == 1
+    ]
 
 
 def format_sources_by_file(
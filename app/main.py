@@ -3,10 +3,13 @@ import sys
 
 from fastapi import FastAPI
 
+from core.profiling import ProfilingMiddleware
+from core.settings import PROFILING_ENABLED, PROFILING_TOKEN
 from core.startup import startup_event
 from features.annotations.router import router as annotations_router
 from features.health.router import router as health_router
 from features.ingest.router import router as ingest_router
+from features.profiling.router import router as profiling_router
 from features.prompts.router import router as prompts_router
 from features.query.router import router as query_router
 
@@ -17,9 +20,14 @@ logging.basicConfig(
 
 app = FastAPI()
 app.add_event_handler("startup", startup_event)
+if PROFILING_ENABLED:
+    if not PROFILING_TOKEN:
+        logging.warning("PROFILING_ENABLED is set without PROFILING_TOKEN; profiling requests will be refused")
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(health_router)
 app.include_router(query_router)
 app.include_router(prompts_router)
 app.include_router(ingest_router)
 app.include_router(annotations_router)
+app.include_router(profiling_router)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from pdf2image.exceptions import PDFPageCountError
+from pdfminer.psexceptions import PSException
+from pytesseract import TesseractError  # type: ignore[import-untyped]
+
+from features.annotations import router as annotations_router
+from features.annotations.jobs import AnnotationAdmission, AnnotationJobRegistry
+from features.annotations.pdf_store import PdfStore
+from main import app
+
+_CONFIG = json.dumps({"rules": [{"id": "r1", "termsRaw": "method"}]})
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> PdfStore:
+    pdf_store = PdfStore(tmp_path / "pdfs")
+    monkeypatch.setattr(annotations_router, "PDF_STORE", pdf_store)
+    monkeypatch.setattr(annotations_router, "ANNOTATION_JOBS", AnnotationJobRegistry(tmp_path / "jobs"))
+    monkeypatch.setattr(annotations_router, "ANNOTATION_ADMISSION", AnnotationAdmission(max_active=1, max_queued=1))
+    monkeypatch.setattr(annotations_router, "ANNOTATION_TRACE_SAMPLE_RATE", 0.0)
+
+    async def fake_process(pdf_path: str, chunk_matches_callback: Any, **_kwargs: Any) -> list[dict[str, Any]]:
+        # the "PDF" is its own script: "broken" fails, otherwise one match per line
+        content = Path(pdf_path).read_text()
+        if content == "broken":
+            raise ValueError("cannot parse PDF")
+        matches = [{"id": "r1", "page": 0, "rects": [[0.0, 0.0, 1.0, 1.0]], "text": line} for line in content.splitlines()]
+        await chunk_matches_callback(matches)
+        return matches
+
+    monkeypatch.setattr(annotations_router, "process_annotations_llm", fake_process)
+    return pdf_store
+
+
+def _events(text: str) -> list[dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_batch_streams_every_document_and_isolates_failures(store: PdfStore) -> None:
+    client = TestClient(app)
+    good, broken = b"one\ntwo", b"broken"
+
+    response = client.post(
+        "/api/annotations/batch",
+        data={"config": _CONFIG},
+        files=[("files", ("good.pdf", good, "application/pdf")), ("files", ("broken.pdf", broken, "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    events = _events(response.text)
+    assert events[-1]["type"] == "done"
+    done = {e["document"]: e for e in events if e["type"] == "annotationDocumentDone"}
+    assert done[_digest(good)]["matches"] == 2 and done[_digest(good)]["error"] is None
+    assert done[_digest(broken)]["matches"] == 0 and "cannot parse PDF" in done[_digest(broken)]["error"]
+    matches = [e for e in events if e["type"] == "annotationMatches"]
+    assert [(e["document"], len(e["matches"])) for e in matches] == [(_digest(good), 2)]
+    # the job released its leases, so both PDFs may be evicted again
+    assert store._leases == {}
+
+
+@pytest.mark.parametrize(
+    "error",
+    [PSException("bad xref"), KeyError("Pages"), TesseractError(1, "tesseract crashed"), PDFPageCountError("no pages")],
+    ids=lambda e: type(e).__name__,
+)
+def test_batch_survives_pdf_and_ocr_errors_of_one_document(
+    store: PdfStore, monkeypatch: pytest.MonkeyPatch, error: Exception
+) -> None:
+    async def fake_process(pdf_path: str, **_kwargs: Any) -> list[dict[str, Any]]:
+        if Path(pdf_path).read_text() == "broken":
+            raise error
+        return [{"id": "r1", "page": 0, "rects": [], "text": "ok"}]
+
+    monkeypatch.setattr(annotations_router, "process_annotations_llm", fake_process)
+    client = TestClient(app)
+
+    response = client.post(
+        "/api/annotations/batch",
+        data={"config": _CONFIG},
+        files=[("files", ("good.pdf", b"good", "application/pdf")), ("files", ("broken.pdf", b"broken", "application/pdf"))],
+    )
+
+    events = _events(response.text)
+    done = {e["document"]: e for e in events if e["type"] == "annotationDocumentDone"}
+    assert done[_digest(b"good")]["matches"] == 1 and done[_digest(b"good")]["error"] is None
+    assert done[_digest(b"broken")]["error"]
+    # the job itself did not fail
+    assert events[-1]["type"] == "done"
+    assert "error" not in [e["type"] for e in events]
+
+
+def test_batch_uploads_cannot_evict_each_other(
+    store: PdfStore, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # room for one upload only: without leases the second one would evict the first
+    small = PdfStore(tmp_path / "small", max_bytes=150)
+    monkeypatch.setattr(annotations_router, "PDF_STORE", small)
+    client = TestClient(app)
+    first, second = b"a" * 100, b"b" * 100
+
+    response = client.post(
+        "/api/annotations/batch",
+        data={"config": _CONFIG},
+        files=[("files", ("1.pdf", first, "application/pdf")), ("files", ("2.pdf", second, "application/pdf"))],
+    )
+
+    assert response.status_code == 200
+    done = {e["document"]: e for e in _events(response.text) if e["type"] == "annotationDocumentDone"}
+    assert set(done) == {_digest(first), _digest(second)}
+    assert small._leases == {}
+
+
+def test_batch_references_stored_pdfs_and_dedupes_them(store: PdfStore) -> None:
+    client = TestClient(app)
+    content = b"one"
+    digest = _digest(content)
+    client.post(
+        "/api/annotations/batch",
+        data={"config": _CONFIG},
+        files=[("files", ("a.pdf", content, "application/pdf"))],
+    )
+
+    response = client.post("/api/annotations/batch", data={"config": _CONFIG, "sha256": [digest, digest]})
+
+    done = [e for e in _events(response.text) if e["type"] == "annotationDocumentDone"]
+    assert done == [{"type": "annotationDocumentDone", "document": digest, "matches": 1, "error": None}]
+
+    response = client.post("/api/annotations/batch", data={"config": _CONFIG, "sha256": ["0" * 64]})
+    assert response.status_code == 404
+
+
+def test_batch_rejects_more_than_the_document_limit(store: PdfStore, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(annotations_router, "ANNOTATION_BATCH_MAX_DOCUMENTS", 2)
+    client = TestClient(app)
+    files = [("files", (f"{i}.pdf", f"doc {i}".encode(), "application/pdf")) for i in range(3)]
+
+    response = client.post("/api/annotations/batch", data={"config": _CONFIG}, files=files)
+
+    assert response.status_code == 422
+    assert "at most 2 documents" in response.json()["detail"]
+    assert store._leases == {}
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+from core.ollama_scheduler import OllamaScheduler, Priority
+from features.annotations.embedding_gate import EmbeddingGate
+
+_VOCAB = ["test", "coverage", "http", "reference", "offloading"]
+
+
+class _FakeEmbedClient:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    async def embed(self, model: str, input: list[str]) -> Any:
+        self.calls.append(list(input))
+        return SimpleNamespace(embeddings=[[float(w in text.lower()) for w in _VOCAB] for text in input])
+
+
+def _gate(client: _FakeEmbedClient, threshold: float) -> EmbeddingGate:
+    return EmbeddingGate(
+        client=client,  # type: ignore[arg-type]
+        model="embed",
+        rule_texts=["test coverage"],
+        threshold=threshold,
+        batch_size=2,
+        ollama_job=OllamaScheduler(capacity=1).job("test", Priority.BATCH),
+    )
+
+
+def test_select_keeps_sentences_above_threshold() -> None:
+    client = _FakeEmbedClient()
+    gate = _gate(client, threshold=0.4)
+    texts = ["Unit test coverage", "See http links", "Reference list", "Offloading test"]
+
+    async def scenario() -> None:
+        kept = await gate.select(["S1", "S2", "S3", "S4"], texts)
+        assert kept == ["S1", "S4"]
+        assert await gate.select(["S5"], ["Reference list"]) == []
+
+    asyncio.run(scenario())
+
+    # rules once, then two batches for the first chunk and one for the second
+    assert client.calls[0] == ["test coverage"]
+    assert [len(batch) for batch in client.calls[1:]] == [2, 2, 1]
+    assert gate.stats() == {
+        "gate_chunks_total": 2,
+        "gate_chunks_skipped": 1,
+        "gate_sentences_total": 5,
+        "gate_sentences_kept": 2,
+    }
+
+
+def test_documents_of_a_job_share_the_rule_embeddings() -> None:
+    client = _FakeEmbedClient()
+    job_gate = _gate(client, threshold=0.4)
+    first, second = job_gate.for_document(), job_gate.for_document()
+
+    async def scenario() -> None:
+        await asyncio.gather(first.select(["S1"], ["Unit test coverage"]), second.select(["S2"], ["Reference list"]))
+
+    asyncio.run(scenario())
+
+    assert client.calls.count(["test coverage"]) == 1
+    assert first.stats()["gate_sentences_kept"] == 1
+    assert second.stats()["gate_sentences_kept"] == 0
@@ -0,0 +1,24 @@
+import numpy as np
+
+from features.annotations.geometry import merge_line_rects
+
+
+def test_merge_line_rects_gives_one_rounded_rect_per_line() -> None:
+    rects = np.array([
+        # first line, words slightly misaligned vertically
+        [10.0, 700.0, 40.0, 712.0],
+        [44.0, 699.5, 80.123, 712.5],
+        [84.0, 700.0, 120.0, 712.0],
+        # wrapped onto the next line
+        [10.0, 686.0, 30.0, 698.0],
+        [34.0, 686.0, 60.456, 698.0],
+        # same baseline, but back at the left edge (next column block)
+        [5.0, 686.0, 9.0, 698.0],
+    ], dtype=np.float32)
+
+    assert merge_line_rects(rects, precision=1) == [
+        [10.0, 699.5, 120.0, 712.5],
+        [10.0, 686.0, 60.5, 698.0],
+        [5.0, 686.0, 9.0, 698.0],
+    ]
+    assert merge_line_rects(np.empty((0, 4), dtype=np.float32)) == []
@@ -0,0 +1,166 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from features.annotations import jobs
+from features.annotations.jobs import AnnotationAdmission, AnnotationJob, AnnotationJobRegistry, EventStream
+
+
+def _types(lines: list[str]) -> list[str]:
+    return [json.loads(line)["type"] for line in lines]
+
+
+async def _drain(stream: EventStream) -> list[str]:
+    lines = []
+    while (line := await stream.get()) is not None:
+        lines.append(line)
+    return lines
+
+
+async def _lines(stream: EventStream, count: int) -> list[str]:
+    return [line for _ in range(count) if (line := await stream.get()) is not None]
+
+
+def test_reconnect_replays_finished_matches_and_continues(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        registry = AnnotationJobRegistry(tmp_path)
+        release = asyncio.Event()
+
+        async def compute(job: AnnotationJob) -> None:
+            job.publish_result('{"type":"annotationMatches","matches":[{"id":"a"}]}\n')
+            await release.wait()
+            job.publish_result('{"type":"annotationMatches","matches":[{"id":"b"}]}\n')
+
+        job = registry.create()
+        first = job.subscribe()
+        job.start(compute)
+        await asyncio.sleep(0)
+        job.unsubscribe(first)  # the client went away; the job keeps running
+
+        second = job.subscribe()
+        release.set()
+        lines = await _drain(second)
+        assert _types(lines) == ["annotationJob", "annotationMatches", "annotationMatches", "done"]
+        assert job.status == "done"
+
+        # after a restart only the persisted results are left
+        replay = AnnotationJobRegistry(tmp_path).replay_from_disk(job.job_id)
+        assert replay is not None
+        assert _types(replay) == ["annotationJob", "annotationMatches", "annotationMatches", "done"]
+        assert json.loads(replay[0])["status"] == "done"
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_replays_the_latest_progress_of_every_document(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        release = asyncio.Event()
+
+        async def compute(job: AnnotationJob) -> None:
+            job.publish_progress('{"type":"updateProgress","stage":"a1"}\n', kind="progress:a")
+            job.publish_progress('{"type":"updateProgress","stage":"b1"}\n', kind="progress:b")
+            job.publish_progress('{"type":"updateProgress","stage":"a2"}\n', kind="progress:a")
+            await release.wait()
+
+        job = AnnotationJobRegistry(tmp_path).create()
+        job.start(compute)
+        await asyncio.sleep(0)
+
+        replay = await _lines(job.subscribe(), 3)
+        assert [json.loads(line).get("stage") for line in replay] == [None, "a2", "b1"]
+        release.set()
+
+    asyncio.run(scenario())
+
+
+def test_orphaned_job_is_cancelled_after_grace(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(jobs, "ANNOTATION_JOB_ORPHAN_GRACE_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "ANNOTATION_JOB_ORPHAN_POLICY", "cancel")
+
+    async def scenario() -> None:
+        async def compute(job: AnnotationJob) -> None:
+            await asyncio.Event().wait()
+
+        job = AnnotationJobRegistry(tmp_path).create()
+        job.start(compute)
+        job.unsubscribe(job.subscribe())
+        await asyncio.sleep(0.05)
+        assert job.status == "cancelled"
+        assert _types(await _drain(job.subscribe()))[-2:] == ["error", "done"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_job_reports_the_error_and_a_bug_still_ends_the_stream(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        registry = AnnotationJobRegistry(tmp_path)
+
+        async def unreachable(job: AnnotationJob) -> None:
+            raise ConnectionError("Ollama is down")
+
+        async def buggy(job: AnnotationJob) -> None:
+            raise AttributeError("bug")
+
+        failed = registry.create()
+        stream = failed.subscribe()
+        failed.start(unreachable)
+        lines = await _drain(stream)
+        assert failed.status == "error"
+        assert json.loads(lines[-2]) == {"type": "error", "message": "Ollama is down"}
+
+        broken = registry.create()
+        stream = broken.subscribe()
+        broken.start(buggy)
+        assert _types(await _drain(stream))[-2:] == ["error", "done"]
+        assert broken.status == "error" and broken._task is not None
+        with pytest.raises(AttributeError):
+            await broken._task
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_coalesces_progress_and_closes_slow_subscribers() -> None:
+    async def scenario() -> None:
+        stream = EventStream(max_buffered=2)
+        stream.put("p1", coalesce_key="progress")
+        stream.put("m1")
+        stream.put("p2", coalesce_key="progress")
+        stream.put("c1", coalesce_key="concurrency")
+        assert [await stream.get() for _ in range(3)] == ["p2", "m1", "c1"]
+
+        stream.put("m2")
+        stream.put("m3")
+        stream.put("m4")
+        assert stream.overflowed
+        assert await stream.get() is None
+
+    asyncio.run(scenario())
+
+
+def test_admission_queues_jobs_in_order_and_reports_positions(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        registry = AnnotationJobRegistry(tmp_path)
+        admission = AnnotationAdmission(max_active=1, max_queued=2)
+        jobs = [registry.create() for _ in range(3)]
+        assert all(admission.reserve() for _ in jobs)
+        assert not admission.reserve()
+
+        await admission.acquire(jobs[0])
+        waiting = [asyncio.create_task(admission.acquire(job)) for job in jobs[1:]]
+        await asyncio.sleep(0)
+        assert admission.queued == 2
+        streams = [job.subscribe() for job in jobs[1:]]
+        assert [json.loads((await _lines(s, 2))[-1])["position"] for s in streams] == [1, 2]
+
+        waiting[0].cancel()
+        await asyncio.sleep(0)
+        assert json.loads(await streams[1].get() or "")["position"] == 1
+        admission.release()
+        await waiting[1]
+        assert admission.active == 1 and admission.queued == 0
+        assert admission.reserve() and admission.reserve()
+        assert not admission.reserve()
+
+    asyncio.run(scenario())
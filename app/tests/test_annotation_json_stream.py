@@ -0,0 +1,35 @@
+import json
+
+from features.annotations.json_stream import JsonArrayItemStream
+
+
+def test_items_are_emitted_as_soon_as_they_are_complete() -> None:
+    payload = {
+        "note": 'ignore "matches": [{"x": 1}] in strings',
+        "matches": [
+            {"rule_id": "methods", "sentence_ids": ["S1", "S2"]},
+            {"rule_id": "quote \" and } brace", "sentence_ids": []},
+        ],
+        "other": [{"rule_id": "not an item"}],
+    }
+    text = "```json\n" + json.dumps(payload, indent=2) + "\n```"
+    first_item_end = text.index("}", text.index("methods")) + 1
+
+    parser = JsonArrayItemStream("matches")
+    emitted_at: list[int] = []
+    items = []
+    for i, ch in enumerate(text):
+        new = parser.feed(ch)
+        emitted_at.extend([i] * len(new))
+        items.extend(new)
+
+    assert items == payload["matches"]
+    assert emitted_at[0] == first_item_end - 1
+
+
+def test_chunked_feed_skips_invalid_items() -> None:
+    parser = JsonArrayItemStream("matches")
+    assert parser.feed('{"matches": [{"rule_id": "a", "sentence_ids": ["S1"]}, {"rule_id": ') == [
+        {"rule_id": "a", "sentence_ids": ["S1"]}
+    ]
+    assert parser.feed('"b", "sentence_ids": ["S2",]}, {"rule_id": "c"}]}') == [{"rule_id": "c"}]
@@ -0,0 +1,152 @@
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from core.ollama_scheduler import OllamaScheduler, Priority
+from features.annotations.llm_cache import LLMCacheSession, LLMResponseCache, cache_key
+from features.annotations.llm_service import _llm_refine_span_boundaries
+from features.annotations.pdf_text_recognition import WordData
+from features.annotations.token_table import TokenTable
+
+
+def _payload(prompt: str) -> dict[str, object]:
+    return {
+        "model": "llama3.2:latest",
+        "messages": [{"role": "user", "content": prompt}],
+        "format": {"type": "object"},
+        "options": {"temperature": 0.0},
+    }
+
+
+def test_cache_key_depends_on_prompt_and_model() -> None:
+    assert cache_key(_payload("a")) == cache_key(_payload("a"))
+    assert cache_key(_payload("a")) != cache_key(_payload("b"))
+    assert cache_key(_payload("a")) != cache_key({**_payload("a"), "model": "other"})
+
+
+def test_session_modes(tmp_path: Path) -> None:
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+
+    async def scenario() -> None:
+        first = LLMCacheSession(cache, mode="use")
+        assert await first.lookup(_payload("a")) is None
+        await first.store(_payload("a"), '{"matches": []}')
+        assert await first.lookup(_payload("a")) == '{"matches": []}'
+        assert first.stats() == {"cache_hits": 1, "cache_misses": 1}
+
+        bypass = LLMCacheSession(cache, mode="bypass")
+        assert await bypass.lookup(_payload("a")) is None
+        await bypass.store(_payload("a"), "ignored")
+
+        refresh = LLMCacheSession(cache, mode="refresh")
+        assert await refresh.lookup(_payload("a")) is None
+        await refresh.store(_payload("a"), '{"matches": [1]}')
+
+        assert await LLMCacheSession(cache).lookup(_payload("a")) == '{"matches": [1]}'
+
+    asyncio.run(scenario())
+
+
+def test_unwritable_cache_path_disables_cache(tmp_path: Path) -> None:
+    blocker = tmp_path / "file"
+    blocker.write_text("x")
+    cache = LLMResponseCache(blocker / "cache.sqlite3")
+
+    async def scenario() -> None:
+        session = LLMCacheSession(cache)
+        await session.store(_payload("a"), "raw")
+        assert await session.lookup(_payload("a")) is None
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_identical_lookups_wait_for_the_first_response(tmp_path: Path) -> None:
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+
+    async def scenario() -> None:
+        leader, follower, retry = LLMCacheSession(cache), LLMCacheSession(cache), LLMCacheSession(cache)
+        assert await leader.lookup(_payload("a")) is None
+        waiting = asyncio.create_task(follower.lookup(_payload("a")))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        leader.settle(_payload("a"), '{"matches": []}')
+        assert await waiting == '{"matches": []}'
+        assert follower.stats() == {"cache_hits": 1, "cache_misses": 0}
+
+        # a claimant without a response passes the claim on to one waiter
+        assert await leader.lookup(_payload("b")) is None
+        waiting = asyncio.create_task(retry.lookup(_payload("b")))
+        await asyncio.sleep(0.05)
+        leader.settle(_payload("b"), None)
+        assert await waiting is None
+        assert retry.stats() == {"cache_hits": 0, "cache_misses": 1}
+        retry.settle(_payload("b"), "raw")
+
+    asyncio.run(scenario())
+
+
+def test_waiters_never_get_a_response_that_failed_validation(tmp_path: Path) -> None:
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    words: list[WordData] = [{"text": w, "rect": (0.0, 0.0, 1.0, 1.0)} for w in ["a", "method", "here"]]
+    tokens = TokenTable.from_pages([(0, words)]).view(0, 3)
+    rule = SimpleNamespace(id="r1", termsRaw="method")
+    responses = ['{"spans": "not a list"}', '{"spans": [{"start_token": 1, "end_token": 1}]}']
+
+    class _FakeChatClient:
+        def __init__(self) -> None:
+            self.calls = 0
+
+        async def chat(self, **_kwargs: Any) -> Any:
+            self.calls += 1
+            await asyncio.sleep(0.05)  # long enough for the follower to wait on this request
+            return {"message": {"content": responses.pop(0)}}
+
+    async def scenario() -> None:
+        client = _FakeChatClient()
+        ollama_job = OllamaScheduler(capacity=2).job("test", Priority.BATCH)
+
+        def refine() -> Any:
+            return _llm_refine_span_boundaries(
+                rule, tokens, "llama3.2:latest", client, ollama_job, 0,  # type: ignore[arg-type]
+                llm_cache=LLMCacheSession(cache),
+            )
+
+        leader = asyncio.create_task(refine())
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(refine())
+        with pytest.raises(ValidationError):
+            await leader
+        spans = await follower
+        assert spans is not None and [(s.start_token, s.end_token) for s in spans] == [(1, 1)]
+        assert client.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_hits_refresh_last_used_only_after_the_touch_interval(tmp_path: Path) -> None:
+    cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+    key = cache_key(_payload("a"))
+
+    def last_used() -> float:
+        conn = cache._connection()
+        assert conn is not None
+        return float(conn.execute("SELECT last_used FROM responses WHERE key = ?", (key,)).fetchone()[0])
+
+    async def scenario() -> None:
+        await cache.put(key, "llama3.2:latest", "raw")
+        stored = last_used()
+        assert await cache.get(key) == "raw"
+        assert last_used() == stored
+
+        conn = cache._connection()
+        assert conn is not None
+        conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (stored - 2 * 3600.0, key))
+        conn.commit()
+        assert await cache.get(key) == "raw"
+        assert last_used() >= stored
+
+    asyncio.run(scenario())
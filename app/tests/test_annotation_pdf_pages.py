@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from features.annotations import pdf_text_recognition
+from features.annotations.pdf_text_recognition import PageData, TextPlaceRecognitionPDF
+
+PDF_FILE = Path(__file__).parent / "test_data_file_extractor" / "egg_fried_rice.pdf"
+
+
+def _collect(recognizer: TextPlaceRecognitionPDF, page_range: tuple[int, int] | None) -> list[PageData]:
+    async def scenario() -> list[PageData]:
+        return [page async for page in recognizer.iter_pages(page_range)]
+
+    return asyncio.run(scenario())
+
+
+def test_iter_pages_matches_full_extraction_and_respects_range(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pdf_text_recognition, "ANNOTATION_EXTRACT_WORKERS", 0)
+    recognizer = TextPlaceRecognitionPDF(str(PDF_FILE))
+
+    assert _collect(recognizer, None) == recognizer.extract_text()
+    assert [p["page"] for p in _collect(recognizer, (0, 3))] == [0]
+    assert _collect(recognizer, (2, 3)) == []
+
+
+def test_ocr_page_converts_word_boxes_and_caches_by_page_content(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from PIL import Image
+
+    calls: list[int] = []
+
+    def fake_image_to_data(image: Image.Image, output_type: str) -> dict[str, list[object]]:
+        calls.append(1)
+        return {
+            "text": ["", "Fried", "rice"],
+            "left": [0, 20, 100],
+            "top": [0, 10, 10],
+            "width": [200, 60, 40],
+            "height": [100, 20, 20],
+            "conf": [-1, 91.0, 88.5],
+        }
+
+    monkeypatch.setattr(pdf_text_recognition, "OCR_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(pdf_text_recognition, "ANNOTATION_OCR_DPI", 144)
+    monkeypatch.setattr(
+        pdf_text_recognition, "convert_from_path", lambda *args, **kwargs: [Image.new("L", (200, 100), 255)]
+    )
+    monkeypatch.setattr(pdf_text_recognition.pytesseract, "image_to_data", fake_image_to_data)
+
+    page = pdf_text_recognition._ocr_page("scan.pdf", 3)
+
+    # 144 dpi renders two pixels per PDF point; PDF y grows upwards from the bottom edge
+    assert page == {
+        "page": 3,
+        "page_height": 50.0,
+        "words": [
+            {"text": "Fried", "rect": (10.0, 35.0, 40.0, 45.0)},
+            {"text": "rice", "rect": (50.0, 35.0, 70.0, 45.0)},
+        ],
+    }
+    assert pdf_text_recognition._ocr_page("other.pdf", 3) == page
+    assert len(calls) == 1
+
+
+def test_unparseable_batch_is_ocred_in_the_extraction_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    from pdfminer.psexceptions import PSException
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="extract-pool")
+    monkeypatch.setattr(pdf_text_recognition, "_extract_pool", lambda: pool)
+    monkeypatch.setattr(pdf_text_recognition, "ANNOTATION_EXTRACT_BATCH_PAGES", 1)
+    monkeypatch.setattr(pdf_text_recognition, "_page_count", lambda _path: 3)
+    ocr_threads: list[str] = []
+
+    def extract_pages(_path: str, indices: list[int]) -> list[PageData]:
+        if indices == [0]:
+            raise PSException("broken page")
+        return [{"page": i, "page_height": 1.0, "words": []} for i in indices]
+
+    def ocr_pages(_path: str, indices: list[int]) -> list[PageData]:
+        ocr_threads.append(threading.current_thread().name)
+        return [{"page": i, "page_height": 2.0, "words": []} for i in indices]
+
+    monkeypatch.setattr(pdf_text_recognition, "_extract_pages", extract_pages)
+    monkeypatch.setattr(pdf_text_recognition, "_ocr_pages", ocr_pages)
+
+    try:
+        pages = _collect(TextPlaceRecognitionPDF(str(PDF_FILE)), None)
+    finally:
+        pool.shutdown()
+
+    assert [(p["page"], p["page_height"]) for p in pages] == [(0, 2.0), (1, 1.0), (2, 1.0)]
+    assert len(ocr_threads) == 1 and ocr_threads[0].startswith("extract-pool")
@@ -0,0 +1,62 @@
+import hashlib
+import io
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from features.annotations import pdf_store
+from features.annotations.pdf_store import PdfStore
+
+
+def test_store_is_content_addressed_and_evicts_least_recently_used(tmp_path: Path) -> None:
+    store = PdfStore(tmp_path, max_bytes=250)
+    first = store._put_stream(io.BytesIO(b"a" * 100))
+    second = store._put_stream(io.BytesIO(b"b" * 100))
+    assert first == hashlib.sha256(b"a" * 100).hexdigest()
+    assert store._put_stream(io.BytesIO(b"a" * 100)) == first
+
+    os.utime(tmp_path / f"{first}.pdf", (1, 1))
+    os.utime(tmp_path / f"{second}.pdf", (2, 2))
+    leased = store.acquire(first)  # touches and pins the oldest entry
+    assert leased == tmp_path / f"{first}.pdf"
+    os.utime(leased, (1, 1))
+
+    third = store._put_stream(io.BytesIO(b"c" * 100))
+    assert store.contains(first) and store.contains(third)
+    assert not store.contains(second)
+
+    store.release(first)
+    store._put_stream(io.BytesIO(b"d" * 100))
+    assert not store.contains(first)
+
+
+def test_store_imports_webdav_attachment_by_zotero_key(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    webdav = tmp_path / "webdav"
+    webdav.mkdir()
+    with zipfile.ZipFile(webdav / "ABCD1234.zip", "w") as zipf:
+        zipf.writestr("paper.pdf", b"%PDF-1.7 fake")
+    monkeypatch.setattr(pdf_store, "WEBDAV_DATA_DIR", webdav)
+    store = PdfStore(tmp_path / "store")
+
+    digest = hashlib.sha256(b"%PDF-1.7 fake").hexdigest()
+    other = "0" * 64
+
+    # an outdated WebDAV copy is hashed but not stored
+    assert store.put_from_zotero_key("ABCD1234", other) == digest
+    assert not store.contains(digest)
+    assert list(store.root.iterdir()) == []
+
+    # the unchanged archive is not read again
+    def unreadable(*_args: object) -> None:
+        raise AssertionError("zip reread")
+
+    with monkeypatch.context() as m:
+        m.setattr(pdf_store.zipfile, "ZipFile", unreadable)
+        assert store.put_from_zotero_key("ABCD1234", other) == digest
+
+    assert store.put_from_zotero_key("ABCD1234", digest) == digest
+    assert store.contains(digest)
+    assert store.put_from_zotero_key("MISSING1", digest) is None
+    assert store.put_from_zotero_key("../etc", digest) is None
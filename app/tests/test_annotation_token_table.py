@@ -0,0 +1,92 @@
+from features.annotations.llm_service import ChunkBuilder, _create_chunks, _create_sentences, _span_matches
+from features.annotations.pdf_text_recognition import WordData
+from features.annotations.token_table import TokenTable
+
+
+def _words(text: str, y: float = 100.0) -> list[WordData]:
+    return [
+        {"text": w, "rect": (10.0 * i, y, 10.0 * i + 8.0, y + 10.0)}
+        for i, w in enumerate(text.split())
+    ]
+
+
+def test_span_text_joins_tokens_across_pages() -> None:
+    table = TokenTable.from_pages([(0, _words("Winter is coming.")), (1, _words("Hold the door."))])
+
+    assert len(table) == 6
+    assert table.token_text(3) == "Hold"
+    assert table.span_text(1, 5) == "is coming. Hold the"
+    assert table.view(0, 6)[2:4].text == "coming. Hold"
+
+
+def test_table_grows_beyond_initial_capacity() -> None:
+    table = TokenTable(capacity=2)
+    table.append_page(0, _words("one two three"))
+    table.append_page(1, [{"text": "four", "rect": None}, {"text": "five.", "rect": None}])
+
+    assert table.span_text(0, len(table)) == "one two three four five."
+    assert table.has_rect.tolist() == [True, True, True, False, False]
+    assert table.pages.tolist() == [0, 0, 0, 1, 1]
+    assert table.ends_sentence.tolist() == [False, False, False, False, True]
+
+
+def test_create_sentences_splits_on_punctuation_and_max_length() -> None:
+    table = TokenTable.from_pages([(0, _words("You know nothing. a b c d e f g Valar morghulis!"))])
+
+    sentences = _create_sentences(table.view(0, len(table)), max_tokens_per_sentence=4)
+
+    assert [(s.sid, s.token_start, s.token_end) for s in sentences] == [
+        ("S1", 0, 2),
+        ("S2", 3, 6),
+        ("S3", 7, 10),
+        ("S4", 11, 11),
+    ]
+
+
+def test_create_chunks_pack_whole_sentences_once() -> None:
+    table = TokenTable.from_pages([(0, _words("a b c. d e f g h i j k. l m."))])
+
+    chunks = _create_chunks(table, chunk_size=5, context_tokens=2)
+
+    assert [[s.sid for s in c.sentences] for c in chunks] == [["S1"], ["S2"], ["S3", "S4"]]
+    assert [c.text for c in chunks] == ["a b c.", "d e f g h", "i j k. l m."]
+    # S2 was cut at the length limit, so the text around that boundary is shown as context
+    assert chunks[0].context_after is None
+    assert chunks[1].context_before is None
+    assert chunks[1].context_after is not None and chunks[1].context_after.text == "i j"
+    assert chunks[2].context_before is not None and chunks[2].context_before.text == "g h"
+    assert chunks[2].context_after is None
+    assert chunks[2].sentence_text(chunks[2].sentences[1]) == "l m."
+    assert all(c.tokens.table is table for c in chunks)
+
+
+def test_span_matches_groups_rects_per_page() -> None:
+    table = TokenTable.from_pages([
+        (2, _words("alpha beta")),
+        (3, [{"text": "gamma", "rect": None}]),
+        (4, _words("delta epsilon")),
+    ])
+
+    matches = _span_matches(table, "rule", 1, 4)
+
+    assert [(m["page"], m["text"], len(m["rects"])) for m in matches] == [(2, "beta", 1), (4, "delta", 1)]
+    assert matches[0]["rects"] == [[10.0, 100.0, 18.0, 110.0]]
+
+
+def test_chunk_builder_emits_the_same_chunks_while_pages_arrive() -> None:
+    pages = [_words("a b c. d e f"), _words("g h i j k."), _words("l m. n o p q r s t")]
+    full = TokenTable.from_pages(list(enumerate(pages)))
+    expected = _create_chunks(full, chunk_size=5, context_tokens=2)
+
+    table = TokenTable()
+    builder = ChunkBuilder(table, chunk_size=5, context_tokens=2)
+    chunks = []
+    for page, words in enumerate(pages):
+        table.append_page(page, words)
+        chunks.extend(builder.advance())
+    chunks.extend(builder.advance(final=True))
+
+    assert [(c.text, [s.sid for s in c.sentences]) for c in chunks] == [
+        (c.text, [s.sid for s in c.sentences]) for c in expected
+    ]
+    assert [c.context_after is not None for c in chunks] == [c.context_after is not None for c in expected]
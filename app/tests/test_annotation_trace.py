@@ -0,0 +1,28 @@
+import random
+from pathlib import Path
+
+from features.annotations.trace import TraceRecorder
+
+
+def test_trace_keeps_a_bounded_sample_and_spills_the_rest(tmp_path: Path) -> None:
+    recorder = TraceRecorder(sample_rate=0.5, max_events=3, spill_path=tmp_path / "job.trace.ndjson", rng=random.Random(7))
+    for i in range(40):
+        if recorder.sample():
+            recorder.record({"call": i})
+
+    assert recorder.calls == 40
+    assert 0 < recorder.recorded < 40
+    assert [e["call"] for e in recorder.events()] == [e["call"] for e in recorder.events(include_spilled=True)[-3:]]
+    assert len(recorder.events()) == 3
+    assert recorder.spilled == recorder.recorded - 3
+    assert len(recorder.events(include_spilled=True)) == recorder.recorded
+
+
+def test_trace_without_spill_drops_oldest_events() -> None:
+    recorder = TraceRecorder(sample_rate=1.0, max_events=2)
+    for i in range(5):
+        assert recorder.sample()
+        recorder.record({"call": i})
+
+    assert [e["call"] for e in recorder.events()] == [3, 4]
+    assert recorder.stats() == {"sampleRate": 1.0, "calls": 5, "recorded": 5, "spilled": 0, "dropped": 3}
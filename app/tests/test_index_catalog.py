@@ -0,0 +1,88 @@
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from features.ingest import router as ingest_router
+from features.ingest.catalog import CatalogEntry, IndexCatalog
+from main import app
+
+
+def _entry(zotero_id: str, filename: str, chunk_ids: list[str]) -> CatalogEntry:
+    return CatalogEntry(
+        zotero_id=zotero_id,
+        filename=filename,
+        content_sha256="0" * 64,
+        chunk_ids=chunk_ids,
+        chunk_count=len(chunk_ids),
+        page_count=3,
+        model="nomic-embed-text",
+        indexed_at=1.0,
+        duration_ms=2.0,
+    )
+
+
+def test_replace_and_lookup(tmp_path: Path) -> None:
+    catalog = IndexCatalog(tmp_path / "catalog.sqlite3")
+    catalog.replace("AAAA1111", [_entry("AAAA1111", "a.pdf", ["x_0", "x_1"]), _entry("AAAA1111", "b.pdf", ["y_0"])])
+    catalog.replace("BBBB2222", [_entry("BBBB2222", "c.pdf", ["z_0"])])
+    catalog.replace("AAAA1111", [_entry("AAAA1111", "a.pdf", ["x_0"])])
+
+    assert [e.filename for e in catalog.get("AAAA1111")] == ["a.pdf"]
+    assert catalog.get("AAAA1111")[0].chunk_ids == []
+    assert catalog.get("AAAA1111", include_chunk_ids=True)[0].chunk_ids == ["x_0"]
+    assert set(catalog.get_many()) == {"AAAA1111", "BBBB2222"}
+    assert set(catalog.get_many(["BBBB2222", "CCCC3333"])) == {"BBBB2222"}
+    assert catalog.count() == 2
+
+
+class _FakeCollection:
+    def __init__(self) -> None:
+        self.deleted: list[dict[str, Any]] = []
+        self.added: list[str] = []
+
+    def delete(self, **kwargs: Any) -> None:
+        self.deleted.append(kwargs)
+
+    def upsert(self, ids: list[str], **_kwargs: Any) -> None:
+        self.added.extend(ids)
+
+
+class _FakeOllama:
+    async def embed(self, model: str, input: list[str]) -> SimpleNamespace:
+        return SimpleNamespace(embeddings=[[0.0, 1.0] for _ in input])
+
+
+def test_reingest_deletes_every_chunk_of_the_attachment(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    collection = _FakeCollection()
+    monkeypatch.setattr(ingest_router, "INDEX_CATALOG", IndexCatalog(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(ingest_router, "get_or_create_chroma_collection", lambda: collection)
+    monkeypatch.setattr(ingest_router, "create_ollama_client", lambda: _FakeOllama())
+    client = TestClient(app)
+
+    def upload() -> None:
+        response = client.post(
+            "/internal/file-changed",
+            data={"filename": "ABCD1234.txt", "event_type": "modified"},
+            files={"file": ("ABCD1234.txt", b"Some text worth indexing.", "text/plain")},
+        )
+        assert response.status_code == 200
+
+    upload()
+    assert collection.deleted == [{"where": {"zotero_id": "ABCD1234"}}]
+    first_ids = list(collection.added)
+    assert first_ids
+
+    # even with the IDs in the catalog, chunks are deleted by attachment: a run that
+    # added chunks but failed to record them leaves no orphans behind
+    upload()
+    assert collection.deleted[1] == {"where": {"zotero_id": "ABCD1234"}}
+
+    status = client.get("/api/index/documents/ABCD1234").json()
+    assert status["indexed"] is True
+    assert status["chunkCount"] == len(first_ids)
+
+    batch = client.post("/api/index/status", json={"zoteroIds": ["ABCD1234", "MISSING0"]}).json()
+    assert [(d["zoteroId"], d["indexed"]) for d in batch["documents"]] == [("ABCD1234", True), ("MISSING0", False)]
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from core.ollama_scheduler import OllamaScheduler, Priority, SchedulerJob
+
+
+async def _hold(job: SchedulerJob, label: str, order: list[str], release: asyncio.Event) -> None:
+    async with job.slot():
+        order.append(label)
+        await release.wait()
+
+
+def test_interactive_jobs_are_served_before_batch_jobs() -> None:
+    async def scenario() -> None:
+        scheduler = OllamaScheduler(capacity=1)
+        order: list[str] = []
+        release = asyncio.Event()
+        batch = scheduler.job("annotations", Priority.BATCH)
+        first = asyncio.create_task(_hold(batch, "batch-1", order, release))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(_hold(batch, "batch-2", order, release))]
+        waiting.append(asyncio.create_task(_hold(scheduler.job("query", Priority.INTERACTIVE), "query", order, release)))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued_batch"] == 1
+        assert scheduler.stats()["queued_interactive"] == 1
+
+        release.set()
+        await asyncio.gather(first, *waiting)
+        assert order == ["batch-1", "query", "batch-2"]
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_batch_jobs_are_served_round_robin() -> None:
+    async def scenario() -> None:
+        scheduler = OllamaScheduler(capacity=1)
+        order: list[str] = []
+        a = scheduler.job("a", Priority.BATCH)
+        b = scheduler.job("b", Priority.BATCH)
+
+        async def call(job: SchedulerJob, label: str) -> None:
+            async with job.slot():
+                order.append(label)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(call(a, f"a{i}") for i in range(3)), *(call(b, f"b{i}") for i in range(3)))
+        assert order == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+    asyncio.run(scenario())
+
+
+def test_one_shot_calls_share_a_turn_with_long_lived_jobs() -> None:
+    async def scenario() -> None:
+        scheduler = OllamaScheduler(capacity=1)
+        order: list[str] = []
+        annotations = scheduler.job("annotations", Priority.BATCH)
+
+        async def job_call(label: str) -> None:
+            async with annotations.slot():
+                order.append(label)
+                await asyncio.sleep(0)
+
+        async def one_shot(label: str) -> None:
+            async with scheduler.slot("ingest", Priority.BATCH):
+                order.append(label)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(job_call(f"a{i}") for i in range(3)), *(one_shot(f"i{i}") for i in range(3)))
+        # a burst of ingest calls is one round-robin participant, not three fresh jobs
+        assert order == ["a0", "a1", "i0", "a2", "i1", "i2"]
+
+    asyncio.run(scenario())
+
+
+def test_reserve_and_per_job_limit() -> None:
+    async def scenario() -> None:
+        scheduler = OllamaScheduler(capacity=3, interactive_reserve=1)
+        release = asyncio.Event()
+        order: list[str] = []
+        job = scheduler.job("annotations", Priority.BATCH, max_parallel=1)
+        other = scheduler.job("ingest", Priority.BATCH)
+        tasks = [asyncio.create_task(_hold(job, f"job{i}", order, release)) for i in range(2)]
+        tasks += [asyncio.create_task(_hold(other, f"other{i}", order, release)) for i in range(2)]
+        await asyncio.sleep(0)
+        # one slot is held back for interactive calls, and `job` may only use one
+        assert order == ["job0", "other0"]
+
+        tasks.append(asyncio.create_task(_hold(scheduler.job("query", Priority.INTERACTIVE), "query", order, release)))
+        await asyncio.sleep(0)
+        assert order[-1] == "query"
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_a_slot() -> None:
+    async def scenario() -> None:
+        scheduler = OllamaScheduler(capacity=1)
+        release = asyncio.Event()
+        order: list[str] = []
+        job = scheduler.job("annotations", Priority.BATCH)
+        holder = asyncio.create_task(_hold(job, "holder", order, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(job, "cancelled", order, release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.queue_depth() == 0
+
+        release.set()
+        await holder
+        async with scheduler.slot("query", Priority.INTERACTIVE):
+            assert scheduler.active == 1
+        assert scheduler.active == 0
+        assert order == ["holder"]
+
+    asyncio.run(scenario())
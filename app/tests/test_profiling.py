@@ -0,0 +1,78 @@
+import marshal
+import time
+from collections.abc import AsyncIterator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from core import profiling
+from core.profiling import PROFILER, ProfilingMiddleware, StackSampler
+from features.profiling import router as profiling_router
+
+
+def _busy_loop(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_collapses_stacks_per_thread() -> None:
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    _busy_loop(0.1)
+    lines = sampler.stop().decode().splitlines()
+
+    assert sampler.samples > 0
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert stack.startswith("MainThread;")
+    assert any("_busy_loop (tests/test_profiling.py:" in line for line in lines)
+
+
+def test_header_profiles_a_streamed_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling_router, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(profiling_router.router)
+
+    @app.get("/work")
+    async def work() -> StreamingResponse:
+        async def gen() -> AsyncIterator[str]:
+            for _ in range(3):
+                _busy_loop(0.01)
+                yield "x\n"
+
+        return StreamingResponse(gen())
+
+    client = TestClient(app)
+    plain = client.get("/work")
+    assert "x-profile-id" not in plain.headers
+
+    wrong_token = client.get("/work", headers={"X-Profile": "cprofile", "X-Profile-Token": "guess"})
+    assert "x-profile-id" not in wrong_token.headers
+
+    auth = {"X-Profile-Token": "secret"}
+    response = client.get("/work", headers={"X-Profile": "cprofile", **auth})
+    assert response.text == "x\nx\nx\n"
+    profile_url = f"/internal/profile/{response.headers['x-profile-id']}"
+    assert client.get(profile_url).status_code == 403
+    profile = client.get(profile_url, headers=auth)
+    assert profile.status_code == 200
+    stats = marshal.loads(profile.content)
+    assert any(func == "_busy_loop" for (_file, _line, func) in stats)
+    assert PROFILER.result("unknown") is None
+
+
+def test_profiling_refuses_everyone_without_a_configured_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling_router, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "")
+    app = FastAPI()
+    app.include_router(profiling_router.router)
+
+    response = TestClient(app).get("/internal/profile?seconds=1", headers={"X-Profile-Token": ""})
+    assert response.status_code == 403
@@ -0,0 +1,37 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from features.prompts import store
+
+
+@pytest.fixture
+def prompts_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(store, "PROMPTS_DIR", tmp_path)
+    monkeypatch.setattr(store, "_compiled", {})
+    monkeypatch.setattr(store, "_store_ready", False)
+    return tmp_path
+
+
+def test_render_uses_compiled_template_until_file_changes(prompts_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store.update_prompt_content("annotation_boundary_user", "{{rule_id}}: {{plain_text}} / {{rule_id}}")
+    values = {"rule_id": "r1", "rule_terms": "t", "plain_text": "{{rule_id}}", "token_lines": ""}
+    first = store.get_prompt("annotation_boundary_user")
+    assert store.render_prompt("annotation_boundary_user", values) == "r1: {{rule_id}} / r1"
+
+    # Within the check interval the file is not touched at all.
+    path = prompts_dir / "annotation_boundary_user.txt"
+    path.write_text("changed {{rule_id}}", encoding="utf-8")
+    os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+    assert store.get_prompt("annotation_boundary_user") is first
+
+    monkeypatch.setattr(store, "_RELOAD_CHECK_SECONDS", 0.0)
+    reloaded = store.get_prompt("annotation_boundary_user")
+    assert reloaded.version != first.version
+    assert store.render_prompt("annotation_boundary_user", values) == "changed r1"
+
+
+def test_missing_placeholder_is_rejected(prompts_dir: Path) -> None:
+    with pytest.raises(store.MissingPlaceholderError):
+        store.render_prompt("annotation_coarse_user", {"rule_descriptions": "x"})
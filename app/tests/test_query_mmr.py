@@ -0,0 +1,39 @@
+import numpy as np
+
+from features.query.mmr import mmr_select
+
+
+def test_mmr_select_returns_most_relevant_first() -> None:
+    query = [1.0, 0.0]
+    candidates = [[0.0, 1.0], [1.0, 0.0], [0.7, 0.7]]
+
+    assert mmr_select(query, candidates, k=1) == [1]
+
+
+def test_mmr_select_skips_near_duplicates() -> None:
+    query = [1.0, 1.0, 0.0]
+    candidates = [
+        [1.0, 0.0, 0.0],
+        [1.0, 0.01, 0.0],
+        [0.0, 1.0, 0.0],
+    ]
+
+    selected = mmr_select(query, candidates, k=2, lambda_mult=0.5)
+
+    assert selected == [1, 2]
+
+
+def test_mmr_select_respects_per_group_cap() -> None:
+    query = [1.0, 0.0]
+    candidates = [[1.0, 0.0], [0.99, 0.1], [0.98, 0.2], [0.5, 0.5]]
+    groups = ["paper-a", "paper-a", "paper-a", "paper-b"]
+
+    selected = mmr_select(query, candidates, k=4, lambda_mult=1.0, group_keys=groups, max_per_group=2)
+
+    assert selected == [0, 1, 3]
+
+
+def test_mmr_select_handles_empty_and_small_inputs() -> None:
+    assert mmr_select([1.0, 0.0], np.zeros((0, 2)), k=3) == []
+    assert mmr_select([1.0, 0.0], [[1.0, 0.0]], k=0) == []
+    assert mmr_select([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]], k=5) == [0, 1]
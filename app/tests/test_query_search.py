@@ -0,0 +1,141 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from features.query import router as query_router
+from features.query import service as query_service
+from main import app
+
+# two documents of four chunks; chunk i of each points along axis i
+_CHUNKS = [
+    (f"{zotero_id}_{zotero_id}.pdf_{i}", f"{zotero_id} chunk {i}", zotero_id, i)
+    for zotero_id in ("AAAA1111", "BBBB2222")
+    for i in range(4)
+]
+
+
+def _vector(axis: int) -> list[float]:
+    return [1.0 if k == axis else 0.0 for k in range(4)]
+
+
+def _metadata(zotero_id: str, chunk_index: int) -> dict[str, Any]:
+    return {"filename": f"{zotero_id}.pdf", "zotero_id": zotero_id, "chunk_index": chunk_index, "page_start": 1}
+
+
+class _FakeCollection:
+    def __init__(self) -> None:
+        self.queries: list[dict[str, Any]] = []
+        self.gets: list[list[str]] = []
+
+    def query(self, query_embeddings: list[list[float]], n_results: int, include: list[str]) -> dict[str, Any]:
+        self.queries.append({"count": len(query_embeddings), "n_results": n_results})
+        out: dict[str, list[Any]] = {"documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for query in query_embeddings:
+            ranked = sorted(_CHUNKS, key=lambda c: -sum(q * v for q, v in zip(query, _vector(c[3]))))[:n_results]
+            out["documents"].append([doc for _id, doc, _z, _i in ranked])
+            out["metadatas"].append([_metadata(z, i) for _id, _doc, z, i in ranked])
+            out["distances"].append([1.0 - sum(q * v for q, v in zip(query, _vector(i))) for *_rest, i in ranked])
+            out["embeddings"].append([_vector(i) for *_rest, i in ranked])
+        return out
+
+    def get(self, ids: list[str], include: list[str]) -> dict[str, Any]:
+        self.gets.append(sorted(ids))
+        found = [c for c in _CHUNKS if c[0] in ids]
+        return {
+            "ids": [c[0] for c in found],
+            "documents": [c[1] for c in found],
+            "metadatas": [_metadata(c[2], c[3]) for c in found],
+        }
+
+
+class _FakeOllama:
+    def __init__(self) -> None:
+        self.embed_calls: list[list[str]] = []
+
+    async def embed(self, model: str, input: list[str]) -> SimpleNamespace:
+        self.embed_calls.append(list(input))
+        # the prompt "axis N" embeds along axis N
+        return SimpleNamespace(embeddings=[_vector(int(text.split()[-1])) for text in input])
+
+
+@pytest.fixture
+def fakes(monkeypatch: pytest.MonkeyPatch) -> tuple[_FakeCollection, _FakeOllama]:
+    collection = _FakeCollection()
+    ollama = _FakeOllama()
+    monkeypatch.setattr(query_service, "get_or_create_chroma_collection", lambda: collection)
+    monkeypatch.setattr(query_service, "create_ollama_client", lambda: ollama)
+    return collection, ollama
+
+
+def test_search_applies_overrides_and_reports_timings(fakes: tuple[_FakeCollection, _FakeOllama]) -> None:
+    collection, _ollama = fakes
+    client = TestClient(app)
+
+    response = client.post(
+        "/api/search",
+        json={"prompt": "axis 1", "n_results": 2, "mmr_candidates": 3, "neighbor_top_n": 0},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert collection.queries == [{"count": 1, "n_results": 3}]
+    assert collection.gets == []
+    assert len(body["hits"]) == 2
+    assert {hit["chunk_index"] for hit in body["hits"]} == {1}
+    assert body["context_chars"] > 0
+    timings = body["timings"]
+    assert set(timings) == {"embed_ms", "vector_query_ms", "diversify_ms", "neighbor_fetch_ms", "format_ms", "total_ms"}
+    assert timings["total_ms"] >= timings["format_ms"] >= 0.0
+
+
+def test_search_treats_null_overrides_as_defaults(fakes: tuple[_FakeCollection, _FakeOllama]) -> None:
+    collection, _ollama = fakes
+    client = TestClient(app)
+
+    for field in ("n_results", "neighbor_top_n", "mmr_candidates", "mmr_lambda", "mmr_max_per_document"):
+        response = client.post("/api/search", json={"prompt": "axis 0", field: None})
+        assert response.status_code == 200, field
+    assert {q["n_results"] for q in collection.queries} == {max(query_service.QUERY_N_RESULTS, query_service.QUERY_MMR_CANDIDATES)}
+
+    response = client.post("/api/search", json={"prompt": "axis 0", "neighbor_distance_threshold": None})
+    assert response.status_code == 200
+
+
+def test_batch_embeds_and_queries_once_and_merges_neighbor_fetch(fakes: tuple[_FakeCollection, _FakeOllama]) -> None:
+    collection, ollama = fakes
+
+    hits_per_prompt = asyncio.run(
+        query_service.get_query_hits_batch(
+            ["axis 1", "axis 2"], n_results=1, mmr_candidates=1, neighbor_top_n=1, neighbor_distance_threshold=None
+        )
+    )
+
+    assert ollama.embed_calls == [["axis 1", "axis 2"]]
+    assert collection.queries == [{"count": 2, "n_results": 1}]
+    assert collection.gets == [sorted(f"AAAA1111_AAAA1111.pdf_{i}" for i in range(4))]
+    provenance = [[(hit.chunk_index, hit.neighbor_of) for hit in hits] for hits in hits_per_prompt]
+    assert provenance == [
+        [(1, None), (0, [1]), (2, [1])],
+        [(2, None), (1, [2]), (3, [2])],
+    ]
+
+
+def test_search_batch_streams_in_sub_batches(
+    fakes: tuple[_FakeCollection, _FakeOllama], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _collection, ollama = fakes
+    monkeypatch.setattr(query_router, "QUERY_BATCH_SIZE", 2)
+    client = TestClient(app)
+    prompts = [f"axis {i % 4}" for i in range(5)]
+
+    response = client.post("/api/search/batch", json={"prompts": prompts})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [len(call) for call in ollama.embed_calls] == [2, 2, 1]
+    assert [(e["index"], e["prompt"]) for e in events[:-1]] == list(enumerate(prompts))
+    assert all(e["type"] == "searchResult" and e["hits"] for e in events[:-1])
+    assert events[-1]["type"] == "done"
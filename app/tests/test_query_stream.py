@@ -0,0 +1,64 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from core.ollama_scheduler import OllamaScheduler
+from features.query import router as query_router
+from features.query.schemas import QueryIn
+
+
+class _FakeOllama:
+    async def chat(self, **_kwargs: Any) -> AsyncIterator[dict[str, Any]]:
+        async def parts() -> AsyncIterator[dict[str, Any]]:
+            for token in ("one ", "two ", "three"):
+                yield {"message": {"content": token}, "done": False}
+            yield {"message": {"content": ""}, "done": True}
+
+        return parts()
+
+
+async def _no_hits(_prompt: str) -> list[Any]:
+    return []
+
+
+def test_slot_is_released_before_a_slow_client_reads_the_answer(monkeypatch: pytest.MonkeyPatch) -> None:
+    scheduler = OllamaScheduler(capacity=1)
+    monkeypatch.setattr(query_router, "OLLAMA_SCHEDULER", scheduler)
+    monkeypatch.setattr(query_router, "get_query_hits", _no_hits)
+    monkeypatch.setattr(query_router, "create_ollama_client", lambda: _FakeOllama())
+    monkeypatch.setattr(query_router, "get_prompt_content", lambda _key: "system")
+
+    async def scenario() -> list[dict[str, Any]]:
+        stream = query_router._answer(QueryIn(prompt="question"))
+        events = []
+        async for line in stream:
+            events.append(json.loads(line))
+            if events[-1]["type"] == "token":
+                break
+        # the client stalls after the first token; generation finishes meanwhile
+        await asyncio.sleep(0.01)
+        assert scheduler.active == 0
+        events.extend([json.loads(line) async for line in stream])
+        return events
+
+    events = asyncio.run(scenario())
+    assert "".join(e["token"] for e in events if e["type"] == "token") == "one two three"
+    assert events[-1]["type"] == "done"
+
+
+def test_context_is_echoed_only_when_debugging(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(query_router, "OLLAMA_SCHEDULER", OllamaScheduler(capacity=1))
+    monkeypatch.setattr(query_router, "get_query_hits", _no_hits)
+    monkeypatch.setattr(query_router, "create_ollama_client", lambda: _FakeOllama())
+    monkeypatch.setattr(query_router, "get_prompt_content", lambda _key: "system")
+    monkeypatch.setattr(query_router, "format_sources_by_file", lambda _hits, existing_sources: ("CONTEXT", []))
+
+    async def generate_start(body: QueryIn) -> dict[str, Any]:
+        events = [json.loads(line) async for line in query_router._answer(body)]
+        return next(e for e in events if e.get("stage") == "generate_start")
+
+    assert asyncio.run(generate_start(QueryIn(prompt="question")))["debug"] is None
+    assert asyncio.run(generate_start(QueryIn(prompt="question", debug=True)))["debug"] == "CONTEXT"
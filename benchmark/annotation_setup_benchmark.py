@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from features.annotations.llm_service import build_chunks  # noqa: E402
+from features.annotations.pdf_text_recognition import PageData, TextPlaceRecognitionPDF  # noqa: E402
+
+
+def _repeat_pages(pages: list[PageData], target_pages: int) -> list[PageData]:
+    if not pages:
+        return []
+    out: list[PageData] = []
+    while len(out) < target_pages:
+        for page in pages:
+            if len(out) >= target_pages:
+                break
+            out.append({"page": len(out), "page_height": page["page_height"], "words": page["words"]})
+    return out
+
+
+def _measure(pages: list[PageData], chunk_size: int) -> tuple[float, float, float, int]:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    _table, chunks = build_chunks(pages, chunk_size=chunk_size)
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, retained / 1e6, peak / 1e6, len(chunks)
+
+
+def _time_only(pages: list[PageData], chunk_size: int) -> float:
+    gc.collect()
+    started = time.perf_counter()
+    build_chunks(pages, chunk_size=chunk_size)
+    return (time.perf_counter() - started) * 1000.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure setup time and peak memory of annotation tokenization and chunking (no LLM calls)."
+    )
+    parser.add_argument("pdf", help="Input PDF.")
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=500,
+        help="Repeat the extracted pages until the document has this many pages.",
+    )
+    parser.add_argument("--chunk-length", type=int, default=1600, help="Chunk size in tokens.")
+    parser.add_argument("-x", "--runs", type=int, default=5, help="Timed runs (median is reported).")
+    args = parser.parse_args()
+
+    pdf_path = Path(args.pdf)
+    if not pdf_path.exists():
+        raise SystemExit(f"PDF not found: {pdf_path}")
+    if args.runs < 1:
+        raise SystemExit("--runs must be >= 1")
+
+    pages = _repeat_pages(TextPlaceRecognitionPDF(str(pdf_path)).extract_text(), args.pages)
+    words = sum(len(p["words"]) for p in pages)
+    _elapsed, retained_mb, peak_mb, chunk_count = _measure(pages, args.chunk_length)
+    timings = [_time_only(pages, args.chunk_length) for _ in range(args.runs)]
+
+    result: dict[str, Any] = {
+        "pages": len(pages),
+        "words": words,
+        "chunks": chunk_count,
+        "setup_ms_median": statistics.median(timings),
+        "retained_mb": retained_mb,
+        "peak_mb": peak_mb,
+    }
+    for key, value in result.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
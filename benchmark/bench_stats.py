@@ -0,0 +1,8 @@
+"""Statistics shared by the benchmark scripts."""
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile; q in 0..100."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for the Ollama HTTP API, for throughput benchmarks without models.
+
+Serves the endpoints core uses (`/api/tags`, `/api/pull`, `/api/embed`, `/api/chat`,
+`/api/generate`). Every reply is a pure function of the request, and its timing is
+`latency + tokens / tokens_per_second`, so runs differ only by what core does.
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+_WORD = re.compile(r"\w+")
+_ANSWER_WORDS = (
+    "The sources describe the approach in detail and compare it with earlier work "
+    "on the same problem, reporting results on several benchmarks."
+).split()
+# roughly what an Ollama tokenizer makes of JSON
+_CHARS_PER_TOKEN = 4
+
+
+@dataclass(frozen=True)
+class FakeOllamaConfig:
+    models: tuple[str, ...] = ("llama3.2:latest", "nomic-embed-text")
+    embed_latency: float = 0.02
+    embed_latency_per_input: float = 0.002
+    embedding_dim: int = 64
+    chat_latency: float = 0.15
+    tokens_per_second: float = 200.0
+    answer_tokens: int = 60
+
+
+class FakeOllamaStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+
+    def add(self, kind: str) -> None:
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def get(self, kind: str) -> int:
+        with self._lock:
+            return self.counts.get(kind, 0)
+
+
+def _terms(text: str) -> set[str]:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 3}
+
+
+def embed_text(text: str, dim: int) -> list[float]:
+    """Normalized bag of hashed words: similar texts get similar vectors."""
+    vector = [0.0] * dim
+    for word in _WORD.findall(text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def coarse_answer(prompt: str) -> str:
+    """Select every sentence sharing a word of four letters or more with the rule."""
+    rules = re.findall(r'^- ID "([^"]+)": (.*)$', prompt.split("Sentences:")[0], flags=re.M)
+    sentences = re.findall(r"^\[(S\d+)\] (.*)$", prompt.split("Sentences:")[-1], flags=re.M)
+    matches = []
+    for rule_id, terms in rules:
+        wanted = _terms(terms)
+        ids = [sid for sid, text in sentences if wanted & _terms(text)]
+        if ids:
+            matches.append({"rule_id": rule_id, "sentence_ids": ids})
+    return json.dumps({"matches": matches})
+
+
+def boundary_answer(prompt: str) -> str:
+    rule = re.search(r'^- ID "[^"]+": (.*)$', prompt, flags=re.M)
+    wanted = _terms(rule.group(1)) if rule else set()
+    tokens = re.findall(r"^\[(\d+)\] (.*)$", prompt.split("Tokens:")[-1], flags=re.M)
+    spans = [{"start_token": int(i), "end_token": int(i)} for i, token in tokens if wanted & _terms(token)]
+    return json.dumps({"spans": spans})
+
+
+def chat_answer(messages: list[dict[str, Any]], fmt: Any, answer_tokens: int) -> list[str]:
+    """The reply split into the pieces it is streamed in."""
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    schema = json.dumps(fmt) if fmt is not None else ""
+    if '"matches"' in schema:
+        text = coarse_answer(prompt)
+    elif '"spans"' in schema:
+        text = boundary_answer(prompt)
+    else:
+        return [f"{_ANSWER_WORDS[i % len(_ANSWER_WORDS)]} " for i in range(answer_tokens)]
+    return [text[i:i + _CHARS_PER_TOKEN] for i in range(0, len(text), _CHARS_PER_TOKEN)] or [text]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeOllamaServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            models = [
+                {"model": m, "name": m, "modified_at": "2024-01-01T00:00:00Z", "digest": "0" * 64, "size": 0}
+                for m in self.server.config.models
+            ]
+            self._json({"models": models})
+        else:
+            self._json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path == "/api/embed":
+            self._embed(body)
+        elif self.path == "/api/chat":
+            self._chat(body)
+        elif self.path == "/api/generate":
+            self._generate(body)
+        elif self.path == "/api/pull":
+            self._json({"status": "success"})
+        else:
+            self._json({"error": f"unknown endpoint {self.path}"}, status=404)
+
+    def _embed(self, body: dict[str, Any]) -> None:
+        config = self.server.config
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.server.stats.add("embed")
+        time.sleep(config.embed_latency + config.embed_latency_per_input * len(inputs))
+        self._json({
+            "model": body.get("model", ""),
+            "embeddings": [embed_text(str(text), config.embedding_dim) for text in inputs],
+        })
+
+    def _chat(self, body: dict[str, Any]) -> None:
+        config = self.server.config
+        fmt = body.get("format")
+        schema = json.dumps(fmt) if fmt is not None else ""
+        kind = "coarse" if '"matches"' in schema else "boundary" if '"spans"' in schema else "chat"
+        self.server.stats.add(kind)
+        pieces = chat_answer(body.get("messages", []), fmt, config.answer_tokens)
+        model = body.get("model", "")
+
+        def message(content: str, done: bool) -> dict[str, Any]:
+            out: dict[str, Any] = {
+                "model": model,
+                "created_at": "2024-01-01T00:00:00Z",
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                out.update(
+                    done_reason="stop",
+                    eval_count=len(pieces),
+                    eval_duration=int(len(pieces) / config.tokens_per_second * 1e9),
+                )
+            return out
+
+        if body.get("stream", True):
+            self._ndjson(
+                message(piece, False) if piece is not None else message("", True)
+                for piece in self._paced(pieces)
+            )
+        else:
+            for _ in self._paced(pieces):
+                pass
+            self._json(message("".join(pieces), True))
+
+    def _generate(self, body: dict[str, Any]) -> None:
+        self.server.stats.add("generate")
+        time.sleep(self.server.config.chat_latency)
+        self._json({
+            "model": body.get("model", ""),
+            "created_at": "2024-01-01T00:00:00Z",
+            "response": "Benchmark conversation",
+            "done": True,
+        })
+
+    def _paced(self, pieces: list[str]) -> Iterator[str | None]:
+        """Yield the pieces at the configured token rate, then None."""
+        config = self.server.config
+        started = time.perf_counter() + config.chat_latency
+        for i, piece in enumerate(pieces):
+            delay = started + i / config.tokens_per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield piece
+        yield None
+
+    def _json(self, payload: dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _ndjson(self, payloads: Iterator[dict[str, Any]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for payload in payloads:
+            line = json.dumps(payload).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: FakeOllamaConfig, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _Handler)
+        self.config = config
+        self.stats = FakeOllamaStats()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve a deterministic fake Ollama API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--chat-latency", type=float, default=FakeOllamaConfig.chat_latency, help="Seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOllamaConfig.tokens_per_second)
+    parser.add_argument("--embed-latency", type=float, default=FakeOllamaConfig.embed_latency, help="Seconds per embed call.")
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second,
+        embed_latency=args.embed_latency,
+    )
+    server = FakeOllamaServer(config, args.host, args.port)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
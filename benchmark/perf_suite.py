@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Offline performance suite: runs core against the fake Ollama server (fake_ollama.py) and an
+in-process ephemeral Chroma, measures ingest, query and annotation throughput at several
+concurrency levels and compares the numbers with a stored baseline.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Optional
+from urllib import error, request
+
+from bench_stats import percentile
+from fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from run_annotations_benchmark import _multipart_body
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCHMARK_DIR.parent / "app"
+DEFAULT_BASELINE = BENCHMARK_DIR / "perf_baseline.json"
+DEFAULT_GROUND_TRUTH = BENCHMARK_DIR / "ground_truth_project_3_offloading.json"
+
+# metric name -> True when higher is better
+METRICS = {
+    "ingest_docs_per_minute": True,
+    "query_ttft_p50_ms": False,
+    "query_ttft_p99_ms": False,
+    "annotation_chunks_per_second": True,
+}
+
+_VOCABULARY = (
+    "model training data latency throughput memory cache offloading kernel scheduler gradient "
+    "inference batch network layer attention token sequence benchmark evaluation accuracy "
+    "experiment baseline hardware accelerator bandwidth storage retrieval index vector query"
+).split()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def _document_text(index: int, words: int) -> str:
+    """Deterministic pseudo-text, one sentence every twelve words."""
+    out = []
+    for i in range(words):
+        word = _VOCABULARY[(index * 7 + i * 13 + i // 5) % len(_VOCABULARY)]
+        out.append(word.capitalize() if i % 12 == 0 else word)
+        if i % 12 == 11:
+            out[-1] += "."
+    return " ".join(out) + "."
+
+
+def _form_body(fields: dict[str, str], filename: str, content: bytes, content_type: str) -> tuple[bytes, str]:
+    boundary = f"----ragperf{uuid.uuid4().hex}"
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        for name, value in fields.items()
+    ]
+    parts.append(
+        (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        + content
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), boundary
+
+
+class CoreProcess:
+    """uvicorn running core in a subprocess, with every cache and store under `workdir`."""
+
+    def __init__(self, ollama_url: str, workdir: Path, extra_env: dict[str, str]) -> None:
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = workdir / "core.log"
+        self._env = {
+            **os.environ,
+            "OLLAMA_BASE_URL": ollama_url,
+            "CHROMA_CLIENT_MODE": "ephemeral",
+            "ANONYMIZED_TELEMETRY": "False",
+            "PROMPTS_DIR": str(workdir / "prompts"),
+            "INDEX_CATALOG_PATH": str(workdir / "index_catalog.sqlite3"),
+            "ANNOTATION_LLM_CACHE_PATH": str(workdir / "annotation_llm_cache.sqlite3"),
+            "ANNOTATION_JOBS_DIR": str(workdir / "annotation_jobs"),
+            "ANNOTATION_OCR_CACHE_DIR": str(workdir / "annotation_ocr"),
+            "ANNOTATION_PDF_STORE_DIR": str(workdir / "annotation_pdfs"),
+            "WEBDAV_DATA_DIR": str(workdir / "data"),
+            **extra_env,
+        }
+        self._process: Optional[subprocess.Popen[bytes]] = None
+
+    def start(self, timeout_s: float = 60.0) -> None:
+        with self.log_path.open("wb") as log:
+            self._process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port)],
+                cwd=APP_DIR,
+                env=self._env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        deadline = time.monotonic() + timeout_s
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"core exited during startup, see {self.log_path}")
+            try:
+                with request.urlopen(self.url + "/api/health", timeout=1.0):
+                    return
+            except (error.URLError, ConnectionError, TimeoutError):
+                time.sleep(0.2)
+        raise RuntimeError(f"core did not become healthy within {timeout_s:.0f}s, see {self.log_path}")
+
+    def stop(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+
+
+def _run_concurrently(task: Callable[[int], Any], count: int, concurrency: int) -> tuple[list[Any], float]:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(task, range(count)))
+    return results, time.perf_counter() - started
+
+
+def measure_ingest(core_url: str, concurrency: int, documents: int, words: int, timeout_s: float) -> float:
+    """Documents indexed per minute."""
+    def ingest(i: int) -> None:
+        text = _document_text(concurrency * 100_000 + i, words).encode("utf-8")
+        filename = f"PERF{concurrency:03d}{i:05d}.txt"
+        body, boundary = _form_body(
+            {"filename": filename, "event_type": "created"}, filename, text, "text/plain"
+        )
+        req = request.Request(
+            core_url + "/internal/file-changed",
+            method="POST",
+            data=body,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        with request.urlopen(req, timeout=timeout_s) as resp:
+            resp.read()
+
+    _results, elapsed = _run_concurrently(ingest, documents, concurrency)
+    return documents / elapsed * 60.0
+
+
+def measure_query(core_url: str, concurrency: int, queries: int, timeout_s: float) -> tuple[float, float]:
+    """p50 and p99 time from sending /api/query to the first token event, in ms."""
+    def query(i: int) -> float:
+        words = [_VOCABULARY[(i * 5 + k * 3) % len(_VOCABULARY)] for k in range(6)]
+        req = request.Request(
+            core_url + "/api/query",
+            method="POST",
+            data=json.dumps({"prompt": "What is said about " + " ".join(words) + "?"}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        with request.urlopen(req, timeout=timeout_s) as resp:
+            for line in resp:
+                if first_token is None and line.strip() and json.loads(line).get("type") == "token":
+                    first_token = time.perf_counter() - started
+        if first_token is None:
+            raise RuntimeError("query stream ended without a token")
+        return first_token * 1000.0
+
+    ttfts, _elapsed = _run_concurrently(query, queries, concurrency)
+    return percentile(ttfts, 50), percentile(ttfts, 99)
+
+
+def measure_annotations(
+    core_url: str,
+    ollama: FakeOllamaServer,
+    concurrency: int,
+    jobs: int,
+    pdf_bytes: bytes,
+    rules: list[dict[str, Any]],
+    chunk_length: int,
+    timeout_s: float,
+) -> float:
+    """Annotation chunks processed per second across all jobs of the level."""
+    config = json.dumps({
+        "rules": [{"id": r["id"], "termsRaw": r["termsRaw"]} for r in rules],
+        "chunkLength": chunk_length,
+        "cacheMode": "bypass",
+    })
+
+    def annotate(_i: int) -> None:
+        body, boundary = _multipart_body(pdf_bytes, config)
+        req = request.Request(
+            core_url + "/api/annotations",
+            method="POST",
+            data=body,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        with request.urlopen(req, timeout=timeout_s) as resp:
+            for line in resp:
+                if line.strip() and json.loads(line).get("type") == "error":
+                    raise RuntimeError(json.loads(line).get("message") or "annotation stream failed")
+
+    # Without the embedding gate and with the cache bypassed, every chunk makes exactly one coarse call.
+    coarse_before = ollama.stats.get("coarse")
+    _results, elapsed = _run_concurrently(annotate, jobs, concurrency)
+    return (ollama.stats.get("coarse") - coarse_before) / elapsed
+
+
+def run_suite(args: argparse.Namespace) -> dict[str, Any]:
+    fake_config = FakeOllamaConfig(
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second,
+        embed_latency=args.embed_latency,
+    )
+    ground_truth = json.loads(Path(args.ground_truth).read_text(encoding="utf-8"))
+    pdf_path = Path(str(ground_truth.get("pdf_path", "")).strip())
+    if not pdf_path.exists():
+        pdf_path = Path(args.ground_truth).resolve().parent / pdf_path
+    pdf_bytes = pdf_path.read_bytes()
+
+    metrics: dict[str, dict[str, float]] = {name: {} for name in METRICS}
+    ollama = FakeOllamaServer(fake_config).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="rag-perf-") as tmp:
+            core = CoreProcess(ollama.url, Path(tmp), dict(args.env))
+            core.start()
+            try:
+                for level in args.concurrency:
+                    key = str(level)
+                    docs_per_min = measure_ingest(core.url, level, args.documents, args.document_words, args.timeout)
+                    metrics["ingest_docs_per_minute"][key] = round(docs_per_min, 1)
+                    print(f"[c={level}] ingest: {docs_per_min:.1f} docs/min", flush=True)
+
+                for level in args.concurrency:
+                    key = str(level)
+                    p50, p99 = measure_query(core.url, level, args.queries, args.timeout)
+                    metrics["query_ttft_p50_ms"][key] = round(p50, 1)
+                    metrics["query_ttft_p99_ms"][key] = round(p99, 1)
+                    print(f"[c={level}] query TTFT: p50 {p50:.1f} ms, p99 {p99:.1f} ms", flush=True)
+
+                for level in args.concurrency:
+                    key = str(level)
+                    chunks_per_s = measure_annotations(
+                        core.url,
+                        ollama,
+                        level,
+                        args.annotation_jobs,
+                        pdf_bytes,
+                        ground_truth.get("rules", []),
+                        args.chunk_length,
+                        args.timeout,
+                    )
+                    metrics["annotation_chunks_per_second"][key] = round(chunks_per_s, 2)
+                    print(f"[c={level}] annotations: {chunks_per_s:.2f} chunks/s", flush=True)
+            finally:
+                core.stop()
+    finally:
+        ollama.stop()
+
+    return {
+        "workload": {
+            "concurrency": args.concurrency,
+            "documents": args.documents,
+            "document_words": args.document_words,
+            "queries": args.queries,
+            "annotation_jobs": args.annotation_jobs,
+            "chunk_length": args.chunk_length,
+            "fake_ollama": asdict(fake_config),
+            "env": dict(args.env),
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Human-readable regressions: metrics worse than the baseline by more than `tolerance` (relative)."""
+    regressions = []
+    for name, higher_is_better in METRICS.items():
+        for level, expected in baseline.get("metrics", {}).get(name, {}).items():
+            actual = current["metrics"].get(name, {}).get(level)
+            if actual is None or not expected:
+                continue
+            change = (actual - expected) / expected
+            worse = -change if higher_is_better else change
+            status = "REGRESSION" if worse > tolerance else "ok"
+            print(f"{name:<30} c={level:<4} baseline {expected:>10.2f} now {actual:>10.2f} ({change:+.1%}) {status}")
+            if worse > tolerance:
+                regressions.append(f"{name} at concurrency {level}: {expected} -> {actual} ({change:+.1%})")
+    return regressions
+
+
+def _int_list(value: str) -> list[int]:
+    try:
+        levels = sorted({int(v) for v in value.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}")
+    if not levels or levels[0] < 1:
+        raise argparse.ArgumentTypeError("concurrency levels must be >= 1")
+    return levels
+
+
+def _env_pair(value: str) -> tuple[str, str]:
+    name, sep, setting = value.partition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {value!r}")
+    return name, setting
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure core throughput against a fake Ollama and an ephemeral Chroma, "
+        "and fail on regressions against a stored baseline."
+    )
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 8], help="Comma-separated client concurrency levels.")
+    parser.add_argument("--documents", type=int, default=24, help="Documents ingested per concurrency level.")
+    parser.add_argument("--document-words", type=int, default=3000, help="Words per synthetic document.")
+    parser.add_argument("--queries", type=int, default=50, help="Queries sent per concurrency level.")
+    parser.add_argument("--annotation-jobs", type=int, default=8, help="Annotation jobs per concurrency level.")
+    parser.add_argument("--chunk-length", type=int, default=400, help="Annotation chunk length in tokens.")
+    parser.add_argument("--ground-truth", default=str(DEFAULT_GROUND_TRUTH), help="Provides the PDF and rules for annotations.")
+    parser.add_argument("--chat-latency", type=float, default=FakeOllamaConfig.chat_latency, help="Fake Ollama seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOllamaConfig.tokens_per_second, help="Fake Ollama generation speed.")
+    parser.add_argument("--embed-latency", type=float, default=FakeOllamaConfig.embed_latency, help="Fake Ollama seconds per embed call.")
+    parser.add_argument("--env", type=_env_pair, action="append", default=[], help="Extra NAME=VALUE setting for core (repeatable).")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline JSON to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (0.25 = 25%%).")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline.")
+    parser.add_argument("--output", default=None, help="Also write the results JSON here.")
+    args = parser.parse_args()
+
+    for name in ("documents", "document_words", "queries", "annotation_jobs"):
+        if getattr(args, name) < 1:
+            raise SystemExit(f"--{name.replace('_', '-')} must be >= 1")
+    if args.chunk_length < 32:
+        raise SystemExit("--chunk-length must be >= 32")
+
+    results = run_suite(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; rerun with --update-baseline to record one.")
+        return 0
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    # round-trip so tuples compare equal to the lists stored in JSON
+    if baseline.get("workload") != json.loads(json.dumps(results["workload"])):
+        print("Baseline was recorded with a different workload; rerun with the same options or --update-baseline.")
+        return 2
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nPerformance regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
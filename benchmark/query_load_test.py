@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Load generator for the streaming `POST /api/query` endpoint.
+
+Replays a prompt corpus with a bounded number of requests in flight, either as fast as the
+workers allow (closed loop) or at a fixed arrival rate (open loop), and reports percentiles
+of time to `setSources`, time to first `token`, inter-token latency and total duration.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+from urllib import error, request
+
+from bench_stats import percentile
+
+_DEFAULT_PROMPTS = [
+    "What are the main contributions of the paper?",
+    "Summarize the evaluation methodology.",
+    "Which datasets were used in the experiments?",
+    "How does the proposed method compare to the baseline?",
+    "What limitations do the authors mention?",
+    "Explain the offloading strategy in simple terms.",
+    "Which hardware was used for the benchmarks?",
+    "What future work is suggested?",
+]
+
+
+@dataclass
+class QueryResult:
+    prompt_index: int
+    # seconds from the scheduled start; None when the event never arrived
+    queued: float = 0.0
+    sources: Optional[float] = None
+    first_token: Optional[float] = None
+    total: Optional[float] = None
+    tokens: int = 0
+    inter_token: list[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def load_prompts(path: Optional[str]) -> list[str]:
+    """One prompt per line, or a JSON list of strings / {"prompt": ...} objects."""
+    if path is None:
+        return list(_DEFAULT_PROMPTS)
+    text = Path(path).read_text(encoding="utf-8")
+    if path.endswith(".json"):
+        items = json.loads(text)
+        prompts = [str(item["prompt"] if isinstance(item, dict) else item) for item in items]
+    else:
+        prompts = [line.strip() for line in text.splitlines()]
+    prompts = [p for p in prompts if p]
+    if not prompts:
+        raise SystemExit(f"No prompts in {path}")
+    return prompts
+
+
+def run_query(host: str, prompt: str, prompt_index: int, scheduled: float, timeout_s: float) -> QueryResult:
+    """Stream one query; all times are measured from `scheduled` (perf_counter)."""
+    result = QueryResult(prompt_index=prompt_index, queued=time.perf_counter() - scheduled)
+    req = request.Request(
+        url=host.rstrip("/") + "/api/query",
+        method="POST",
+        data=json.dumps({"prompt": prompt}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    last_token: Optional[float] = None
+    done = False
+    try:
+        with request.urlopen(req, timeout=timeout_s) as resp:
+            for line in resp:
+                if not line.strip():
+                    continue
+                now = time.perf_counter() - scheduled
+                event = json.loads(line.decode("utf-8"))
+                kind = event.get("type")
+                if kind == "setSources" and result.sources is None:
+                    result.sources = now
+                elif kind == "token":
+                    if last_token is None:
+                        result.first_token = now
+                    else:
+                        result.inter_token.append(now - last_token)
+                    last_token = now
+                    result.tokens += 1
+                elif kind == "done":
+                    done = True
+        result.total = time.perf_counter() - scheduled
+        if not done:
+            result.error = "stream ended without a done event"
+    except error.HTTPError as e:
+        result.error = f"HTTP {e.code}"
+    except (error.URLError, OSError, ValueError) as e:
+        result.error = type(e).__name__ if not str(e) else f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_load(
+    host: str,
+    prompts: list[str],
+    requests: int,
+    concurrency: int,
+    rate: Optional[float],
+    timeout_s: float,
+    seed: int,
+) -> tuple[list[QueryResult], float]:
+    """
+    Without `rate`, each of `concurrency` workers sends its next query as soon as the previous
+    one finished. With `rate`, queries arrive as a Poisson process of that many per second;
+    when all workers are busy they wait, and the wait counts towards their latencies.
+    """
+    rng = random.Random(seed)
+    results: list[QueryResult] = []
+    lock = threading.Lock()
+
+    def task(i: int, scheduled: Optional[float]) -> None:
+        if scheduled is None:
+            scheduled = time.perf_counter()
+        result = run_query(host, prompts[i % len(prompts)], i % len(prompts), scheduled, timeout_s)
+        with lock:
+            results.append(result)
+            finished = len(results)
+        if finished % max(1, requests // 10) == 0 or finished == requests:
+            print(f"  {finished}/{requests} done", flush=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures: list[Future[None]] = []
+        next_arrival = started
+        for i in range(requests):
+            if rate:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(task, i, next_arrival))
+                next_arrival += rng.expovariate(rate)
+            else:
+                futures.append(pool.submit(task, i, None))
+        for future in futures:
+            future.result()
+    return results, time.perf_counter() - started
+
+
+def _summary(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000.0, 1),
+        "p90_ms": round(percentile(values, 90) * 1000.0, 1),
+        "p99_ms": round(percentile(values, 99) * 1000.0, 1),
+        "max_ms": round(max(values) * 1000.0, 1),
+    }
+
+
+def summarize(results: list[QueryResult], wall_s: float) -> dict[str, Any]:
+    ok = [r for r in results if r.error is None]
+    errors: dict[str, int] = {}
+    for r in results:
+        if r.error is not None:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    tokens = sum(r.tokens for r in ok)
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "wall_s": round(wall_s, 2),
+        "queries_per_s": round(len(ok) / wall_s, 2) if wall_s else 0.0,
+        "tokens_per_s": round(tokens / wall_s, 1) if wall_s else 0.0,
+        "client_queue": _summary([r.queued for r in results]),
+        "time_to_sources": _summary([r.sources for r in ok if r.sources is not None]),
+        "time_to_first_token": _summary([r.first_token for r in ok if r.first_token is not None]),
+        "inter_token": _summary([gap for r in ok for gap in r.inter_token]),
+        "total_duration": _summary([r.total for r in ok if r.total is not None]),
+    }
+
+
+def _print_summary(summary: dict[str, Any]) -> None:
+    print(
+        f"\n{summary['succeeded']}/{summary['requests']} succeeded "
+        f"(error rate {summary['error_rate']:.2%}) in {summary['wall_s']:.1f}s: "
+        f"{summary['queries_per_s']:.2f} queries/s, {summary['tokens_per_s']:.1f} tokens/s"
+    )
+    for reason, count in sorted(summary["errors"].items(), key=lambda item: -item[1]):
+        print(f"  {count:>5} x {reason}")
+    print(f"\n{'metric':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in ("client_queue", "time_to_sources", "time_to_first_token", "inter_token", "total_duration"):
+        stats = summary[name]
+        if stats:
+            print(f"{name:<22}{stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+        else:
+            print(f"{name:<22}{'-':>10}{'-':>10}{'-':>10}{'-':>10}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the streaming /api/query endpoint.")
+    parser.add_argument("host", help="API host, e.g. http://localhost:8080")
+    parser.add_argument("--prompts", default=None, help="Prompt corpus: text file (one per line) or JSON list.")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="Total queries to send.")
+    parser.add_argument("-c", "--concurrency", type=int, default=20, help="Maximum queries in flight.")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Arrivals per second (Poisson). Omit to send the next query as soon as a worker is free.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the arrival process.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-query timeout in seconds.")
+    parser.add_argument("--output", default=None, help="Write the summary and per-query results as JSON.")
+    args = parser.parse_args()
+
+    if args.requests < 1:
+        raise SystemExit("--requests must be >= 1")
+    if args.concurrency < 1:
+        raise SystemExit("--concurrency must be >= 1")
+    if args.rate is not None and args.rate <= 0:
+        raise SystemExit("--rate must be > 0")
+
+    prompts = load_prompts(args.prompts)
+    mode = f"{args.rate}/s arrivals" if args.rate else "closed loop"
+    print(f"Sending {args.requests} queries, {args.concurrency} in flight, {mode}, {len(prompts)} prompts")
+    results, wall_s = run_load(
+        args.host, prompts, args.requests, args.concurrency, args.rate, args.timeout, args.seed
+    )
+    summary = summarize(results, wall_s)
+    _print_summary(summary)
+
+    if args.output:
+        payload = {"summary": summary, "results": [asdict(r) for r in results]}
+        Path(args.output).write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+    return 0 if summary["succeeded"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
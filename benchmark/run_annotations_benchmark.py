@@ -52,6 +52,9 @@ def _call_annotations(
     rules: list[dict[str, Any]],
     timeout_s: float,
     chunk_length: Optional[int],
+    context_length: Optional[int],
+    cache_mode: str,
+    embedding_gate_threshold: Optional[float],
 ) -> dict[str, Any]:
     with pdf_path.open("rb") as f:
         pdf_bytes = f.read()
@@ -61,6 +64,11 @@ def _call_annotations(
     }
     if chunk_length is not None:
         cfg["chunkLength"] = int(chunk_length)
+    if context_length is not None:
+        cfg["contextLength"] = int(context_length)
+    cfg["cacheMode"] = cache_mode
+    if embedding_gate_threshold is not None:
+        cfg["embeddingGateThreshold"] = embedding_gate_threshold
     config_json = json.dumps(cfg)
     body, boundary = _multipart_body(pdf_bytes, config_json)
 
@@ -71,11 +79,23 @@ def _call_annotations(
         data=body,
         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
     )
+    matches: list[dict[str, Any]] = []
+    summary: dict[str, Any] = {}
     with request.urlopen(req, timeout=timeout_s) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+        for line in resp:
+            if not line.strip():
+                continue
+            event = json.loads(line.decode("utf-8"))
+            if event.get("type") == "error":
+                raise RuntimeError(event.get("message") or "annotation stream failed")
+            if event.get("type") == "annotationMatches":
+                matches.extend(event.get("matches", []))
+            elif event.get("type") == "updateProgress" and event.get("stage") == "done":
+                summary = event
+    return {"matches": matches, "summary": summary}
 
 
-def _score_run(
+def score_run(
     payload: dict[str, Any],
     rules: list[dict[str, Any]],
     match_threshold: float,
@@ -135,6 +155,24 @@ def main() -> int:
         default=None,
         help="Optional chunk length to send in request config.",
     )
+    parser.add_argument(
+        "--context-length",
+        type=int,
+        default=None,
+        help="Optional read-only context tokens around chunk boundaries to send in request config.",
+    )
+    parser.add_argument(
+        "--cache-mode",
+        choices=["use", "bypass", "refresh"],
+        default="use",
+        help="LLM response cache mode; 'bypass' forces fresh Ollama calls on every run.",
+    )
+    parser.add_argument(
+        "--embedding-gate-threshold",
+        type=float,
+        default=None,
+        help="Cosine similarity a sentence needs to reach the coarse LLM call (-1..1).",
+    )
     args = parser.parse_args()
 
     if args.runs < 1:
@@ -143,6 +181,10 @@ def main() -> int:
         raise SystemExit("--match-threshold must be between 0 and 1")
     if args.chunk_length is not None and args.chunk_length < 32:
         raise SystemExit("--chunk-length must be >= 32")
+    if args.context_length is not None and args.context_length < 0:
+        raise SystemExit("--context-length must be >= 0")
+    if args.embedding_gate_threshold is not None and not (-1.0 <= args.embedding_gate_threshold <= 1.0):
+        raise SystemExit("--embedding-gate-threshold must be between -1 and 1")
 
     gt_path = Path(args.ground_truth)
     if not gt_path.exists():
@@ -169,6 +211,9 @@ def main() -> int:
                 rules,
                 args.timeout,
                 args.chunk_length,
+                args.context_length,
+                args.cache_mode,
+                args.embedding_gate_threshold,
             )
         except error.URLError as exc:
             print(f"Run {run_idx}: request failed: {exc}")
@@ -177,11 +222,18 @@ def main() -> int:
             print(f"Run {run_idx}: unexpected error: {exc}")
             return 3
 
-        total, rule_scores, texts = _score_run(payload, rules, args.match_threshold)
+        total, rule_scores, texts = score_run(payload, rules, args.match_threshold)
         run_totals.append(total)
         last_rule_scores = rule_scores
         last_texts = texts
-        print(f"Run {run_idx}/{args.runs}: score={total:.1f}%")
+        summary = payload["summary"]
+        gate_info = ""
+        if summary.get("gateSentencesTotal") is not None:
+            gate_info = (
+                f" gate_kept={summary['gateSentencesKept']}/{summary['gateSentencesTotal']} sentences"
+                f" gate_skipped_chunks={summary['gateChunksSkipped']}"
+            )
+        print(f"Run {run_idx}/{args.runs}: score={total:.1f}%{gate_info}")
 
     avg = sum(run_totals) / len(run_totals)
     verdict = "PASS" if avg >= args.pass_threshold else "FAIL"
@@ -189,6 +241,10 @@ def main() -> int:
     print(f"PDF: {pdf_path}")
     if args.chunk_length is not None:
         print(f"Chunk length: {args.chunk_length}")
+    if args.context_length is not None:
+        print(f"Context length: {args.context_length}")
+    if args.embedding_gate_threshold is not None:
+        print(f"Embedding gate threshold: {args.embedding_gate_threshold}")
     print(f"Average score: {avg:.1f}% (threshold {args.pass_threshold:.1f}%) => {verdict}")
     print("Per-rule score from last run:")
     for rule in rules:
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional, cast
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(APP_DIR))
+
+from ollama import AsyncClient  # noqa: E402
+
+from core.ollama_scheduler import OllamaScheduler, Priority  # noqa: E402
+from core.settings import ANSWER_MODEL  # noqa: E402
+from features.annotations.llm_service import process_annotations  # noqa: E402
+from run_annotations_benchmark import score_run  # noqa: E402
+
+
+@dataclass(frozen=True)
+class _Rule:
+    id: str
+    termsRaw: str
+
+
+@dataclass(frozen=True)
+class GroundTruth:
+    path: Path
+    pdf_path: Path
+    rules: list[dict[str, Any]]
+
+
+@dataclass
+class TuneResult:
+    chunk_length: int
+    context_length: int
+    parallel: int
+    wall_s: float
+    llm_calls: float
+    embed_calls: float
+    score: float
+    scores: dict[str, float]
+
+    @property
+    def settings(self) -> dict[str, int]:
+        return {
+            "ANNOTATION_DEFAULT_CHUNK_SIZE": self.chunk_length,
+            "ANNOTATION_CONTEXT_TOKENS": self.context_length,
+            "MAX_OLLAMA_PARALLEL_CALLS": self.parallel,
+        }
+
+
+class CountingClient:
+    """Forwards to an Ollama client and counts the chat and embed calls made through it."""
+
+    def __init__(self, client: AsyncClient) -> None:
+        self._client = client
+        self.chat_calls = 0
+        self.embed_calls = 0
+
+    async def chat(self, *args: Any, **kwargs: Any) -> Any:
+        self.chat_calls += 1
+        return await self._client.chat(*args, **kwargs)
+
+    async def embed(self, *args: Any, **kwargs: Any) -> Any:
+        self.embed_calls += 1
+        return await self._client.embed(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def _int_list(value: str) -> list[int]:
+    try:
+        return sorted({int(v) for v in value.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}")
+
+
+def _load_ground_truth(path: Path) -> GroundTruth:
+    if not path.exists():
+        raise SystemExit(f"Ground truth file not found: {path}")
+    gt = json.loads(path.read_text(encoding="utf-8"))
+    pdf_path = Path(str(gt.get("pdf_path", "")).strip())
+    if not pdf_path.exists():
+        # Paths in the ground truth files are relative to the file itself.
+        pdf_path = path.parent / pdf_path
+    if not pdf_path.is_file():
+        raise SystemExit(f"PDF not found for {path}: {pdf_path}")
+    rules = gt.get("rules", [])
+    if not isinstance(rules, list) or not rules:
+        raise SystemExit(f"Ground truth {path} has no rules.")
+    return GroundTruth(path=path, pdf_path=pdf_path, rules=rules)
+
+
+async def _run_once(
+    client: AsyncClient,
+    model: str,
+    gt: GroundTruth,
+    chunk_length: int,
+    context_length: int,
+    parallel: int,
+    embedding_gate_threshold: Optional[float],
+    match_threshold: float,
+) -> tuple[float, CountingClient, float]:
+    # A private scheduler, so the swept parallelism is not capped by the process settings.
+    scheduler = OllamaScheduler(capacity=parallel)
+    counting = CountingClient(client)
+    started = time.perf_counter()
+    matches = await process_annotations(
+        str(gt.pdf_path),
+        [_Rule(id=str(r["id"]), termsRaw=str(r["termsRaw"])) for r in gt.rules],
+        model,
+        cast(AsyncClient, counting),
+        chunk_size=chunk_length,
+        context_tokens=context_length,
+        embedding_gate_threshold=embedding_gate_threshold,
+        ollama_job=scheduler.job("tune", Priority.BATCH, max_parallel=parallel),
+    )
+    elapsed = time.perf_counter() - started
+    score, _rule_scores, _texts = score_run({"matches": matches}, gt.rules, match_threshold)
+    return elapsed, counting, score
+
+
+async def sweep(
+    client: AsyncClient,
+    model: str,
+    ground_truths: list[GroundTruth],
+    chunk_lengths: list[int],
+    context_lengths: list[int],
+    parallels: list[int],
+    runs: int,
+    embedding_gate_threshold: Optional[float] = None,
+    match_threshold: float = 0.6,
+) -> list[TuneResult]:
+    """Run every configuration `runs` times on every ground truth file; no response cache is used."""
+    results: list[TuneResult] = []
+    grid = list(itertools.product(chunk_lengths, context_lengths, parallels))
+    for idx, (chunk_length, context_length, parallel) in enumerate(grid, start=1):
+        walls: list[float] = []
+        calls: list[int] = []
+        embeds: list[int] = []
+        scores: dict[str, list[float]] = {str(gt.path): [] for gt in ground_truths}
+        for _ in range(runs):
+            wall = 0.0
+            run_calls = 0
+            run_embeds = 0
+            for gt in ground_truths:
+                elapsed, counting, score = await _run_once(
+                    client,
+                    model,
+                    gt,
+                    chunk_length,
+                    context_length,
+                    parallel,
+                    embedding_gate_threshold,
+                    match_threshold,
+                )
+                wall += elapsed
+                run_calls += counting.chat_calls
+                run_embeds += counting.embed_calls
+                scores[str(gt.path)].append(score)
+            walls.append(wall)
+            calls.append(run_calls)
+            embeds.append(run_embeds)
+        per_file = {path: statistics.mean(values) for path, values in scores.items()}
+        result = TuneResult(
+            chunk_length=chunk_length,
+            context_length=context_length,
+            parallel=parallel,
+            wall_s=statistics.median(walls),
+            llm_calls=statistics.mean(calls),
+            embed_calls=statistics.mean(embeds),
+            score=statistics.mean(per_file.values()),
+            scores=per_file,
+        )
+        results.append(result)
+        print(
+            f"[{idx}/{len(grid)}] chunk={chunk_length} context={context_length} parallel={parallel}: "
+            f"wall={result.wall_s:.1f}s calls={result.llm_calls:.0f} embeds={result.embed_calls:.0f} score={result.score:.1f}%",
+            flush=True,
+        )
+    return results
+
+
+def pareto_front(results: list[TuneResult]) -> list[TuneResult]:
+    """Configurations no other one beats on both wall time and score, fastest first."""
+    front: list[TuneResult] = []
+    best_score = float("-inf")
+    for result in sorted(results, key=lambda r: (r.wall_s, -r.score, r.llm_calls)):
+        if result.score > best_score:
+            front.append(result)
+            best_score = result.score
+    return front
+
+
+def recommend(front: list[TuneResult], score_tolerance: float) -> Optional[TuneResult]:
+    """The fastest configuration scoring within `score_tolerance` points of the best one."""
+    if not front:
+        return None
+    best = max(r.score for r in front)
+    return next(r for r in front if r.score >= best - score_tolerance)
+
+
+def _print_table(front: list[TuneResult]) -> None:
+    header = (
+        f"{'chunk':>6} {'context':>8} {'parallel':>9} {'wall_s':>8} "
+        f"{'llm_calls':>10} {'embed_calls':>12} {'score':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in front:
+        print(
+            f"{r.chunk_length:>6} {r.context_length:>8} {r.parallel:>9} "
+            f"{r.wall_s:>8.1f} {r.llm_calls:>10.0f} {r.embed_calls:>12.0f} {r.score:>6.1f}%"
+        )
+
+
+async def _warm_up(client: AsyncClient, model: str) -> None:
+    """Load the model once so the first configuration does not pay for it."""
+    await client.chat(
+        model=model,
+        messages=[{"role": "user", "content": "ok"}],
+        options={"num_predict": 1},
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Sweep annotation chunk length, context length and Ollama parallelism against "
+            "ground truth files and print the Pareto front of wall time vs. score."
+        )
+    )
+    parser.add_argument(
+        "--ground-truth",
+        action="append",
+        type=Path,
+        default=None,
+        help="Ground truth JSON (repeatable). Defaults to ground_truth_project_3_offloading.json.",
+    )
+    parser.add_argument("--model", default=ANSWER_MODEL, help="Ollama model used for the annotation calls.")
+    parser.add_argument(
+        "--ollama-host",
+        default=os.getenv("OLLAMA_BASE_URL"),
+        help="Ollama base URL (defaults to OLLAMA_BASE_URL).",
+    )
+    parser.add_argument("--chunk-lengths", type=_int_list, default=[800, 1200, 1600, 2400])
+    parser.add_argument("--context-lengths", type=_int_list, default=[0, 64])
+    parser.add_argument("--parallel", type=_int_list, default=[1, 2, 4, 8])
+    parser.add_argument("-x", "--runs", type=int, default=1, help="Runs per configuration (median wall time).")
+    parser.add_argument(
+        "--embedding-gate-threshold",
+        type=float,
+        default=None,
+        help="Embedding gate threshold applied to every configuration.",
+    )
+    parser.add_argument(
+        "--match-threshold",
+        type=float,
+        default=0.6,
+        help="Per-phrase token overlap threshold (0..1).",
+    )
+    parser.add_argument(
+        "--score-tolerance",
+        type=float,
+        default=2.0,
+        help="Score points the recommendation may give up for speed.",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="Write all results as JSON to this file.")
+    args = parser.parse_args()
+
+    if args.runs < 1:
+        raise SystemExit("--runs must be >= 1")
+    if not (0.0 <= args.match_threshold <= 1.0):
+        raise SystemExit("--match-threshold must be between 0 and 1")
+    if not args.chunk_lengths or min(args.chunk_lengths) < 32:
+        raise SystemExit("--chunk-lengths must be >= 32")
+    if not args.context_lengths or min(args.context_lengths) < 0:
+        raise SystemExit("--context-lengths must be >= 0")
+    if not args.parallel or min(args.parallel) < 1:
+        raise SystemExit("--parallel must be >= 1")
+
+    default_gt = Path(__file__).resolve().parent / "ground_truth_project_3_offloading.json"
+    ground_truths = [_load_ground_truth(p) for p in (args.ground_truth or [default_gt])]
+
+    async def run() -> list[TuneResult]:
+        client = AsyncClient(host=args.ollama_host)
+        await _warm_up(client, args.model)
+        return await sweep(
+            client,
+            args.model,
+            ground_truths,
+            args.chunk_lengths,
+            args.context_lengths,
+            args.parallel,
+            args.runs,
+            args.embedding_gate_threshold,
+            args.match_threshold,
+        )
+
+    results = asyncio.run(run())
+    front = pareto_front(results)
+    best = recommend(front, args.score_tolerance)
+
+    print("")
+    print(f"Model: {args.model}")
+    print(f"Ground truth: {', '.join(str(gt.path) for gt in ground_truths)}")
+    print("Pareto front (wall time vs. score):")
+    _print_table(front)
+    if best is not None:
+        print("")
+        print(f"Recommended settings for {args.model} (within {args.score_tolerance:.1f} points of the best score):")
+        for key, value in best.settings.items():
+            print(f"  {key}={value}")
+
+    if args.output is not None:
+        args.output.write_text(
+            json.dumps(
+                {
+                    "model": args.model,
+                    "groundTruth": [str(gt.path) for gt in ground_truths],
+                    "results": [asdict(r) for r in results],
+                    "pareto": [asdict(r) for r in front],
+                    "recommended": best.settings if best is not None else None,
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
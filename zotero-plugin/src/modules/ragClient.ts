@@ -41,6 +41,10 @@ export type RagHighlightRule = {
 export type RagConfig = {
   rules: RagHighlightRule[];
   pageRange?: string;
+  contextLength?: number;
+  cacheMode?: "use" | "bypass" | "refresh";
+  embeddingGateThreshold?: number | null;
+  traceSampleRate?: number;
 };
 
 export type RagPdfMatch = {
@@ -64,6 +68,11 @@ export type AnnotationProgressEvent = {
   markerId?: string;
   completed?: number;
   total?: number;
+  cacheHits?: number;
+  cacheMisses?: number;
+  gateChunksSkipped?: number;
+  gateSentencesKept?: number;
+  gateSentencesTotal?: number;
 };
 
 export type AnnotationStreamMsg =
@@ -78,12 +87,58 @@ export type AnnotationStreamMsg =
       markerId?: string;
       completed?: number;
       total?: number;
+      cacheHits?: number;
+      cacheMisses?: number;
+      gateChunksSkipped?: number;
+      gateSentencesKept?: number;
+      gateSentencesTotal?: number;
     }
   | { type: "annotationConcurrency"; activeRequests: number }
-  | { type: "annotationMatches"; matches: RagPdfMatch[] }
+  | {
+      type: "annotationJob";
+      jobId: string;
+      status: "running" | "done" | "error" | "cancelled";
+    }
+  | { type: "annotationQueued"; position: number; queued: number }
+  | { type: "annotationMatches"; document?: string; matches: RagPdfMatch[] }
+  | {
+      type: "annotationDocumentDone";
+      document: string;
+      matches: number;
+      error?: string | null;
+    }
   | { type: "error"; message: string }
   | { type: "done" };
 
+export type IndexedFile = {
+  filename: string;
+  contentSha256: string;
+  chunkCount: number;
+  pageCount?: number | null;
+  model: string;
+  indexedAt: number;
+  durationMs: number;
+};
+
+export type IndexStatus = {
+  zoteroId: string;
+  indexed: boolean;
+  chunkCount: number;
+  files: IndexedFile[];
+};
+
+const MAX_ANNOTATION_RECONNECTS = 3;
+
+async function sha256Hex(data: Uint8Array): Promise<string> {
+  const digest = await Zotero.getMainWindow().crypto.subtle.digest(
+    "SHA-256",
+    data,
+  );
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, "0"))
+    .join("");
+}
+
 export class RagClient {
   private get baseUrl(): string {
     return normalizeApiBaseUrl(getPref("apiBaseUrl"));
@@ -157,34 +212,160 @@ export class RagClient {
     pdf: string,
     cfg: RagConfig,
     signal?: AbortSignal,
+    zoteroKey?: string,
   ): AsyncGenerator<AnnotationStreamMsg> {
     const win = Zotero.getMainWindow();
     const url = `${this.baseUrl}/api/annotations`;
-    const fd = new win.FormData();
     const u8 = new win.Uint8Array(pdf.length);
     for (let i = 0; i < pdf.length; i++) {
       u8[i] = pdf.charCodeAt(i) & 0xff;
     }
-    fd.append(
-      "file",
-      new win.Blob([u8], { type: "application/pdf" }),
-      "document.pdf",
-    );
-    fd.append("config", JSON.stringify(cfg));
 
-    const res = await fetch(url, {
-      method: "POST",
-      headers: { Accept: "application/x-ndjson" },
-      body: fd,
-      signal,
-    });
+    // Only upload the PDF when the server does not have this exact file yet.
+    const sha256 = await sha256Hex(u8);
+    const known = await this.lookupPdf(sha256, zoteroKey, signal);
+    const post = (upload: boolean) => {
+      const fd = new win.FormData();
+      if (upload) {
+        fd.append(
+          "file",
+          new win.Blob([u8], { type: "application/pdf" }),
+          "document.pdf",
+        );
+      } else {
+        fd.append("sha256", sha256);
+      }
+      fd.append("config", JSON.stringify(cfg));
+      return fetch(url, {
+        method: "POST",
+        headers: { Accept: "application/x-ndjson" },
+        body: fd,
+        signal,
+      });
+    };
 
+    let res = await post(!known);
+    if (known && res.status === 404) {
+      // evicted between the lookup and the request
+      res = await post(true);
+    }
+
+    if (res.status === 429) {
+      const retryAfter = res.headers.get("Retry-After") ?? "a few";
+      throw new Error(
+        `Annotation server is busy, try again in ${retryAfter} seconds`,
+      );
+    }
     if (!res.ok) {
       const body = await res.text().catch(() => "");
       throw new Error(
         `RAG analyzePdf failed: HTTP ${res.status} ${res.statusText} ${body}`,
       );
     }
+
+    // The server keeps running the job when the stream drops; reconnect and
+    // skip the match and document-done events that were already delivered
+    // (they are replayed in order).
+    let jobId: string | null = null;
+    let deliveredMatches = 0;
+    let deliveredDocuments = 0;
+    let finished = false;
+    let stream: Response = res;
+    for (let attempt = 0; ; attempt++) {
+      let skipMatches = deliveredMatches;
+      let skipDocuments = deliveredDocuments;
+      try {
+        for await (const msg of this.readAnnotationStream(stream)) {
+          if (msg.type === "annotationJob") {
+            jobId = msg.jobId;
+          } else if (msg.type === "annotationMatches") {
+            if (skipMatches > 0) {
+              skipMatches--;
+              continue;
+            }
+            deliveredMatches++;
+          } else if (msg.type === "annotationDocumentDone") {
+            if (skipDocuments > 0) {
+              skipDocuments--;
+              continue;
+            }
+            deliveredDocuments++;
+          } else if (msg.type === "done") {
+            finished = true;
+          }
+          yield msg;
+        }
+        if (finished || !jobId) return;
+      } catch (e) {
+        if (signal?.aborted) {
+          if (jobId) void this.cancelAnnotationJob(jobId);
+          throw e;
+        }
+        if (!jobId || attempt >= MAX_ANNOTATION_RECONNECTS) throw e;
+      }
+      if (attempt >= MAX_ANNOTATION_RECONNECTS) {
+        throw new Error("Annotation stream ended before the job finished");
+      }
+      await Zotero.Promise.delay(1000 * (attempt + 1));
+      stream = await fetch(
+        `${this.baseUrl}/api/annotations/${encodeURIComponent(jobId)}/stream`,
+        { headers: { Accept: "application/x-ndjson" }, signal },
+      );
+      if (!stream.ok) {
+        throw new Error(
+          `RAG annotation job ${jobId} lost: HTTP ${stream.status} ${stream.statusText}`,
+        );
+      }
+    }
+  }
+
+  private async lookupPdf(
+    sha256: string,
+    zoteroKey: string | undefined,
+    signal?: AbortSignal,
+  ): Promise<boolean> {
+    try {
+      const res = await fetch(`${this.baseUrl}/api/annotations/pdfs/lookup`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ sha256, zoteroKey }),
+        signal,
+      });
+      if (!res.ok) return false;
+      const out = (await res.json()) as { known?: boolean };
+      return out.known === true;
+    } catch (e) {
+      if (signal?.aborted) throw e;
+      return false;
+    }
+  }
+
+  public async cancelAnnotationJob(jobId: string): Promise<void> {
+    const url = `${this.baseUrl}/api/annotations/${encodeURIComponent(jobId)}`;
+    await fetch(url, { method: "DELETE" }).catch(() => undefined);
+  }
+
+  /** Index state of the given attachment keys, or of every indexed attachment. */
+  public async getIndexStatus(
+    zoteroIds?: string[],
+    signal?: AbortSignal,
+  ): Promise<IndexStatus[]> {
+    const res = await fetch(`${this.baseUrl}/api/index/status`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ zoteroIds: zoteroIds ?? null }),
+      signal,
+    });
+    if (!res.ok) {
+      throw new Error(`RAG API error (${res.status}): ${await res.text()}`);
+    }
+    const out = (await res.json()) as { documents: IndexStatus[] };
+    return out.documents;
+  }
+
+  private async *readAnnotationStream(
+    res: Response,
+  ): AsyncGenerator<AnnotationStreamMsg> {
     if (!res.body) {
       throw new Error(
         "Streaming not supported for /api/annotations: response.body is null",
@@ -460,11 +460,17 @@ function ensurePopup(doc: Document, reader: any): HTMLDivElement {
         pdfBlob,
         request,
         controller?.signal,
+        reader._item?.key,
       )) {
         if (msg.type === "error") {
           throw new Error(msg.message || "Annotation stream failed");
         }
 
+        if (msg.type === "annotationQueued") {
+          setBaseStatus(`Queued • position ${msg.position}/${msg.queued}`);
+          continue;
+        }
+
         if (msg.type === "annotationConcurrency") {
           activeRequests = msg.activeRequests;
           renderStatus();